@@ -0,0 +1,80 @@
+############################################ Arrow Result Fetching #####################################################
+# Description : Fetches query results as Arrow tables instead of python rows. Snowflake cursors return their Arrow
+#               result chunks as they are (fetch_arrow_all), other DB-API cursors (the Netezza JDBC cursor) are read
+#               with fetchmany and transposed into one Arrow array per column and chunk. The dataframes used by the
+#               comparison are converted from the Arrow tables in one columnar step.
+
+import pyarrow as pa
+
+
+DEFAULT_FETCH_SIZE = 10000
+
+
+def to_arrow_array(values):
+    """
+    :description: Converts the values of one result column to an Arrow array. Values of mixed or unknown types,
+                  eg: Java objects from JDBC, are converted to strings.
+    :param values: Sequence of python values of one column.
+    """
+
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+def cursor_to_arrow(cursor, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+    :description: Reads the result set of an executed cursor into an Arrow table with upper case column names.
+    :param cursor: Snowflake cursor or DB-API cursor after execute().
+    :param fetch_size: Number of rows fetched at a time from DB-API cursors.
+    :return: pyarrow.Table
+    """
+
+    columns = [desc[0].upper() for desc in cursor.description]
+    if hasattr(cursor, 'fetch_arrow_all'):
+        table = cursor.fetch_arrow_all()
+        if table is None:
+            # the connector returns None for empty result sets
+            return pa.table({col: pa.array([], type=pa.null()) for col in columns})
+        return table.rename_columns(columns)
+
+    batches = []
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        arrays = [to_arrow_array(values) for values in zip(*rows)]
+        batches.append(pa.table(dict(zip(columns, arrays))))
+    if not batches:
+        return pa.table({col: pa.array([], type=pa.null()) for col in columns})
+    return pa.concat_tables(batches, promote_options='permissive')
+
+
+def execute(cursor, query, params=()):
+    """
+    :description: Executes a query with the values of its ? markers, without parameters if it has none.
+    :param params: Values of the ? markers, see query_builder.get_params().
+    """
+
+    if params:
+        return cursor.execute(query, params)
+    return cursor.execute(query)
+
+
+def fetch_arrow(cursor, query, fetch_size=DEFAULT_FETCH_SIZE, params=()):
+    """
+    :description: Executes the query and returns its result set as an Arrow table, see cursor_to_arrow().
+    """
+
+    execute(cursor, query, params)
+    return cursor_to_arrow(cursor, fetch_size)
+
+
+def arrow_to_frame(table):
+    """
+    :description: Converts an Arrow result table to a pandas dataframe. Decimals stay decimal.Decimal objects so that
+                  large NUMERIC sums keep their digits.
+    """
+
+    return table.to_pandas()
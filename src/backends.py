@@ -0,0 +1,684 @@
+############################################ Database Backends #########################################################
+# Description : The database specific operations used by the Netezza and Snowflake classes: opening a connection,
+#               column metadata lookup, record count, metric queries and row streaming. NetezzaBackend and
+#               SnowflakeBackend talk to the real databases. SQLiteBackend is a local stand-in on the embedded SQLite
+#               engine, with the Netezza and Snowflake functions used by the validation queries registered as python
+#               functions, so that the whole validation can be run and benchmarked without production access.
+
+import re
+import json
+import math
+import sqlite3
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from arrow_fetch import arrow_to_frame, execute, fetch_arrow
+from connections import credential_cache, get_ssm_parameters
+from query_builder import build_count_query, get_params
+from row_diff import DEFAULT_CHUNK_SIZE, iter_fetchmany, iter_pandas_batches
+
+
+class Backend(ABC):
+    """
+    Interface of the database operations used by the Netezza and Snowflake classes.
+
+    ...
+
+    Attributes
+    ----------
+    supports_async: bool
+        True if the cursors can submit queries with execute_async and fetch them with get_results_from_sfqid.
+
+
+    Methods
+    -------
+    connect()
+        Opens a new DB-API connection. Used by the connection pools.
+
+    setup(conn)
+        Sets up a new pooled connection, once per connection.
+
+    table_name(db_name, schema_name, table_name)
+        Returns the name of the table as used in the queries.
+
+    get_columns(cursor, db_name, schema_name, table_name)
+        Returns the column names and data types of the table.
+
+    get_table_stats(cursor, db_name, schema_name)
+        Returns the row counts and sizes of all the tables of a schema from the catalog.
+
+    get_schema_columns(cursor, db_name, schema_name)
+        Returns the column names and data types of all the tables of a schema.
+
+    get_schema_version(cursor, db_name, schema_name)
+        Returns a value which changes when the DDL of the schema changes.
+
+    count(cursor, full_table_name, where_clause)
+        Returns the record count of the table.
+
+    run_query(cursor, query, params)
+        Executes a query and returns the result set as a dataframe.
+
+    iter_rows(cursor, query, chunk_size, params)
+        Streams the result set of a query in chunks.
+
+    explain(cursor, query, params)
+        Returns the plan of a query and the estimated bytes it scans, without running it.
+    """
+
+    supports_async = False
+
+    @abstractmethod
+    def connect(self):
+        """
+        :description: Opens a new DB-API connection. Used by the connection pools.
+        """
+
+    def setup(self, conn):
+        """
+        :description: Sets up a new pooled connection, once per connection. Nothing to do by default.
+        """
+
+    def table_name(self, db_name, schema_name, table_name):
+        """
+        :description: Returns the name of the table as used in the queries --> DB.SCHEMA.TABLENAME
+        """
+        return f"{db_name}.{schema_name}.{table_name}"
+
+    @abstractmethod
+    def get_columns(self, cursor, db_name, schema_name, table_name):
+        """
+        :description: Returns the column names and data types of the table, in the order of the columns.
+        :return: pandas.Dataframe with ATTNAME and FORMAT_TYPE columns.
+        """
+
+    @abstractmethod
+    def get_table_stats(self, cursor, db_name, schema_name):
+        """
+        :description: Returns the row counts and sizes of all the tables of a schema from the catalog, without
+                      scanning them. Used to estimate the cost of validating each table.
+        :return: pandas.Dataframe with TABLE_NAME, ROW_COUNT and BYTES columns, BYTES is None if not known.
+        """
+
+    @abstractmethod
+    def get_schema_columns(self, cursor, db_name, schema_name):
+        """
+        :description: Returns the column names and data types of all the tables of a schema in one catalog query.
+        :return: pandas.Dataframe with TABLE_NAME, ATTNAME and FORMAT_TYPE columns, in the order of the columns.
+        """
+
+    @abstractmethod
+    def get_schema_version(self, cursor, db_name, schema_name):
+        """
+        :description: Returns a value which changes when a table of the schema is created, dropped or altered,
+                      cheap to query. Used to check that the cached column metadata of the schema is up to date.
+        :return: str
+        """
+
+    def count(self, cursor, full_table_name, where_clause=''):
+        """
+        :description: Returns the record count of the table, restricted by the where clause.
+        """
+        query = build_count_query(full_table_name, where_clause)
+        return int(self.run_query(cursor, query, get_params(where_clause)).iloc[0, 0])
+
+    def run_query(self, cursor, query, params=()):
+        """
+        :description: Executes a query and returns the result set as a dataframe, fetched as Arrow.
+        :param params: Values of the ? markers of the query.
+        :return: pandas.Dataframe with upper case column names.
+        """
+        return arrow_to_frame(fetch_arrow(cursor, query, params=params))
+
+    def iter_rows(self, cursor, query, chunk_size=DEFAULT_CHUNK_SIZE, params=()):
+        """
+        :description: Streams the result set of a query with fetchmany.
+        :return: Generator of pandas.Dataframes with upper case column names.
+        """
+        return iter_fetchmany(cursor, query, chunk_size, params)
+
+    @abstractmethod
+    def explain(self, cursor, query, params=()):
+        """
+        :description: Asks the database for the plan of a query without running it.
+        :return: dict with the estimated bytes scanned ('bytes', None if the database does not estimate them), the
+                 partitions scanned and total ('partitions', 'total_partitions', None if not known) and the text of
+                 the plan ('plan').
+        """
+
+
+# scan node of a Netezza EXPLAIN VERBOSE plan and its estimate line
+NETEZZA_SCAN_ESTIMATE = re.compile(r'Sequential Scan[^\n]*\n\s*-- Estimated Rows = ([\d.]+), Width = (\d+)')
+
+
+class NetezzaBackend(Backend):
+    """
+    Netezza over JDBC, with the credentials from the SSM parameter store.
+
+    ...
+
+    Attributes
+    ----------
+    jdbc_driver_name: str
+        Class name of the Netezza JDBC driver.
+
+    jdbc_driver_loc: str
+        Path of the Netezza JDBC driver jar.
+    """
+
+    jdbc_driver_name = "org.netezza.Driver"
+    jdbc_driver_loc = "/path/to/nzjdbc3.jar"
+
+    @staticmethod
+    def get_conn_details():
+        """
+        :description: Gets connection credentials from SSM parameter store. The credentials are cached in the process,
+                      so SSM is called once per run and not once per table.
+        :return: user: str --> username to connect with the netezza database
+                 password: str --> password to connect with the netezza database
+                 host: str --> connection url for netezza db
+        """
+        return credential_cache.get('netezza', lambda: get_ssm_parameters(
+            'pf_qa_nz_username', 'pf_qa_nz_password', 'pf_qa_nz_url_with_db'))
+
+    def connect(self):
+        """
+        :description: Opens a new JDBC connection with parameterized username, password, hostname, port and database
+                      from parameter store.
+        """
+        import jaydebeapi  # imported on first connect, it starts the JVM of the JDBC driver
+
+        user, password, host = self.get_conn_details()
+        connection_string = f'jdbc:netezza://{host}'
+
+        return jaydebeapi.connect(self.jdbc_driver_name, connection_string, {'user': user, 'password': password},
+                                  jars=self.jdbc_driver_loc)
+
+    def get_columns(self, cursor, db_name, schema_name, table_name):
+        """
+        :description: Queries _v_relation_column table to get column details of the table from Netezza.
+        """
+        query = f"""select
+                ATTNAME, FORMAT_TYPE
+            from {db_name}.{schema_name}._v_relation_column
+            where NAME = ?
+                and DATABASE = ?
+                and OWNER = ?
+            order by ATTNUM;"""
+        return self.run_query(cursor, query, (table_name, db_name, schema_name))
+
+    def get_table_stats(self, cursor, db_name, schema_name):
+        """
+        :description: Queries _v_table for the row counts of the tables from the statistics of the catalog.
+                      _v_table has no size, BYTES is None.
+        """
+        query = f"""select
+                TABLENAME as TABLE_NAME, RELTUPLES as ROW_COUNT, cast(null as bigint) as BYTES
+            from {db_name}.{schema_name}._v_table
+            where DATABASE = ?
+                and OWNER = ?
+                and OBJTYPE = 'TABLE';"""
+        return self.run_query(cursor, query, (db_name, schema_name))
+
+    def get_schema_columns(self, cursor, db_name, schema_name):
+        """
+        :description: Queries _v_relation_column for the columns of all the tables of the schema.
+        """
+        query = f"""select
+                NAME as TABLE_NAME, ATTNAME, FORMAT_TYPE
+            from {db_name}.{schema_name}._v_relation_column
+            where DATABASE = ?
+                and OWNER = ?
+            order by NAME, ATTNUM;"""
+        return self.run_query(cursor, query, (db_name, schema_name))
+
+    def get_schema_version(self, cursor, db_name, schema_name):
+        """
+        :description: Number of columns, highest object id and a checksum of the column names and data types of the
+                      schema. Netezza gives a new object id to the tables created, but ALTER TABLE .. MODIFY COLUMN
+                      keeps it, the checksum weighs the length of each name and the digits of each type (eg: the
+                      length of a VARCHAR) with the position of the column.
+        """
+        digits = "translate(FORMAT_TYPE, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ (),', '')"
+        query = f"""select
+                count(*) as COLUMN_COUNT, max(OBJID) as MAX_OBJID,
+                sum(ATTNUM * (length(ATTNAME) + 1000 * cast(nvl(nullif({digits}, ''), '0') as bigint))) as CHECKSUM
+            from {db_name}.{schema_name}._v_relation_column
+            where DATABASE = ?
+                and OWNER = ?;"""
+        row = self.run_query(cursor, query, (db_name, schema_name)).iloc[0]
+        return f"{row['COLUMN_COUNT']}:{row['MAX_OBJID']}:{row['CHECKSUM']}"
+
+    def explain(self, cursor, query, params=()):
+        """
+        :description: Runs EXPLAIN VERBOSE, whose plan the JDBC driver returns as warnings of the statement. The
+                      estimated bytes are the estimated rows times the row width of the table scans, after the zone
+                      maps of the where clause.
+        """
+        execute(cursor, f"explain verbose {query}", params)
+        lines = []
+        statement = getattr(cursor, '_prep', None)
+        warning = statement.getWarnings() if statement is not None else None
+        while warning is not None:
+            lines.append(str(warning.getMessage()))
+            warning = warning.getNextWarning()
+        plan = '\n'.join(lines)
+        scans = NETEZZA_SCAN_ESTIMATE.findall(plan)
+        return {'bytes': int(sum(float(rows) * int(width) for rows, width in scans)) if scans else None,
+                'partitions': None, 'total_partitions': None, 'plan': plan}
+
+
+class SnowflakeBackend(Backend):
+    """
+    Snowflake over the python connector, with the credentials from the SSM parameter store.
+
+    ...
+
+    Attributes
+    ----------
+    role: str
+        Role set on every new connection.
+
+    warehouse: str
+        Warehouse set on every new connection.
+    """
+
+    supports_async = True
+
+    def __init__(self, role, warehouse):
+        """
+        :description: Constructor to create SnowflakeBackend objects.
+        :param role: Role set on every new connection.
+        :param warehouse: Warehouse set on every new connection.
+        """
+        self.role = role
+        self.warehouse = warehouse
+
+    @staticmethod
+    def get_conn_details():
+        """
+        :description: Gets connection credentials from SSM parameter store. The credentials are cached in the process,
+                      so SSM is called once per run and not once per table.
+        :return: user: str --> username to connect with the snowflake database
+                 password: str --> password to connect with the snowflake database
+                 host: str --> connection url for snowflake db
+        """
+        return credential_cache.get('snowflake', lambda: get_ssm_parameters(
+            'pf_qa_sf_username', 'pf_qa_sf_password', 'pf_qa_sf_url'))
+
+    def connect(self):
+        """
+        :description: Opens a new Snowflake connection with credentials from parameter store.
+        """
+        import snowflake.connector as sf  # imported on first connect, slow to import
+
+        user, password, host = self.get_conn_details()
+        return sf.connect(
+            user=user,
+            password=password,
+            account=host,
+            # ? markers bound by the server, like the Netezza JDBC parameters
+            paramstyle='qmark'
+        )
+
+    def setup(self, conn):
+        """
+        :description: Sets the role and warehouse of a new pooled connection, once per connection.
+        """
+        cur = conn.cursor()
+        cur.execute(f"USE ROLE {self.role}")
+        cur.execute(f"USE WAREHOUSE {self.warehouse}")
+        cur.close()
+
+    def get_columns(self, cursor, db_name, schema_name, table_name):
+        """
+        :description: Queries INFORMATION_SCHEMA.COLUMNS to get the column names and data types of the table.
+        """
+        query = f"""select
+                COLUMN_NAME as ATTNAME, DATA_TYPE as FORMAT_TYPE
+            from {db_name}.INFORMATION_SCHEMA.COLUMNS
+            where TABLE_SCHEMA = ?
+                and TABLE_NAME = ?
+            order by ORDINAL_POSITION"""
+        return self.run_query(cursor, query, (schema_name, table_name))
+
+    def get_table_stats(self, cursor, db_name, schema_name):
+        """
+        :description: Queries INFORMATION_SCHEMA.TABLES for the row counts and the bytes of the tables, kept up to
+                      date by Snowflake.
+        """
+        query = f"""select
+                TABLE_NAME, ROW_COUNT, BYTES
+            from {db_name}.INFORMATION_SCHEMA.TABLES
+            where TABLE_SCHEMA = ?
+                and TABLE_TYPE = 'BASE TABLE'"""
+        return self.run_query(cursor, query, (schema_name,))
+
+    def get_schema_columns(self, cursor, db_name, schema_name):
+        """
+        :description: Queries INFORMATION_SCHEMA.COLUMNS for the columns of all the tables of the schema.
+        """
+        query = f"""select
+                TABLE_NAME, COLUMN_NAME as ATTNAME, DATA_TYPE as FORMAT_TYPE
+            from {db_name}.INFORMATION_SCHEMA.COLUMNS
+            where TABLE_SCHEMA = ?
+            order by TABLE_NAME, ORDINAL_POSITION"""
+        return self.run_query(cursor, query, (schema_name,))
+
+    def get_schema_version(self, cursor, db_name, schema_name):
+        """
+        :description: Number of tables and latest DDL timestamp of the schema from INFORMATION_SCHEMA.TABLES.
+        """
+        query = f"""select
+                count(*) as TABLE_COUNT, max(LAST_DDL) as LAST_DDL
+            from {db_name}.INFORMATION_SCHEMA.TABLES
+            where TABLE_SCHEMA = ?"""
+        row = self.run_query(cursor, query, (schema_name,)).iloc[0]
+        return f"{row['TABLE_COUNT']}:{row['LAST_DDL']}"
+
+    def iter_rows(self, cursor, query, chunk_size=DEFAULT_CHUNK_SIZE, params=()):
+        """
+        :description: Streams the result set of a query in the Arrow batches of the connector.
+        """
+        return iter_pandas_batches(cursor, query, chunk_size, params)
+
+    def explain(self, cursor, query, params=()):
+        """
+        :description: Runs EXPLAIN USING JSON, compiled without using the warehouse. The estimated bytes are the
+                      bytes of the micro-partitions left after pruning on the where clause.
+        """
+        plan = self.run_query(cursor, f"explain using json {query}", params).iloc[0, 0]
+        stats = json.loads(plan).get('GlobalStats', dict())
+        return {'bytes': stats.get('bytesAssigned'), 'partitions': stats.get('partitionsAssigned'),
+                'total_partitions': stats.get('partitionsTotal'), 'plan': plan}
+
+
+def to_datetime(value):
+    """
+    :description: Parses the text of a SQLite date or timestamp value, None if it is not one.
+    """
+
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def date_trunc(grain, value):
+    """
+    :description: DATE_TRUNC of Netezza and Snowflake for SQLite, weeks start on Monday.
+    """
+
+    value = to_datetime(value)
+    if value is None:
+        return None
+    grain = grain.lower()
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if grain == 'week':
+        day -= timedelta(days=day.weekday())
+    elif grain == 'month':
+        day = day.replace(day=1)
+    elif grain == 'quarter':
+        day = day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    elif grain == 'year':
+        day = day.replace(month=1, day=1)
+    return day.strftime('%Y-%m-%d')
+
+
+# Netezza/Snowflake TO_CHAR format elements --> strftime directives
+TO_CHAR_FORMATS = (('YYYY', '%Y'), ('HH24', '%H'), ('MM', '%m'), ('DD', '%d'), ('MI', '%M'), ('SS', '%S'),
+                   ('.US', '.%f'), ('.FF6', '.%f'))
+
+
+def to_char(value, fmt):
+    """
+    :description: TO_CHAR of dates and timestamps for SQLite.
+    """
+
+    parsed = to_datetime(value)
+    if parsed is None:
+        return None if value is None else str(value)
+    for element, directive in TO_CHAR_FORMATS:
+        fmt = fmt.replace(element, directive)
+    return parsed.strftime(fmt)
+
+
+class StddevSamp:
+    """
+    STDDEV_SAMP aggregate for SQLite.
+    """
+
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(float(value))
+
+    def finalize(self):
+        if len(self.values) < 2:
+            return None
+        mean = math.fsum(self.values) / len(self.values)
+        return math.sqrt(math.fsum((value - mean) ** 2 for value in self.values) / (len(self.values) - 1))
+
+
+class ApproxCountDistinct:
+    """
+    APPROX_COUNT_DISTINCT aggregate for SQLite, counts exactly.
+    """
+
+    def __init__(self):
+        self.values = set()
+
+    def step(self, value):
+        if value is not None:
+            self.values.add(value)
+
+    def finalize(self):
+        return len(self.values)
+
+
+class ApproxPercentile:
+    """
+    APPROX_PERCENTILE aggregate for SQLite, interpolated exactly like PERCENTILE_CONT.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.quantile = None
+
+    def step(self, value, quantile):
+        self.quantile = quantile
+        if value is not None:
+            self.values.append(float(value))
+
+    def finalize(self):
+        if not self.values:
+            return None
+        return float(pd.Series(self.values).quantile(self.quantile))
+
+
+class CountingCursor(sqlite3.Cursor):
+    """
+    SQLite cursor counting the queries executed and the rows fetched in the stats of the backend of its connection.
+    """
+
+    def execute(self, *args, **kwargs):
+        self.connection.backend.record(queries=1)
+        return super().execute(*args, **kwargs)
+
+    def fetchone(self):
+        row = super().fetchone()
+        self.connection.backend.record(rows=int(row is not None))
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        self.connection.backend.record(rows=len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self.connection.backend.record(rows=len(rows))
+        return rows
+
+
+class CountingConnection(sqlite3.Connection):
+    """
+    SQLite connection whose cursors are CountingCursors. The backend attribute is set by SQLiteBackend.connect().
+    """
+
+    backend = None
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or CountingCursor)
+
+
+class SQLiteBackend(Backend):
+    """
+    Local stand-in for Netezza or Snowflake on a SQLite database file. Tables are named with their full name,
+    eg: "DB.SCHEMA.TABLE", and declared with the Netezza data types so that the metadata lookup returns them.
+
+    ...
+
+    Attributes
+    ----------
+    path: str
+        Path of the SQLite database file.
+
+    stats: dict
+        Number of queries executed and rows fetched on the connections of this backend.
+
+
+    Methods
+    -------
+    record(queries, rows)
+        Adds to the stats, thread safe.
+
+    reset_stats()
+        Sets the stats back to 0.
+    """
+
+    def __init__(self, path):
+        """
+        :description: Constructor to create SQLiteBackend objects.
+        :param path: Path of the SQLite database file.
+        """
+        self.path = path
+        self.stats = {'queries': 0, 'rows': 0}
+        self._lock = threading.Lock()
+
+    def record(self, queries=0, rows=0):
+        """
+        :description: Adds to the stats, thread safe.
+        """
+        with self._lock:
+            self.stats['queries'] += queries
+            self.stats['rows'] += rows
+
+    def reset_stats(self):
+        """
+        :description: Sets the stats back to 0.
+        """
+        with self._lock:
+            self.stats = {'queries': 0, 'rows': 0}
+
+    def connect(self):
+        """
+        :description: Opens the SQLite database with the Netezza and Snowflake functions of the validation queries.
+                      The connection can be used from the worker threads of the pool, one thread at a time.
+        """
+        conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, factory=CountingConnection)
+        conn.backend = self
+        register_functions(conn)
+        return conn
+
+    def table_name(self, db_name, schema_name, table_name):
+        """
+        :description: Returns the quoted full name of the table --> "DB.SCHEMA.TABLENAME"
+        """
+        return f'"{db_name}.{schema_name}.{table_name}"'
+
+    def get_columns(self, cursor, db_name, schema_name, table_name):
+        """
+        :description: Reads the column names and declared data types of the table with PRAGMA table_info.
+        """
+        cursor.execute(f"PRAGMA table_info({self.table_name(db_name, schema_name, table_name)})")
+        rows = cursor.fetchall()
+        if not rows:
+            raise ValueError(f"Table {db_name}.{schema_name}.{table_name} not found in {self.path}")
+        return pd.DataFrame([(row[1].upper(), row[2].upper()) for row in rows], columns=['ATTNAME', 'FORMAT_TYPE'])
+
+    def get_table_stats(self, cursor, db_name, schema_name):
+        """
+        :description: Counts the rows of the tables named "DB.SCHEMA.*", SQLite has no row count statistics.
+                      BYTES is None.
+        """
+        prefix = f"{db_name}.{schema_name}."
+        cursor.execute("select name from sqlite_master where type = 'table' and substr(name, 1, ?) = ?",
+                       (len(prefix), prefix))
+        names = [row[0] for row in cursor.fetchall()]
+        stats = []
+        for name in names:
+            cursor.execute(f'select count(*) from "{name}"')
+            stats.append((name[len(prefix):], cursor.fetchone()[0], None))
+        return pd.DataFrame(stats, columns=['TABLE_NAME', 'ROW_COUNT', 'BYTES'])
+
+    def get_schema_columns(self, cursor, db_name, schema_name):
+        """
+        :description: Reads the columns of the tables named "DB.SCHEMA.*" with pragma_table_info, in one query.
+        """
+        prefix = f"{db_name}.{schema_name}."
+        cursor.execute("""select substr(m.name, ?), upper(p.name), upper(p.type)
+            from sqlite_master m join pragma_table_info(m.name) p
+            where m.type = 'table' and substr(m.name, 1, ?) = ?
+            order by m.name, p.cid""", (len(prefix) + 1, len(prefix), prefix))
+        return pd.DataFrame(cursor.fetchall(), columns=['TABLE_NAME', 'ATTNAME', 'FORMAT_TYPE'])
+
+    def get_schema_version(self, cursor, db_name, schema_name):
+        """
+        :description: PRAGMA schema_version, incremented by SQLite on every DDL statement of the database.
+        """
+        cursor.execute("PRAGMA schema_version")
+        return str(cursor.fetchone()[0])
+
+    def explain(self, cursor, query, params=()):
+        """
+        :description: Runs EXPLAIN QUERY PLAN, which shows whether the where clause is answered with an index
+                      (SEARCH) or a full scan (SCAN). SQLite does not estimate bytes.
+        """
+        execute(cursor, f"explain query plan {query}", params)
+        plan = '\n'.join(row[3] for row in cursor.fetchall())
+        return {'bytes': None, 'partitions': None, 'total_partitions': None, 'plan': plan}
+
+
+def register_functions(conn):
+    """
+    :description: Registers the Netezza and Snowflake functions used by the validation, fingerprint, sampling and
+                  profiling queries on a SQLite connection. PERCENTILE_CONT .. WITHIN GROUP cannot be parsed by
+                  SQLite, so the Netezza profiling queries do not run on it.
+    """
+
+    conn.create_function('DATE_TRUNC', 2, date_trunc, deterministic=True)
+    conn.create_function('TO_CHAR', 2, to_char, deterministic=True)
+    conn.create_function('MOD', 2, lambda a, b: None if a is None or b is None else a % b, deterministic=True)
+    # Netezza SQL Extensions Toolkit
+    conn.create_function('hash', 2, lambda text, algorithm: None if text is None else
+                         hashlib.md5(str(text).encode()).digest(), deterministic=True)
+    conn.create_function('rawtohex', 1, lambda raw: None if raw is None else raw.hex().upper(), deterministic=True)
+    conn.create_function('string_to_int', 2, lambda text, base: None if text is None else int(text, base),
+                         deterministic=True)
+    # Snowflake
+    conn.create_function('MD5', 1, lambda text: None if text is None else hashlib.md5(str(text).encode()).hexdigest(),
+                         deterministic=True)
+    conn.create_function('TO_NUMBER', 2, lambda text, fmt: None if text is None else
+                         int(text, 16) if 'X' in fmt.upper() else float(text), deterministic=True)
+    conn.create_aggregate('STDDEV_SAMP', 1, StddevSamp)
+    conn.create_aggregate('APPROX_COUNT_DISTINCT', 1, ApproxCountDistinct)
+    conn.create_aggregate('APPROX_PERCENTILE', 2, ApproxPercentile)
@@ -0,0 +1,375 @@
+############################################ Multi Table Batch Validation ##############################################
+# Description : Validates many Netezza/Snowflake table pairs in one process. The table pairs are read from a manifest
+#               (CSV or YAML) and validated on a thread pool, with separate concurrency caps for each database.
+#               A failing table is recorded in its result instead of aborting the whole run. With a run journal the
+#               finished tables are recorded as they complete, so a restarted run only validates the rest.
+# Usage: python main.py --manifest tables.csv [--workers 8] [--netezza_concurrency 4] [--snowflake_concurrency 4]
+#                       [--journal journal.db] [--retries 2]
+
+import io
+import csv
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from validation import (CountValidationError, DataValidationError, Netezza, Snowflake, count_validation,
+                        data_validation, fingerprint_validation, incremental_validation, load_tables,
+                        partition_validation, sample_validation)
+from query_builder import build_bucket_clause
+from result_store import ResultStore
+from journal import RunJournal, get_partition_rows, get_unit_key
+from result_sink import get_table_metric_rows
+from tracing import tracer
+from comparison import DEFAULT_ABS_TOL, DEFAULT_REL_TOL
+from defaults import (AUTO_SAMPLE, DEFAULT_NETEZZA_CONCURRENCY, DEFAULT_RETRY_BACKOFF, DEFAULT_SNOWFLAKE_CONCURRENCY,
+                      DEFAULT_TARGET_ROWS, DEFAULT_WORKERS)
+
+
+MANIFEST_COLUMNS = ['snowflake_table_name', 'netezza_table_name', 'date_column', 'start_date', 'end_date',
+                    'sample_fraction', 'sample_key', 'sla']
+
+PASSED = 'PASSED'
+COUNT_MISMATCH = 'COUNT_MISMATCH'
+DATA_MISMATCH = 'DATA_MISMATCH'
+ERROR = 'ERROR'
+# keys of the results kept by run_batch() when they are written to a sink, without the message and its report
+SUMMARY_KEYS = ['snowflake_table_name', 'netezza_table_name', 'status', 'elapsed', 'netezza_elapsed',
+                'snowflake_elapsed']
+
+
+def load_manifest(path):
+    """
+    :description: Reads the table pairs to be validated from a CSV or YAML manifest file, see parse_manifest().
+    :param path: Path of the manifest file. YAML is detected from the .yml/.yaml extension.
+    :return: List of dicts with all the MANIFEST_COLUMNS keys, None for the values not given.
+    """
+
+    with open(path, newline='') as f:
+        return parse_manifest(f.read(), path.lower().endswith(('.yml', '.yaml')), path)
+
+
+def parse_manifest(text, is_yaml=False, source='manifest'):
+    """
+    :description: Parses the table pairs to be validated from the text of a CSV or YAML manifest.
+                  CSV manifests need a header with the MANIFEST_COLUMNS names, only the table names are mandatory.
+                  sample_fraction selects sampled validation for a table, a fraction or AUTO_SAMPLE.
+                  sla is the number of minutes from the start of the run by which the table is needed, see scheduler.py.
+                  YAML manifests are a list of mappings with the same keys, optionally under a 'tables' key.
+    :param text: Content of the manifest.
+    :param is_yaml: Parses YAML when True, CSV otherwise.
+    :param source: Name of the manifest in the error messages, eg: its path.
+    :return: List of dicts with all the MANIFEST_COLUMNS keys, None for the values not given.
+    """
+
+    if is_yaml:
+        import yaml  # optional dependency, only needed for YAML manifests
+        entries = yaml.safe_load(text) or []
+        if isinstance(entries, dict):
+            entries = entries.get('tables', [])
+    else:
+        entries = list(csv.DictReader(io.StringIO(text)))
+    return normalize_manifest(entries, source)
+
+
+def normalize_manifest(entries, source='manifest'):
+    """
+    :description: Checks the entries of a manifest and gives all of them the MANIFEST_COLUMNS keys. The sla must be
+                  a number of minutes, a bad sla is reported with its entry before the run starts.
+    :param entries: List of mappings of MANIFEST_COLUMNS keys to values, eg: the rows of a CSV manifest.
+    :param source: Name of the manifest in the error messages, eg: its path.
+    :return: List of dicts with all the MANIFEST_COLUMNS keys, stripped strings or None for the values not given.
+    """
+
+    manifest = []
+    for line, entry in enumerate(entries, start=1):
+        entry = {key: (str(value).strip() or None) if value is not None else None
+                 for key, value in entry.items()}
+        if not entry.get('snowflake_table_name') or not entry.get('netezza_table_name'):
+            raise ValueError(f"Manifest entry {line} in {source} needs snowflake_table_name and netezza_table_name")
+        if entry.get('sla') is not None:
+            try:
+                sla = float(entry['sla'])
+            except ValueError:
+                sla = None
+            if sla is None or not math.isfinite(sla) or sla < 0:
+                raise ValueError(f"Manifest entry {line} in {source} ({entry['snowflake_table_name']}) has an invalid "
+                                 f"sla {entry['sla']!r}, give the minutes from the start of the run")
+        manifest.append({key: entry.get(key) for key in MANIFEST_COLUMNS})
+    return manifest
+
+
+def get_table_kwargs(entry):
+    """
+    :description: Keyword arguments for the Netezza and Snowflake constructors from a manifest entry.
+                  The date column is only passed when given so that the class defaults apply otherwise.
+    """
+
+    kwargs = {'start_date': entry.get('start_date'), 'end_date': entry.get('end_date')}
+    if entry.get('date_column'):
+        kwargs['date_col'] = entry['date_column']
+    return kwargs
+
+
+def get_entry_sample_fraction(entry):
+    """
+    :description: Sampling fraction of a manifest entry, None for AUTO_SAMPLE to tune it from the table count.
+    """
+
+    if entry.get('sample_fraction', '').lower() == AUTO_SAMPLE:
+        return None
+    return float(entry['sample_fraction'])
+
+
+def validate_table(entry, netezza_slots, snowflake_slots, rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL,
+                   connect=False, parallel_sides=False, partition_by=None, store=None, fingerprint=False,
+                   journal=None, unit_key=None, sink=None, final_attempt=True, bucket=None,
+                   sample_rows=DEFAULT_TARGET_ROWS):
+    """
+    :description: Runs count and data validation for one table pair of the manifest. Entries with a sample_fraction
+                  are validated on a sample with validation.sample_validation().
+    :param entry: Manifest entry, see load_manifest().
+    :param netezza_slots: Semaphore limiting the number of tables queried in Netezza at the same time.
+    :param snowflake_slots: Semaphore limiting the number of tables queried in Snowflake at the same time.
+    :param rel_tol: Relative tolerance passed to data_validation().
+    :param abs_tol: Absolute tolerance passed to data_validation().
+    :param connect: Queries the databases when True, otherwise the sample data files are used.
+    :param parallel_sides: Queries Netezza and Snowflake at the same time, see validation.load_tables().
+    :param partition_by: Validates per date bucket of this grain with validation.partition_validation() when given.
+    :param store: ResultStore for incremental validation, buckets of partition_by, see
+                  validation.incremental_validation().
+    :param fingerprint: Compares content fingerprints, per bucket of partition_by, see
+                        validation.fingerprint_validation().
+    :param journal: RunJournal recording the start and the result of the table, with the per bucket results of
+                    partition_by, when given.
+    :param unit_key: Key of the table in the journal, see journal.get_unit_key().
+    :param sink: ResultSink the result, the record counts, the metrics and the mismatch report are written to when
+                 given.
+    :param final_attempt: False when an ERROR is retried by validate_table_with_retries(), not written to the sink.
+    :param bucket: Start of the one date bucket of partition_by to validate as 'YYYY-MM-DD', eg: a unit of work of
+                   work_queue.py. The whole date range if None.
+    :param sample_rows: Number of rows sampled from the AUTO_SAMPLE entries, see validation.sample_validation().
+    :return: Result dict with the table names, status, message, elapsed seconds and the seconds each side was
+             queried, None for the sides when the tables could not be loaded.
+    """
+
+    result = {'snowflake_table_name': entry['snowflake_table_name'],
+              'netezza_table_name': entry['netezza_table_name'],
+              'status': PASSED,
+              'message': '',
+              'elapsed': None,
+              'netezza_elapsed': None,
+              'snowflake_elapsed': None}
+    partitions, report, counts, metric_rows = None, dict(), (None, None), None
+    netezza = snowflake = None
+    if journal is not None:
+        journal.start(unit_key, entry)
+    start = time.perf_counter()
+    with tracer.hot_path(), tracer.phase('table', table=entry['snowflake_table_name'],
+                                         netezza_table=entry['netezza_table_name']):
+        try:
+            sampled = bool(entry.get('sample_fraction'))
+            full_scan = not partition_by and store is None and not fingerprint and not sampled
+            netezza, snowflake = load_tables(entry['netezza_table_name'], entry['snowflake_table_name'],
+                                             parallel_sides and full_scan, netezza_slots, snowflake_slots,
+                                             connect=connect, validate=full_scan, **get_table_kwargs(entry))
+            if bucket is not None:
+                netezza.where_clause = build_bucket_clause(netezza.date_col, bucket, partition_by, netezza.where_clause)
+                snowflake.where_clause = build_bucket_clause(snowflake.date_col, bucket, partition_by,
+                                                             snowflake.where_clause)
+
+            messages = []
+            if store is not None:
+                try:
+                    with snowflake_slots, netezza_slots:
+                        incremental_validation(netezza, snowflake, store, partition_by or 'day', rel_tol, abs_tol)
+                except CountValidationError as e:
+                    result['status'] = COUNT_MISMATCH
+                    messages.append(e.message)
+                except DataValidationError as e:
+                    result['status'] = DATA_MISMATCH
+                    messages.append(e.message)
+                    report = e.report
+            elif sampled:
+                try:
+                    with snowflake_slots, netezza_slots:
+                        sample_validation(netezza, snowflake, get_entry_sample_fraction(entry), entry.get('sample_key'),
+                                          sample_rows, rel_tol=rel_tol, abs_tol=abs_tol)
+                except DataValidationError as e:
+                    result['status'] = DATA_MISMATCH
+                    messages.append(e.message)
+                    report = e.report
+            elif fingerprint:
+                try:
+                    with snowflake_slots, netezza_slots:
+                        fingerprint_validation(netezza, snowflake, partition_by)
+                except DataValidationError as e:
+                    result['status'] = DATA_MISMATCH
+                    messages.append(e.message)
+                    report = e.report
+                if partition_by:
+                    partitions = get_partition_rows(netezza.bucket_counts, snowflake.bucket_counts, report)
+            elif partition_by:
+                try:
+                    with snowflake_slots, netezza_slots:
+                        partition_validation(netezza, snowflake, partition_by, rel_tol, abs_tol)
+                except DataValidationError as e:
+                    result['status'] = DATA_MISMATCH
+                    messages.append(e.message)
+                    report = e.report
+                partitions = get_partition_rows(netezza.bucket_counts, snowflake.bucket_counts, report)
+            else:
+                try:
+                    count_validation(netezza, snowflake)
+                except CountValidationError as e:
+                    result['status'] = COUNT_MISMATCH
+                    messages.append(e.message)
+                try:
+                    data_validation(netezza, snowflake, rel_tol, abs_tol)
+                except DataValidationError as e:
+                    if result['status'] == PASSED:
+                        result['status'] = DATA_MISMATCH
+                    messages.append(e.message)
+                    report = e.report
+                if sink is not None or journal is not None:
+                    counts = (netezza.table_count, snowflake.table_count)
+                    metric_rows = get_table_metric_rows(entry['snowflake_table_name'], netezza, snowflake, report)
+            if netezza.bucket_counts is not None and snowflake.bucket_counts is not None:
+                counts = (netezza.bucket_counts.sum(), snowflake.bucket_counts.sum())
+            result['message'] = '\n'.join(messages)
+        except Exception as e:
+            result['status'] = ERROR
+            result['message'] = f"{type(e).__name__}: {e}"
+    result['elapsed'] = round(time.perf_counter() - start, 3)
+    if netezza is not None:
+        result['netezza_elapsed'] = round(netezza.elapsed, 3)
+        result['snowflake_elapsed'] = round(snowflake.elapsed, 3)
+    if journal is not None:
+        journal.finish(unit_key, result, partitions, counts, metric_rows, report)
+    if sink is not None and (final_attempt or result['status'] != ERROR):
+        sink.write(result, counts, metric_rows, report or None)
+    return result
+
+
+def validate_table_with_retries(entry, *args, retries=0, retry_backoff=DEFAULT_RETRY_BACKOFF, **kwargs):
+    """
+    :description: Validates a table with validate_table() and validates it again when it ends with an ERROR, eg: a
+                  dropped connection, waiting retry_backoff seconds before the first retry and twice as long before
+                  each next one. Mismatches are not retried.
+    :param entry: Manifest entry, see load_manifest().
+    :param retries: Number of times a table ending with an ERROR is validated again.
+    :param retry_backoff: Seconds to wait before the first retry.
+    The other parameters are passed to validate_table().
+    :return: Result dict of the last attempt.
+    """
+
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(retry_backoff * 2 ** (attempt - 1))
+        result = validate_table(entry, *args, final_attempt=attempt == retries, **kwargs)
+        if result['status'] != ERROR:
+            break
+    return result
+
+
+def get_backend_name(backend):
+    """
+    :description: Names the backend a side is queried with, with its database file for SQLite, eg: for the journal
+                  keys, so that a run against another database does not reuse the results of a previous run.
+    :param backend: Object of a backends.Backend class.
+    :return: Class name of the backend, followed by the path of its file when it has one.
+    """
+
+    path = getattr(backend, 'path', None)
+    return type(backend).__name__ if path is None else f"{type(backend).__name__}:{path}"
+
+
+def run_batch(manifest, workers=DEFAULT_WORKERS, netezza_concurrency=DEFAULT_NETEZZA_CONCURRENCY,
+              snowflake_concurrency=DEFAULT_SNOWFLAKE_CONCURRENCY, rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL,
+              connect=False, parallel_sides=False, partition_by=None, store_path=None, fingerprint=False,
+              journal_path=None, retries=0, retry_backoff=DEFAULT_RETRY_BACKOFF, sink=None,
+              sample_rows=DEFAULT_TARGET_ROWS):
+    """
+    :description: Validates all the table pairs of the manifest on a thread pool.
+                  The connection pools are sized to the concurrency caps, so every table reuses a logged in session.
+                  With a journal the tables which finished in a previous run with the same options are not validated
+                  again, their recorded results are returned and written to the sink.
+                  With a sink only the SUMMARY_KEYS of the results are kept, the messages are in the sink.
+    :param manifest: List of manifest entries, see load_manifest().
+    :param workers: Number of tables validated at the same time.
+    :param netezza_concurrency: Maximum number of tables queried in Netezza at the same time.
+    :param snowflake_concurrency: Maximum number of tables queried in Snowflake at the same time.
+    :param rel_tol: Relative tolerance passed to data_validation().
+    :param abs_tol: Absolute tolerance passed to data_validation().
+    :param connect: Queries the databases when True, otherwise the sample data files are used.
+    :param parallel_sides: Queries Netezza and Snowflake at the same time for each table.
+    :param partition_by: Validates per date bucket of this grain when given, see validation.partition_validation().
+    :param store_path: SQLite file of the ResultStore for incremental validation, see
+                       validation.incremental_validation().
+    :param fingerprint: Compares content fingerprints instead of metrics, see validation.fingerprint_validation().
+    :param journal_path: SQLite file of the RunJournal recording the tables as they finish, see journal.py.
+    :param retries: Number of times a table ending with an ERROR is validated again, see validate_table_with_retries().
+    :param retry_backoff: Seconds to wait before the first retry, doubled for each next one.
+    :param sink: ResultSink the tables are written to as they finish, see result_sink.py. Not closed.
+    :param sample_rows: Number of rows sampled from the AUTO_SAMPLE entries, see validation.sample_validation().
+    :return: List of result dicts in the order of the manifest, with the SUMMARY_KEYS only when a sink is given.
+    """
+
+    def validate(entry, unit_key):
+        result = validate_table_with_retries(entry, netezza_slots, snowflake_slots, rel_tol, abs_tol, connect,
+                                             parallel_sides, partition_by, store, fingerprint, journal, unit_key,
+                                             sink, retries=retries, retry_backoff=retry_backoff,
+                                             sample_rows=sample_rows)
+        return result if sink is None else {key: result[key] for key in SUMMARY_KEYS}
+
+    Netezza.pool_size = netezza_concurrency
+    Snowflake.pool_size = snowflake_concurrency
+    netezza_slots = threading.BoundedSemaphore(netezza_concurrency)
+    snowflake_slots = threading.BoundedSemaphore(snowflake_concurrency)
+    store = ResultStore(store_path) if store_path else None
+    journal = RunJournal(journal_path) if journal_path else None
+    # every option changing the queries or the comparison, the class wide ones set by main.py included
+    options = {'connect': connect, 'partition_by': partition_by, 'store_path': store_path, 'fingerprint': fingerprint,
+               'rel_tol': rel_tol, 'abs_tol': abs_tol, 'sample_rows': sample_rows,
+               'profile': Netezza.profile or Snowflake.profile, 'validation_sp': Snowflake.use_validation_sp,
+               'backend': [get_backend_name(Netezza.backend), get_backend_name(Snowflake.backend)]}
+    unit_keys = [get_unit_key(entry, **options) for entry in manifest]
+    finished = journal.get_finished(unit_keys) if journal is not None else dict()
+    if sink is not None:
+        for entry, unit_key in zip(manifest, unit_keys):
+            if unit_key in finished:
+                sink.write(finished[unit_key], *journal.load_details(unit_key, entry['snowflake_table_name']))
+                finished[unit_key] = {key: finished[unit_key].get(key) for key in SUMMARY_KEYS}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [None if unit_key in finished else executor.submit(validate, entry, unit_key)
+                   for entry, unit_key in zip(manifest, unit_keys)]
+        try:
+            results = [finished[unit_key] if future is None else future.result()
+                       for future, unit_key in zip(futures, unit_keys)]
+        except KeyboardInterrupt:
+            # only the running tables are waited for, they are recorded in the journal
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+            raise
+    if connect:
+        Netezza.get_pool().close_all()
+        Snowflake.get_pool().close_all()
+    return results
+
+
+def print_summary(results):
+    """
+    :description: Prints one line per table followed by the details of the failed tables.
+    :param results: List of result dicts from run_batch(). The details are printed for the results with a message.
+    """
+
+    for result in results:
+        print(f"{result['status']:<15} {result['elapsed']:>9.3f}s  "
+              f"{result['snowflake_table_name']} <- {result['netezza_table_name']}")
+    for result in results:
+        if result['status'] != PASSED and 'message' in result:
+            print(f"\n{result['snowflake_table_name']} ({result['status']}):\n{result['message']}")
+
+    failed = sum(result['status'] != PASSED for result in results)
+    print(f"\n{len(results) - failed} of {len(results)} tables passed validation.")
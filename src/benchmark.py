@@ -0,0 +1,243 @@
+############################################ Validation Benchmark Suite ################################################
+# Description : Generates synthetic migrated tables of configurable row and column counts in a local SQLite database
+#               (see backends.SQLiteBackend) and runs the validation modes against them: full, partition,
+#               fingerprint, sample, row_diff and incremental. Reports the number of queries, the rows fetched by the
+#               client, the wall time and the peak python memory of every mode, so that the performance changes can
+#               be measured without access to Netezza or Snowflake.
+# Usage: python src/benchmark.py [--rows 10000 100000] [--columns 8 32] [--modes full fingerprint] [--db bench.db]
+
+import os
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from backends import SQLiteBackend
+from batch import COUNT_MISMATCH, DATA_MISMATCH, ERROR, PASSED
+from validation import (CountValidationError, DataValidationError, Netezza, Snowflake, count_validation,
+                        data_validation, fingerprint_validation, incremental_validation, load_tables,
+                        partition_validation, row_diff_validation, sample_validation)
+from result_store import ResultStore
+
+
+NETEZZA_TABLE = 'EDW.ADMIN.BENCHMARK'
+SNOWFLAKE_TABLE = 'EDW.CORE.BENCHMARK'
+KEY_COLUMN = 'ID'
+DATE_COLUMN = 'ETL_LOAD_DATE'
+# data types of the generated columns, cycled through after the key and date columns
+COLUMN_TYPES = ('INTEGER', 'CHARACTER VARYING(20)', 'DOUBLE PRECISION', 'TIMESTAMP', 'CHARACTER VARYING(50)')
+MODES = ('full', 'partition', 'fingerprint', 'sample', 'row_diff', 'incremental')
+
+DEFAULT_ROWS = (10000, 100000)
+DEFAULT_COLUMNS = (8,)
+DEFAULT_GRAIN = 'month'
+DEFAULT_SAMPLE_FRACTION = 0.1
+# share of NULL values in the generated columns
+NULL_FRACTION = 0.01
+# number of days covered by the generated load dates
+DATE_RANGE_DAYS = 730
+START_DATE = pd.Timestamp('2022-01-01')
+INSERT_CHUNK_SIZE = 10000
+RESULT_COLUMNS = ['mode', 'rows', 'columns', 'status', 'queries', 'rows_fetched', 'seconds', 'peak_memory_mb']
+
+
+def get_column_types(columns):
+    """
+    :description: Column names and data types of a generated table: the key column, the date column and
+                  columns - 2 columns cycling through COLUMN_TYPES.
+    :param columns: Total number of columns, at least 2.
+    :return: List of (column name, data type) pairs.
+    """
+
+    return [(KEY_COLUMN, 'INTEGER'), (DATE_COLUMN, 'TIMESTAMP')] + [
+        (f"COL_{i + 1}", COLUMN_TYPES[i % len(COLUMN_TYPES)]) for i in range(max(columns - 2, 0))]
+
+
+def generate_values(rng, data_type, size):
+    """
+    :description: Random values of one column, as python objects SQLite can store. Timestamps are stored as text.
+    :param rng: numpy.random.Generator
+    :param data_type: Netezza data type of the column, one of COLUMN_TYPES.
+    :param size: Number of values.
+    :return: numpy object array with NULL_FRACTION of None values.
+    """
+
+    if data_type == 'INTEGER':
+        values = rng.integers(0, 10 ** 9, size).astype(object)
+    elif data_type == 'DOUBLE PRECISION':
+        values = rng.normal(1000, 250, size).round(4).astype(object)
+    elif data_type == 'TIMESTAMP':
+        seconds = rng.integers(0, DATE_RANGE_DAYS * 86400, size)
+        values = (START_DATE + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S').to_numpy(object)
+    else:
+        length = int(data_type[data_type.index('(') + 1:-1])
+        letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+        lengths = rng.integers(1, length + 1, size)
+        chars = letters[rng.integers(0, len(letters), (size, length))]
+        values = np.array([''.join(row[:n]) for row, n in zip(chars, lengths)], dtype=object)
+    values[rng.random(size) < NULL_FRACTION] = None
+    return values
+
+
+def create_tables(path, rows, columns, seed=0):
+    """
+    :description: Creates the Netezza and Snowflake benchmark tables in the SQLite database, with the same rows.
+                  Existing benchmark tables are replaced.
+    :param path: Path of the SQLite database file.
+    :param rows: Number of rows of each table.
+    :param columns: Number of columns of each table.
+    :param seed: Seed of the random data.
+    """
+
+    column_types = get_column_types(columns)
+    rng = np.random.default_rng(seed)
+    backend = SQLiteBackend(path)
+    conn = sqlite3.connect(path)
+    try:
+        for table in (NETEZZA_TABLE, SNOWFLAKE_TABLE):
+            name = backend.table_name(*table.split('.'))
+            conn.execute(f"drop table if exists {name}")
+            conn.execute(f"create table {name} ({', '.join(f'{col} {data_type}' for col, data_type in column_types)})")
+        for start in range(0, rows, INSERT_CHUNK_SIZE):
+            size = min(INSERT_CHUNK_SIZE, rows - start)
+            values = [np.arange(start + 1, start + size + 1).astype(object)]
+            values += [generate_values(rng, data_type, size) for _, data_type in column_types[1:]]
+            chunk = list(zip(*[column.tolist() for column in values]))
+            for table in (NETEZZA_TABLE, SNOWFLAKE_TABLE):
+                conn.executemany(f"insert into {backend.table_name(*table.split('.'))} "
+                                 f"values ({', '.join('?' * len(column_types))})", chunk)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_mode(mode, store_path, grain=DEFAULT_GRAIN, sample_fraction=DEFAULT_SAMPLE_FRACTION):
+    """
+    :description: Runs one validation mode on the benchmark tables, with the backends already set on the Netezza and
+                  Snowflake classes. The incremental mode is measured on a refresh run, after a first run filled the
+                  result store.
+    :param mode: One of MODES.
+    :param store_path: Path of the result store file of the incremental mode.
+    :param grain: Size of the date buckets of the partition and incremental modes.
+    :param sample_fraction: Fraction of the rows validated by the sample mode.
+    :return: Function running the mode, raises the validation errors like the CLI.
+    """
+
+    kwargs = {'date_col': DATE_COLUMN, 'connect': True}
+    if mode == 'full':
+        def run():
+            netezza, snowflake = load_tables(NETEZZA_TABLE, SNOWFLAKE_TABLE, **kwargs)
+            count_validation(netezza, snowflake)
+            data_validation(netezza, snowflake)
+        return run
+
+    def load():
+        return load_tables(NETEZZA_TABLE, SNOWFLAKE_TABLE, validate=False, **kwargs)
+
+    if mode == 'partition':
+        return lambda: partition_validation(*load(), grain)
+    if mode == 'fingerprint':
+        return lambda: fingerprint_validation(*load())
+    if mode == 'sample':
+        return lambda: sample_validation(*load(), sample_fraction, KEY_COLUMN)
+    if mode == 'row_diff':
+        return lambda: row_diff_validation(*load(), KEY_COLUMN)
+    if mode == 'incremental':
+        if os.path.exists(store_path):
+            os.remove(store_path)
+        incremental_validation(*load(), ResultStore(store_path), grain)
+        return lambda: incremental_validation(*load(), ResultStore(store_path), grain)
+    raise ValueError(f"Unknown benchmark mode {mode}, expected one of {MODES}")
+
+
+def measure(mode, netezza_backend, snowflake_backend, store_path, **kwargs):
+    """
+    :description: Runs a validation mode and measures it. Peak memory is the python memory traced by tracemalloc,
+                  the memory of the SQLite engine itself is not included.
+    :return: dict with the status, queries, rows_fetched, seconds and peak_memory_mb of the run.
+    """
+
+    run = run_mode(mode, store_path, **kwargs)
+    for backend in (netezza_backend, snowflake_backend):
+        backend.reset_stats()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        run()
+        status = PASSED
+    except CountValidationError:
+        status = COUNT_MISMATCH
+    except DataValidationError:
+        status = DATA_MISMATCH
+    except Exception as e:
+        status = f"{ERROR}: {type(e).__name__}: {e}"
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'status': status,
+            'queries': netezza_backend.stats['queries'] + snowflake_backend.stats['queries'],
+            'rows_fetched': netezza_backend.stats['rows'] + snowflake_backend.stats['rows'],
+            'seconds': round(seconds, 3),
+            'peak_memory_mb': round(peak / 2 ** 20, 2)}
+
+
+def run_benchmark(path, rows_list=DEFAULT_ROWS, columns_list=DEFAULT_COLUMNS, modes=MODES, **kwargs):
+    """
+    :description: Generates the benchmark tables for every row and column count and measures every mode on them.
+    :param path: Path of the SQLite database file.
+    :param rows_list: Row counts of the generated tables.
+    :param columns_list: Column counts of the generated tables.
+    :param modes: Validation modes to be measured, see MODES.
+    :param kwargs: grain and sample_fraction, see run_mode().
+    :return: pandas.Dataframe with RESULT_COLUMNS, one row per table size and mode.
+    """
+
+    netezza_backend, snowflake_backend = SQLiteBackend(path), SQLiteBackend(path)
+    Netezza.use_backend(netezza_backend)
+    Snowflake.use_backend(snowflake_backend)
+    store_path = f"{path}.store"
+
+    results = []
+    for rows in rows_list:
+        for columns in columns_list:
+            create_tables(path, rows, columns)
+            for mode in modes:
+                result = measure(mode, netezza_backend, snowflake_backend, store_path, **kwargs)
+                results.append({'mode': mode, 'rows': rows, 'columns': columns, **result})
+                print(f"{mode:<12} rows={rows:<10} columns={columns:<4} {result['status']:<14} "
+                      f"{result['seconds']:>9.3f}s")
+    if os.path.exists(store_path):
+        os.remove(store_path)
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the validation modes on generated local tables.")
+    parser.add_argument("--rows", type=int, nargs='+', default=list(DEFAULT_ROWS), help="Row counts of the tables.")
+    parser.add_argument(
+        "--columns", type=int, nargs='+', default=list(DEFAULT_COLUMNS), help="Column counts of the tables.")
+    parser.add_argument("--modes", nargs='+', choices=MODES, default=list(MODES), help="Validation modes to run.")
+    parser.add_argument("--grain", default=DEFAULT_GRAIN, help="Bucket size of the partition and incremental modes.")
+    parser.add_argument(
+        "--sample_fraction", type=float, default=DEFAULT_SAMPLE_FRACTION, help="Fraction of the rows to sample.")
+    parser.add_argument("--db", help="SQLite file to generate the tables in, a temporary file by default.")
+    parser.add_argument("--output", help="CSV file to write the results to.")
+    args = parser.parse_args()
+
+    tmp_dir = None if args.db else tempfile.mkdtemp()
+    db_path = args.db or os.path.join(tmp_dir, 'benchmark.db')
+    try:
+        report = run_benchmark(db_path, args.rows, args.columns, args.modes, grain=args.grain,
+                               sample_fraction=args.sample_fraction)
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir)
+    print(report.to_string(index=False))
+    if args.output:
+        report.to_csv(args.output, index=False)
@@ -0,0 +1,164 @@
+############################################ Schema Catalog ############################################################
+# Description : Column metadata of whole schemas, fetched with one catalog query per schema and side instead of one
+#               query per table, kept in memory for the run and cached on disk between runs. A cached schema is
+#               reused as long as its schema version (see backends.Backend.get_schema_version()) has not changed,
+#               which costs one cheap query per schema every version_ttl seconds.
+
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+# seconds a schema version is trusted before it is checked again, so long running processes see DDL changes
+DEFAULT_VERSION_TTL = 300.0
+
+
+class SchemaCatalog:
+    """
+    Class to represent the cached column metadata of the Netezza and Snowflake schemas. Thread safe.
+
+    ...
+
+    Attributes
+    ----------
+    path: str
+        Path of the SQLite file the schemas are cached in, the schemas are only kept in memory if None.
+
+    version_ttl: float
+        Seconds a schema version is trusted before the next lookup checks it again.
+
+
+    Methods
+    -------
+    get_columns(side, backend, cursor, db_name, schema_name, table_name)
+        Returns the ATTNAME and FORMAT_TYPE of the columns of a table from the cached schema.
+    """
+
+    def __init__(self, path=None, version_ttl=DEFAULT_VERSION_TTL):
+        """
+        :description: Constructor to create SchemaCatalog objects. Creates the SQLite tables if they do not exist.
+        :param path: Path of the SQLite file the schemas are cached in, memory only if None.
+        :param version_ttl: Seconds a schema version is trusted before it is checked again.
+        """
+        self.path = path
+        self.version_ttl = version_ttl
+        # (side, db_name, schema_name) --> (version, time it was checked, tables)
+        self._schemas = dict()
+        self._schema_locks = dict()
+        self._lock = threading.Lock()
+        if path is None:
+            return
+        with self._connect() as conn:
+            conn.execute("""create table if not exists schema_columns (
+                side text not null,
+                db_name text not null,
+                schema_name text not null,
+                table_name text not null,
+                attnum integer not null,
+                attname text not null,
+                format_type text not null,
+                primary key (side, db_name, schema_name, table_name, attnum))""")
+            conn.execute("""create table if not exists schema_versions (
+                side text not null,
+                db_name text not null,
+                schema_name text not null,
+                version text not null,
+                fetched_at text not null default current_timestamp,
+                primary key (side, db_name, schema_name))""")
+
+    @contextmanager
+    def _connect(self):
+        """
+        :description: Opens a connection to the cache file, commits the transaction at the end of the block and
+                      closes it.
+        """
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _load_cached(self, side, db_name, schema_name, version):
+        """
+        :description: Reads a schema from the cache file if it was cached with the given version.
+        :return: pandas.Dataframe with TABLE_NAME, ATTNAME and FORMAT_TYPE columns, None if not cached or outdated.
+        """
+        if self.path is None:
+            return None
+        with self._connect() as conn:
+            row = conn.execute("""select version from schema_versions
+                where side = ? and db_name = ? and schema_name = ?""", (side, db_name, schema_name)).fetchone()
+            if row is None or row[0] != version:
+                return None
+            rows = conn.execute("""select table_name, attname, format_type from schema_columns
+                where side = ? and db_name = ? and schema_name = ?
+                order by table_name, attnum""", (side, db_name, schema_name)).fetchall()
+        return pd.DataFrame(rows, columns=['TABLE_NAME', 'ATTNAME', 'FORMAT_TYPE'])
+
+    def _save(self, side, db_name, schema_name, version, columns):
+        """
+        :description: Replaces a schema in the cache file.
+        """
+        if self.path is None:
+            return
+        rows = [(side, db_name, schema_name, table_name, attnum, attname, format_type)
+                for table_name, table in columns.groupby('TABLE_NAME', sort=False)
+                for attnum, (attname, format_type) in enumerate(zip(table['ATTNAME'], table['FORMAT_TYPE']))]
+        with self._connect() as conn:
+            conn.execute("delete from schema_columns where side = ? and db_name = ? and schema_name = ?",
+                         (side, db_name, schema_name))
+            conn.executemany("insert into schema_columns values (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("""insert or replace into schema_versions (side, db_name, schema_name, version)
+                values (?, ?, ?, ?)""", (side, db_name, schema_name, version))
+
+    def _get_schema(self, side, backend, cursor, db_name, schema_name):
+        """
+        :description: Returns the tables of a schema, from memory while its version was checked less than
+                      version_ttl seconds ago, otherwise after checking its version: from memory or from the cache
+                      file if the version is unchanged, or fetched with one catalog query. The queries of a schema
+                      only hold the lock of that schema, the lookups of the other schemas are not blocked.
+        :return: dict of upper case table name --> pandas.Dataframe with ATTNAME and FORMAT_TYPE columns.
+        """
+        key = (side, db_name, schema_name)
+        with self._lock:
+            schema_lock = self._schema_locks.setdefault(key, threading.Lock())
+        with schema_lock:
+            with self._lock:
+                cached = self._schemas.get(key)
+            if cached is not None and time.monotonic() - cached[1] < self.version_ttl:
+                return cached[2]
+
+            version = backend.get_schema_version(cursor, db_name, schema_name)
+            if cached is not None and cached[0] == version:
+                tables = cached[2]
+            else:
+                columns = self._load_cached(side, db_name, schema_name, version)
+                if columns is None:
+                    columns = backend.get_schema_columns(cursor, db_name, schema_name)
+                    columns = columns.assign(TABLE_NAME=columns['TABLE_NAME'].astype(str).str.upper())
+                    self._save(side, db_name, schema_name, version, columns)
+                tables = {table_name: table[['ATTNAME', 'FORMAT_TYPE']].reset_index(drop=True)
+                          for table_name, table in columns.groupby('TABLE_NAME', sort=False)}
+            with self._lock:
+                self._schemas[key] = (version, time.monotonic(), tables)
+            return tables
+
+    def get_columns(self, side, backend, cursor, db_name, schema_name, table_name):
+        """
+        :description: Returns the column names and data types of a table from the cached schema. The schema is
+                      fetched on the first lookup of one of its tables. A table missing from the cached schema is
+                      looked up on its own with backend.get_columns().
+        :param side: 'NETEZZA' or 'SNOWFLAKE'.
+        :param backend: backends.Backend of the side.
+        :param cursor: Cursor of the side, used when the schema has to be checked or fetched.
+        :return: pandas.Dataframe with ATTNAME and FORMAT_TYPE columns, a copy which can be modified.
+        """
+        tables = self._get_schema(side, backend, cursor, db_name.upper(), schema_name.upper())
+        columns = tables.get(table_name.upper())
+        if columns is None:
+            return backend.get_columns(cursor, db_name, schema_name, table_name)
+        return columns.copy()
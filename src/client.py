@@ -0,0 +1,133 @@
+############################################ Validation Service Client #################################################
+# Description : Thin client submitting validation jobs to the validation service (see service.py) and printing the
+#               results as they are streamed back. Only uses the standard library, so it starts instantly: the
+#               database drivers, the JVM and the logged in sessions live in the service. main.py --server submits
+#               its validation with the same client.
+# Usage: python src/client.py [--server URL] snowflake_table_name netezza_table_name [--date_column DATE_COLUMN]
+#                             [--start_date START_DATE] [--end_date END_DATE]
+#        python src/client.py [--server URL] --manifest MANIFEST [--partition_by month] [--fingerprint]
+
+import sys
+import json
+import argparse
+import urllib.error
+import urllib.request
+
+from defaults import DEFAULT_SERVER
+
+
+PASSED = 'PASSED'
+
+
+def build_job(args):
+    """
+    :description: Builds the JSON job of the validation service from the command line arguments.
+                  A manifest is sent as text and parsed by the service, a single table pair as a manifest entry.
+    :return: dict, see service.parse_job().
+    """
+
+    if args.manifest:
+        with open(args.manifest, newline='') as f:
+            job = {'manifest': f.read(),
+                   'manifest_format': 'yaml' if args.manifest.lower().endswith(('.yml', '.yaml')) else 'csv'}
+    else:
+        job = {'tables': [{'snowflake_table_name': args.snowflake_table_name,
+                           'netezza_table_name': args.netezza_table_name,
+                           'date_column': args.date_column,
+                           'start_date': args.start_date,
+                           'end_date': args.end_date,
+                           'sample_fraction': args.sample_fraction,
+                           'sample_key': args.sample_key}]}
+
+    options = {'rel_tol': args.rel_tol, 'abs_tol': args.abs_tol, 'partition_by': args.partition_by,
+               'incremental_store': args.incremental_store}
+    job['options'] = {key: value for key, value in options.items() if value is not None}
+    job['options'].update(parallel_sides=args.parallel_sides, fingerprint=args.fingerprint)
+    return job
+
+
+def submit_job(server, job, timeout=None):
+    """
+    :description: Posts a job to the validation service and yields the results of the tables as they are streamed.
+    :param server: Base URL of the service. Eg: http://127.0.0.1:8765
+    :param job: dict, see build_job().
+    :param timeout: Socket timeout in seconds, None to wait for long running tables.
+    :return: Generator of result dicts, see batch.validate_table().
+    """
+
+    request = urllib.request.Request(f"{server.rstrip('/')}/validate", data=json.dumps(job).encode(),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        raise ValueError(json.loads(e.read() or b'{}').get('error', str(e))) from None
+    with response:
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+
+
+def print_result(result):
+    """
+    :description: Prints the one line status of a table, like batch.print_summary().
+    """
+
+    print(f"{result['status']:<15} {result['elapsed']:>9.3f}s  "
+          f"{result['snowflake_table_name']} <- {result['netezza_table_name']}", flush=True)
+
+
+def run_client(args):
+    """
+    :description: Submits the job of the command line arguments to args.server, prints the results as they are
+                  streamed back, then the messages of the tables which did not pass and the number of passed tables.
+    :param args: argparse.Namespace of client.py, or of main.py with --server.
+    :return: Exit code: 0 if all the tables passed, 1 if any did not, 2 if the job failed.
+    """
+
+    results = []
+    try:
+        for table_result in submit_job(args.server, build_job(args)):
+            print_result(table_result)
+            results.append(table_result)
+    except (ValueError, urllib.error.URLError) as e:
+        print(f"Job failed: {e}", file=sys.stderr)
+        return 2
+
+    for table_result in sorted(results, key=lambda r: r['index']):
+        if table_result['status'] != PASSED:
+            print(f"\n{table_result['snowflake_table_name']} ({table_result['status']}):\n{table_result['message']}")
+    failed = sum(table_result['status'] != PASSED for table_result in results)
+    print(f"\n{len(results) - failed} of {len(results)} tables passed validation.")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Submit a validation job to the validation service.")
+    parser.add_argument("snowflake_table_name", nargs='?',
+                        help="Full name of the table in Snowflake. Format: DB.SCHEMA.TABLE.")
+    parser.add_argument(
+        "netezza_table_name", nargs='?', help="Full name of the table in Netezza. Format: DB.SCHEMA.TABLE.")
+    parser.add_argument("--server", default=DEFAULT_SERVER, help="Base URL of the validation service.")
+    parser.add_argument("--manifest", help="CSV or YAML file with the table pairs to be validated. See batch.py.")
+    parser.add_argument(
+        "--date_column", help="Column in the table which can be used to query for the required data validation.")
+    parser.add_argument("--start_date", help="Start date from which the data has to be queried.")
+    parser.add_argument("--end_date", help="End date up to which the data has to be queried.")
+    parser.add_argument("--sample_fraction", help="Validate a sample of the rows, a fraction or 'auto'.")
+    parser.add_argument("--sample_key", help="Column deciding which rows are sampled, the whole row by default.")
+    parser.add_argument("--rel_tol", type=float, help="Relative tolerance for AVG and floating point metrics.")
+    parser.add_argument("--abs_tol", type=float, help="Absolute tolerance for AVG and floating point metrics.")
+    parser.add_argument(
+        "--parallel_sides", action="store_true", help="Query Netezza and Snowflake at the same time for each table.")
+    parser.add_argument(
+        "--partition_by", help="Validate counts and metrics per day/week/month/quarter/year of the date column.")
+    parser.add_argument(
+        "--incremental_store",
+        help="File name of the SQLite store keeping per bucket aggregates between runs, in the --store_dir of the "
+             "service.")
+    parser.add_argument(
+        "--fingerprint", action="store_true", help="Compare hash fingerprints instead of the column metrics.")
+    args = parser.parse_args()
+    if not args.manifest and (not args.snowflake_table_name or not args.netezza_table_name):
+        parser.error("snowflake_table_name and netezza_table_name are required unless --manifest is given")
+    sys.exit(run_client(args))
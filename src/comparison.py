@@ -0,0 +1,202 @@
+############################################ Validation Comparison Engine ##############################################
+# Description : Compares the validation metrics from Netezza and Snowflake column-wise. The Snowflake validation json
+#               is flattened into a dataframe indexed by ATTNAME, aligned with the Netezza validation dataframe once
+#               and every metric is compared in vectorized form. The mismatch report is built from the boolean mask.
+
+import numpy as np
+import pandas as pd
+
+from defaults import DEFAULT_ABS_TOL, DEFAULT_REL_TOL
+from query_builder import BUCKET, METRIC_COLUMNS, TOTAL_RECORD_COUNT
+
+
+DATE_METRICS = ('MIN_DATE', 'MAX_DATE')
+
+# metrics that are computed, not read from the data, and can differ in the last digits between the two systems
+APPROX_METRICS = ('AVG',)
+
+# Snowflake data types that are stored as binary floating point
+FLOAT_DATA_TYPES = ('FLOAT', 'FLOAT4', 'FLOAT8', 'DOUBLE', 'DOUBLE PRECISION', 'REAL')
+
+
+def flatten_validation_json(val_json):
+    """
+    :description: Flattens the validation json returned from the Snowflake stored procedure.
+    :param val_json: dict of ATTNAME --> {DATA_TYPE: .., <metric>: <value>}. TOTAL_RECORD_COUNT must be popped already.
+    :return: pandas.Dataframe indexed by ATTNAME with a DATA_TYPE column and one column per metric.
+    """
+
+    columns = ['DATA_TYPE'] + METRIC_COLUMNS
+    rows = [[params.get(param) for param in columns] for params in val_json.values()]
+    sf_df = pd.DataFrame(rows, index=pd.Index(list(val_json.keys()), name='ATTNAME'), columns=columns, dtype=object)
+    return sf_df
+
+
+def to_timestamps(values):
+    """
+    :description: Normalizes timestamps from both systems so that they can be compared. Snowflake returns timestamps
+                  in ISO format with a trailing 'Z' and optional fractional seconds.
+    :param values: pandas.Series of timestamps or timestamp strings.
+    :return: pandas.Series of datetime64 values, NaT where the value is missing or not a timestamp.
+    """
+
+    text = values.astype(str).str.strip().str.replace(r'(Z|[+-]00:?00)$', '', regex=True)
+    return pd.to_datetime(text, errors='coerce', format='ISO8601')
+
+
+def compare_metric(metric, sf_values, nz_values, is_float, rel_tol, abs_tol):
+    """
+    :description: Compares one metric for all the columns of the table.
+    :param metric: Name of the metric. Eg: AVG, MIN_DATE
+    :param sf_values: pandas.Series of the metric from Snowflake.
+    :param nz_values: pandas.Series of the metric from Netezza, aligned with sf_values.
+    :param is_float: Boolean pandas.Series, True for the columns stored as floating point in Snowflake.
+    :param rel_tol: Relative tolerance for numeric metrics that are not exact.
+    :param abs_tol: Absolute tolerance for numeric metrics that are not exact.
+    :return: Boolean pandas.Series, True where the metric mismatches.
+    """
+
+    if metric in DATE_METRICS:
+        sf_ts = to_timestamps(sf_values)
+        nz_ts = to_timestamps(nz_values)
+        parsed = sf_ts.notna() & nz_ts.notna()
+        return ~((parsed & (sf_ts == nz_ts)) | (~parsed & (sf_values.astype(str) == nz_values.astype(str))))
+
+    sf_num = pd.to_numeric(sf_values, errors='coerce').astype(float)
+    nz_num = pd.to_numeric(nz_values, errors='coerce').astype(float)
+    numeric = sf_num.notna() & nz_num.notna()
+
+    if metric in APPROX_METRICS:
+        approx = pd.Series(True, index=sf_values.index)
+    else:
+        approx = is_float
+    close = pd.Series(np.isclose(sf_num, nz_num, rtol=rel_tol, atol=abs_tol), index=sf_values.index)
+    equal_num = np.where(approx, close, sf_num == nz_num)
+
+    equal_text = sf_values.astype(str) == nz_values.astype(str)
+    return ~pd.Series(np.where(numeric, equal_num, equal_text), index=sf_values.index)
+
+
+def to_native(value):
+    """
+    :description: Converts numpy scalars to python objects so that the report can be serialized to json.
+    """
+
+    if value is None or (np.isscalar(value) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    return value
+
+
+def compare_validation_data(val_df, val_json, rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Compares the Netezza validation dataframe with the Snowflake validation json.
+                  Only the metrics returned from Snowflake for a column are compared, like before.
+    :param val_df: Validation dataframe from Netezza with ATTNAME, FORMAT_TYPE and the metric columns.
+    :param val_json: Validation json from Snowflake without the TOTAL_RECORD_COUNT key.
+    :param rel_tol: Relative tolerance for numeric metrics that are not exact (AVG and floating point columns).
+    :param abs_tol: Absolute tolerance for numeric metrics that are not exact (AVG and floating point columns).
+    :return: report: dict of ATTNAME --> metric --> {'SF': <value>, 'Netezza': <value>}. Empty if all the data matches.
+    """
+
+    return compare_validation_frames(val_df, flatten_validation_json(val_json), rel_tol, abs_tol)
+
+
+def compare_validation_frames(val_df, sf_df, rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Compares the Netezza validation dataframe with the Snowflake metrics dataframe, as returned from
+                  flatten_validation_json() or fetched directly with the metric queries.
+    :param val_df: Validation dataframe from Netezza with ATTNAME, FORMAT_TYPE and the metric columns.
+    :param sf_df: Snowflake dataframe indexed by ATTNAME with a DATA_TYPE column and the metric columns.
+    :return: report: see compare_validation_data().
+    """
+
+    nz_df = val_df.set_index('ATTNAME')
+    sf_df = sf_df.reindex(index=nz_df.index, columns=['DATA_TYPE'] + METRIC_COLUMNS)
+
+    missing = sf_df['DATA_TYPE'].isna()
+    is_float = sf_df['DATA_TYPE'].astype(str).str.split('(').str[0].str.upper().isin(FLOAT_DATA_TYPES)
+
+    mask = pd.DataFrame(False, index=nz_df.index, columns=METRIC_COLUMNS)
+    for metric in METRIC_COLUMNS:
+        present = sf_df[metric].notna()
+        if not present.any():
+            continue
+        mask[metric] = present & compare_metric(metric, sf_df[metric], nz_df[metric], is_float, rel_tol, abs_tol)
+
+    report = dict()
+    for col in nz_df.index[missing]:
+        report[col] = {'DATA_TYPE': {'SF': None, 'Netezza': nz_df.at[col, 'FORMAT_TYPE']}}
+
+    mismatches = mask.stack()
+    for col, metric in mismatches[mismatches].index:
+        report.setdefault(col, dict())[metric] = {'SF': to_native(sf_df.at[col, metric]),
+                                                  'Netezza': to_native(nz_df.at[col, metric])}
+    return report
+
+
+def normalize_buckets(values):
+    """
+    :description: Normalizes the date buckets returned from either system to 'YYYY-MM-DD' strings.
+                  Labels which are not dates, eg: query_builder.ALL_BUCKET, are kept as they are.
+    :param values: pandas.Index of bucket dates or timestamps.
+    """
+
+    values = pd.Series(values, dtype=object)
+    buckets = to_timestamps(values).dt.strftime('%Y-%m-%d')
+    labels = buckets.fillna(values.where(values.notna(), 'NULL').astype(str))
+    return pd.Index(labels, name=BUCKET)
+
+
+def compare_bucket_metrics(nz_counts, nz_metrics, sf_counts, sf_metrics, float_columns=(),
+                           rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Compares the per bucket record counts and metrics of Netezza and Snowflake.
+                  A bucket missing on one side is compared as a bucket without records and reported by its count.
+    :param nz_counts: pandas.Series of Netezza record counts indexed by bucket.
+    :param nz_metrics: pandas.Dataframe of Netezza metrics indexed by bucket with (ATTNAME, metric name) columns.
+    :param sf_counts: pandas.Series of Snowflake record counts indexed by bucket.
+    :param sf_metrics: pandas.Dataframe of Snowflake metrics indexed by bucket with (ATTNAME, metric name) columns.
+    :param float_columns: Names of the columns stored as floating point, compared with the tolerances.
+    :param rel_tol: Relative tolerance for numeric metrics that are not exact.
+    :param abs_tol: Absolute tolerance for numeric metrics that are not exact.
+    :return: report: dict of bucket --> TOTAL_RECORD_COUNT or ATTNAME --> metric --> {'SF': <value>, 'Netezza': <value>}.
+             Empty if all the buckets match.
+    """
+
+    nz_counts, nz_metrics = nz_counts.copy(), nz_metrics.copy()
+    sf_counts, sf_metrics = sf_counts.copy(), sf_metrics.copy()
+    for df in (nz_counts, nz_metrics, sf_counts, sf_metrics):
+        df.index = normalize_buckets(df.index)
+
+    buckets = nz_counts.index.union(sf_counts.index).sort_values()
+    columns = nz_metrics.columns.union(sf_metrics.columns)
+    nz_counts = nz_counts.groupby(level=0).sum().reindex(buckets, fill_value=0)
+    sf_counts = sf_counts.groupby(level=0).sum().reindex(buckets, fill_value=0)
+    nz_metrics = nz_metrics.reindex(index=buckets, columns=columns)
+    sf_metrics = sf_metrics.reindex(index=buckets, columns=columns)
+
+    mask = pd.DataFrame(False, index=buckets, columns=columns)
+    for col, metric in columns:
+        is_float = pd.Series(col in float_columns, index=buckets)
+        mask[(col, metric)] = compare_metric(metric, sf_metrics[(col, metric)], nz_metrics[(col, metric)],
+                                             is_float, rel_tol, abs_tol)
+
+    # a bucket with no records on one side is reported by its count only
+    mask.loc[((nz_counts == 0) | (sf_counts == 0)).values] = False
+
+    report = dict()
+    count_mismatch = nz_counts.astype('int64') != sf_counts.astype('int64')
+    for bucket in buckets[count_mismatch.values]:
+        report[bucket] = {TOTAL_RECORD_COUNT: {'SF': to_native(sf_counts[bucket]),
+                                               'Netezza': to_native(nz_counts[bucket])}}
+
+    rows, columns = np.nonzero(mask.eq(True).to_numpy())
+    for bucket, (col, metric) in zip(mask.index[rows], mask.columns[columns]):
+        report.setdefault(bucket, dict()).setdefault(col, dict())[metric] = {
+            'SF': to_native(sf_metrics.at[bucket, (col, metric)]),
+            'Netezza': to_native(nz_metrics.at[bucket, (col, metric)])}
+    return dict(sorted(report.items()))
@@ -0,0 +1,251 @@
+############################################ Connection Pools and Credentials ##########################################
+# Description : Shared connection pools for Netezza and Snowflake and an in-process cache for the credentials read
+#               from the SSM parameter store. A pooled connection is logged in and set up (role, warehouse) once and
+#               then reused by every table validated in the process, SSM is hit once per run instead of once per table.
+
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+
+DEFAULT_CREDENTIAL_TTL = 3600
+DEFAULT_POOL_SIZE = 4
+# idle connections older than this are checked with the health check query before they are handed out again
+DEFAULT_HEALTH_CHECK_INTERVAL = 60
+
+_ssm_client = None
+_ssm_lock = threading.Lock()
+
+
+def get_ssm_client():
+    """
+    :description: Returns the SSM client of the process, created on first use.
+    """
+
+    global _ssm_client
+    with _ssm_lock:
+        if _ssm_client is None:
+            import boto3  # imported on first use, slow to import
+            _ssm_client = boto3.client('ssm')
+        return _ssm_client
+
+
+def get_ssm_parameters(*names):
+    """
+    :description: Reads and decrypts the given parameters from the SSM parameter store in a single call.
+    :param names: Names of the parameters.
+    :return: Tuple of the parameter values in the order of names.
+    """
+
+    response = get_ssm_client().get_parameters(Names=list(names), WithDecryption=True)
+    values = {param['Name']: param['Value'] for param in response['Parameters']}
+    missing = [name for name in names if name not in values]
+    if missing:
+        raise KeyError(f"Parameters not found in SSM parameter store: {', '.join(missing)}")
+    return tuple(values[name] for name in names)
+
+
+class CredentialCache:
+    """
+    Thread safe in-process cache for connection credentials with a time to live.
+
+    ...
+
+    Attributes
+    ----------
+    ttl: int
+        Number of seconds a cached value is served before it is loaded again.
+
+
+    Methods
+    -------
+    get(key, loader)
+        Returns the cached value for key, calling loader() when it is missing or expired.
+
+    clear()
+        Drops all the cached values.
+    """
+
+    def __init__(self, ttl=DEFAULT_CREDENTIAL_TTL):
+        """
+        :description: Constructor to create CredentialCache objects.
+        :param ttl: Number of seconds a cached value is served before it is loaded again.
+        """
+        self.ttl = ttl
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """
+        :description: Returns the cached value for key, calling loader() when it is missing or expired.
+                      The lock is held while loading so that concurrent callers wait for one SSM call.
+        :param key: Cache key. Eg: 'netezza'
+        :param loader: Function without arguments which returns the value to be cached.
+        """
+        with self._lock:
+            expiry, value = self._values.get(key, (0, None))
+            if time.monotonic() >= expiry:
+                value = loader()
+                self._values[key] = (time.monotonic() + self.ttl, value)
+            return value
+
+    def clear(self):
+        """
+        :description: Drops all the cached values, the next get() loads them again.
+        """
+        with self._lock:
+            self._values.clear()
+
+
+credential_cache = CredentialCache()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections shared by the threads of the process.
+
+    ...
+
+    Attributes
+    ----------
+    connect: function
+        Function without arguments which opens a new connection.
+
+    setup: function
+        Function called once with every new connection to set up the session. Eg: USE ROLE, USE WAREHOUSE
+
+    max_size: int
+        Maximum number of connections open at the same time. acquire() blocks when all of them are in use.
+
+    health_check_query: str
+        Query run on idle connections before they are handed out again.
+
+    health_check_interval: int
+        Number of idle seconds after which a connection is health checked.
+
+
+    Methods
+    -------
+    acquire(timeout)
+        Returns a healthy connection from the pool, opening a new one if the pool is not full yet.
+
+    release(conn, discard)
+        Returns a connection to the pool, or closes it when discard is True.
+
+    connection()
+        Context manager acquiring a connection and releasing it at the end of the block.
+
+    close_all()
+        Closes all the idle connections of the pool.
+    """
+
+    def __init__(self, connect, setup=None, max_size=DEFAULT_POOL_SIZE, health_check_query='select 1',
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL):
+        """
+        :description: Constructor to create ConnectionPool objects. No connection is opened until acquire() is called.
+        """
+        self.connect = connect
+        self.setup = setup
+        self.max_size = max_size
+        self.health_check_query = health_check_query
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        """
+        :description: Opens and sets up a new connection. The pool slot is given back if that fails.
+        """
+        try:
+            conn = self.connect()
+            if self.setup:
+                self.setup(conn)
+            return conn
+        except Exception:
+            with self._lock:
+                self._size -= 1
+            raise
+
+    def _is_healthy(self, conn):
+        """
+        :description: Runs the health check query on the connection.
+        """
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute(self.health_check_query)
+                cur.fetchall()
+            finally:
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, timeout=None):
+        """
+        :description: Returns a healthy connection from the pool, opening a new one if the pool is not full yet.
+                      Blocks until a connection is released when all max_size connections are in use.
+        :param timeout: Maximum number of seconds to wait for a connection. Waits forever if None.
+        """
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._size < self.max_size
+                    if can_open:
+                        self._size += 1
+                if can_open:
+                    return self._open()
+                try:
+                    conn, idle_since = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No connection available in the pool after {timeout} seconds")
+
+            if time.monotonic() - idle_since < self.health_check_interval or self._is_healthy(conn):
+                return conn
+            self.release(conn, discard=True)
+
+    def release(self, conn, discard=False):
+        """
+        :description: Returns a connection to the pool.
+        :param conn: Connection acquired from this pool.
+        :param discard: Closes the connection instead, eg: after a connection error.
+        """
+        if discard:
+            with self._lock:
+                self._size -= 1
+            try:
+                conn.close()
+            except Exception:
+                pass
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """
+        :description: Context manager acquiring a connection and releasing it at the end of the block.
+                      The connection is discarded if the block raises and it fails the health check.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, discard=not self._is_healthy(conn))
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        """
+        :description: Closes all the idle connections of the pool.
+        """
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.release(conn, discard=True)
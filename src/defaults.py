@@ -0,0 +1,29 @@
+############################################ Command Line Defaults #####################################################
+# Description : Default values of the command line options, shared by the command lines and the modules using them.
+#               Only plain constants without imports, so that main.py and client.py can build their argument parsers
+#               and answer --help without importing pandas, the database drivers or the JVM bridge.
+
+
+# comparison.py: tolerances for AVG and floating point metrics
+DEFAULT_REL_TOL = 1e-9
+DEFAULT_ABS_TOL = 1e-6
+# query_builder.py: DATE_TRUNC units supported by both Netezza and Snowflake
+PARTITION_GRAINS = ('day', 'week', 'month', 'quarter', 'year')
+# sampling.py: number of sampled rows aimed at when the fraction is tuned from the table count
+DEFAULT_TARGET_ROWS = 1000000
+# row_diff.py: number of differing rows listed in the report
+DEFAULT_MAX_ROWS = 100
+# catalog.py: SQLite file of the schema catalog
+DEFAULT_CATALOG_PATH = 'schema_catalog.db'
+# journal.py: seconds to wait before the first retry of a table, doubled for each next one
+DEFAULT_RETRY_BACKOFF = 30.0
+# tracing.py: number of tables, columns and functions in the trace summary
+DEFAULT_TOP = 10
+# batch.py: sample_fraction value of the tables validated on a sample with the fraction tuned from the table count
+AUTO_SAMPLE = 'auto'
+# batch.py: tables validated at the same time, and tables queried at the same time on each side
+DEFAULT_WORKERS = 8
+DEFAULT_NETEZZA_CONCURRENCY = 4
+DEFAULT_SNOWFLAKE_CONCURRENCY = 4
+# client.py: base URL of the validation service, see service.py
+DEFAULT_SERVER = 'http://127.0.0.1:8765'
@@ -0,0 +1,154 @@
+############################################ Content Fingerprint Queries ###############################################
+# Description : Builds order independent hash aggregates which prove that the content of a table is the same on
+#               Netezza and Snowflake without moving any rows. Every value is first formatted canonically per data
+#               type so that both systems hash the same text, then hashed with MD5 and summed:
+#                 - one fingerprint per column, to locate the mismatching columns
+#                 - one fingerprint of the whole row, to catch values swapped between rows
+#               The Netezza hash functions (hash, rawtohex, string_to_int) come from the SQL Extensions Toolkit.
+
+from query_builder import build_queries, get_check_type
+
+
+FINGERPRINT = 'FINGERPRINT'
+ROW_FINGERPRINT = 'ROW_FINGERPRINT'
+
+# text hashed for NULL values, so that a NULL and an empty string fingerprint differently
+NULL_TOKEN = '~'
+# separator between the canonical column values in the row fingerprint
+ROW_SEPARATOR = '|'
+
+INTEGER_TYPES = ('INTEGER', 'BYTEINT', 'SMALLINT', 'BIGINT')
+FLOAT_TYPES = ('REAL', 'DOUBLE PRECISION', 'FLOAT')
+
+# canonical text of a value per canonical type and database. Floats are rounded to 6 decimals since the two
+# systems print binary floats differently. Netezza CHAR columns are blank padded, Snowflake does not pad.
+CANONICAL_TEMPLATES = {
+    'netezza': {
+        'INTEGER': "CAST({col} AS VARCHAR(40))",
+        'NUMERIC': "CAST({col} AS VARCHAR(80))",
+        'FLOAT': "CAST(CAST(ROUND({col}, 6) AS NUMERIC(38, 6)) AS VARCHAR(80))",
+        'CHAR': "RTRIM({col})",
+        'VARCHAR': "{col}",
+        'DATE': "TO_CHAR({col}, 'YYYY-MM-DD')",
+        'TIMESTAMP': "TO_CHAR({col}, 'YYYY-MM-DD HH24:MI:SS.US')",
+        'TIME': "TO_CHAR({col}, 'HH24:MI:SS.US')",
+        'BOOLEAN': "CASE WHEN {col} THEN 'T' ELSE 'F' END",
+    },
+    'snowflake': {
+        'INTEGER': "CAST({col} AS VARCHAR)",
+        'NUMERIC': "CAST({col} AS VARCHAR)",
+        'FLOAT': "CAST(CAST(ROUND({col}, 6) AS NUMBER(38, 6)) AS VARCHAR)",
+        'CHAR': "RTRIM({col})",
+        'VARCHAR': "{col}",
+        'DATE': "TO_CHAR({col}, 'YYYY-MM-DD')",
+        'TIMESTAMP': "TO_CHAR({col}, 'YYYY-MM-DD HH24:MI:SS.FF6')",
+        'TIME': "TO_CHAR({col}, 'HH24:MI:SS.FF6')",
+        'BOOLEAN': "CASE WHEN {col} THEN 'T' ELSE 'F' END",
+    },
+}
+
+# 28 bit integer from the MD5 of a text, identical on both systems. 28 bits keep every hash inside a
+# 32 bit integer on Netezza, the sums are done on NUMERIC(38) so they do not overflow.
+HASH_TEMPLATES = {
+    'netezza': "string_to_int(substr(rawtohex(hash({expr}, 0)), 26, 7), 16)",
+    'snowflake': "TO_NUMBER(SUBSTR(UPPER(MD5({expr})), 26, 7), 'XXXXXXX')",
+}
+
+SUM_TEMPLATE = "SUM(CAST({hash} AS NUMERIC(38, 0)))"
+
+
+def get_canonical_type(format_type):
+    """
+    :description: Refines the check type of a Netezza FORMAT_TYPE (see query_builder.get_check_type) into the
+                  canonical type deciding how its values are formatted before hashing.
+    :param format_type: Data type of the column as in _v_relation_column. Eg: CHARACTER VARYING(20)
+    :return: One of the CANONICAL_TEMPLATES keys, None if the column cannot be fingerprinted.
+    """
+
+    dtype = format_type.split('(')[0].strip().upper()
+    check_type = get_check_type(format_type)
+    if check_type == 'NUMBER':
+        if dtype in INTEGER_TYPES:
+            return 'INTEGER'
+        return 'FLOAT' if dtype in FLOAT_TYPES else 'NUMERIC'
+    elif check_type == 'VARCHAR':
+        return 'VARCHAR' if 'VARYING' in dtype or 'VARCHAR' in dtype else 'CHAR'
+    elif check_type == 'DATETIME':
+        if dtype == 'DATE':
+            return 'DATE'
+        elif dtype.startswith('TIMESTAMP'):
+            return 'TIMESTAMP'
+        elif dtype.startswith('TIME'):
+            return 'TIME'
+        return None
+    elif dtype == 'BOOLEAN':
+        return 'BOOLEAN'
+    return None
+
+
+def get_canonical_expression(col, format_type, dialect):
+    """
+    :description: Canonical text of the column values in the given database, NULL_TOKEN for NULL values.
+    :param col: Name of the column.
+    :param format_type: Netezza data type of the column.
+    :param dialect: 'netezza' or 'snowflake'
+    :return: SQL expression, None if the column cannot be fingerprinted.
+    """
+
+    canonical_type = get_canonical_type(format_type)
+    if canonical_type is None:
+        return None
+    expr = CANONICAL_TEMPLATES[dialect][canonical_type].format(col=col)
+    return f"COALESCE({expr}, '{NULL_TOKEN}')"
+
+
+def get_row_expression(columns, dialect):
+    """
+    :description: Canonical text of the whole row in the given database, the canonical column values joined with
+                  ROW_SEPARATOR.
+    :param columns: Iterable of (ATTNAME, FORMAT_TYPE) pairs, the Netezza column details.
+    :param dialect: 'netezza' or 'snowflake'
+    :return: SQL expression, None if no column can be fingerprinted.
+    """
+
+    canonical = [get_canonical_expression(col, format_type, dialect) for col, format_type in columns]
+    canonical = [expr for expr in canonical if expr is not None]
+    return f" || '{ROW_SEPARATOR}' || ".join(canonical) if canonical else None
+
+
+def get_fingerprint_items(columns, dialect):
+    """
+    :description: Generates the per column and the row fingerprint aggregates of the table.
+    :param columns: Iterable of (ATTNAME, FORMAT_TYPE) pairs, the Netezza column details.
+    :param dialect: 'netezza' or 'snowflake'
+    :return: List of (sql expression, alias, column name, metric name) tuples, see query_builder.get_select_items().
+    """
+
+    columns = list(columns)
+    items = []
+    for idx, (col, format_type) in enumerate(columns):
+        expr = get_canonical_expression(col, format_type, dialect)
+        if expr is None:
+            continue
+        hash_expr = HASH_TEMPLATES[dialect].format(expr=expr)
+        items.append((SUM_TEMPLATE.format(hash=hash_expr), f"{FINGERPRINT}_{idx}", col, FINGERPRINT))
+
+    row_expr = get_row_expression(columns, dialect)
+    if row_expr is not None:
+        hash_expr = HASH_TEMPLATES[dialect].format(expr=row_expr)
+        items.append((SUM_TEMPLATE.format(hash=hash_expr), ROW_FINGERPRINT, ROW_FINGERPRINT, FINGERPRINT))
+    return items
+
+
+def build_fingerprint_queries(full_table_name, columns, dialect, where_clause='', group_by=None):
+    """
+    :description: Builds the fingerprint queries of the table for the given database, with the record count.
+    :param full_table_name: Complete name of the table --> DB.SCHEMA.TABLENAME
+    :param columns: Iterable of (ATTNAME, FORMAT_TYPE) pairs, the Netezza column details.
+    :param dialect: 'netezza' or 'snowflake'
+    :param where_clause: Where clause restricting the rows to be fingerprinted.
+    :param group_by: Optional date bucket expression to fingerprint each bucket separately.
+    :return: List of (query, aliases) tuples, see query_builder.build_queries().
+    """
+
+    return build_queries(full_table_name, get_fingerprint_items(columns, dialect), where_clause, group_by)
@@ -0,0 +1,235 @@
+############################################ Run Journal ###############################################################
+# Description : Local SQLite journal of a batch run. Every table pair of the manifest is a unit of work, keyed by the
+#               entry and the validation options. A unit is recorded as RUNNING when it starts and with its status,
+#               message, record counts, metrics and per date bucket results when it finishes, so a run restarted after
+#               a crash, a dropped connection or an interrupt with the same journal skips the finished units without
+#               scanning them again. Units which ended with an ERROR or were interrupted while RUNNING are validated again.
+
+import json
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from comparison import normalize_buckets
+
+
+RUNNING = 'RUNNING'
+# statuses of the units validated again by a restarted run, batch.ERROR and the interrupted units
+RETRY_STATUSES = ('ERROR', RUNNING)
+
+PARTITION_COLUMNS = ['bucket', 'status', 'netezza_count', 'snowflake_count', 'details']
+# columns of result_sink.METRIC_SCHEMA, the numbers are recorded as text so that no digit is lost
+METRIC_COLUMNS = ['attname', 'data_type', 'metric', 'netezza_number', 'snowflake_number', 'netezza_text',
+                  'snowflake_text', 'mismatch']
+# columns added to the units table after its first version, created when a journal of an older run is opened
+UNIT_COLUMNS = [('netezza_count', 'integer'), ('snowflake_count', 'integer'), ('report', 'text')]
+
+
+def get_unit_key(entry, **options):
+    """
+    :description: Identifies a unit of work by its manifest entry and the options changing what is validated, so that
+                  a run with other options or another date range does not reuse the results of a previous run.
+    :param entry: Manifest entry, see batch.load_manifest().
+    :param options: Validation options. Eg: partition_by='month', fingerprint=True
+    :return: Hex digest of the entry and the options.
+    """
+
+    text = json.dumps({'entry': entry, 'options': options}, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def get_partition_rows(nz_counts, sf_counts, report):
+    """
+    :description: Per date bucket results of a partitioned or fingerprint validation.
+    :param nz_counts: pandas.Series of Netezza record counts indexed by bucket.
+    :param sf_counts: pandas.Series of Snowflake record counts indexed by bucket.
+    :param report: Report of the mismatching buckets, see comparison.compare_bucket_metrics(), empty if all matched.
+    :return: List of dicts with the PARTITION_COLUMNS keys, status PASSED or DATA_MISMATCH.
+    """
+
+    counts = dict()
+    for side, side_counts in (('netezza_count', nz_counts), ('snowflake_count', sf_counts)):
+        side_counts = pd.Series(side_counts.values, index=normalize_buckets(side_counts.index))
+        for bucket, count in side_counts.groupby(level=0).sum().items():
+            counts.setdefault(bucket, {'netezza_count': 0, 'snowflake_count': 0})[side] = int(count)
+
+    rows = []
+    for bucket in sorted(set(counts) | set(report)):
+        details = report.get(bucket)
+        rows.append({'bucket': bucket,
+                     'status': 'PASSED' if details is None else 'DATA_MISMATCH',
+                     'netezza_count': counts.get(bucket, dict()).get('netezza_count', 0),
+                     'snowflake_count': counts.get(bucket, dict()).get('snowflake_count', 0),
+                     'details': None if details is None else json.dumps(details, default=str)})
+    return rows
+
+
+class RunJournal:
+    """
+    Class to represent the local SQLite journal of the units of work of batch runs. Thread safe.
+
+    ...
+
+    Attributes
+    ----------
+    path: str
+        Path of the SQLite database file.
+
+
+    Methods
+    -------
+    get_finished(unit_keys)
+        Returns the results of the units which finished and do not have to be validated again.
+
+    start(unit_key, entry)
+        Records a unit as RUNNING and counts the attempt.
+
+    finish(unit_key, result, partitions, counts, metric_rows, report)
+        Records the result of a unit with its record counts, metrics and per bucket results.
+
+    load_details(unit_key, table_name)
+        Returns the recorded record counts, metrics and mismatch report of a unit.
+    """
+
+    def __init__(self, path):
+        """
+        :description: Constructor to create RunJournal objects. Creates the SQLite tables if they do not exist.
+        :param path: Path of the SQLite database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""create table if not exists units (
+                unit_key text primary key,
+                snowflake_table_name text not null,
+                netezza_table_name text not null,
+                status text not null,
+                message text,
+                elapsed real,
+                attempts integer not null default 0,
+                started_at text,
+                finished_at text)""")
+            columns = {row[1] for row in conn.execute("pragma table_info(units)")}
+            for column, column_type in UNIT_COLUMNS:
+                if column not in columns:
+                    conn.execute(f"alter table units add column {column} {column_type}")
+            conn.execute("""create table if not exists partitions (
+                unit_key text not null,
+                bucket text not null,
+                status text not null,
+                netezza_count integer,
+                snowflake_count integer,
+                details text,
+                primary key (unit_key, bucket))""")
+            conn.execute("""create table if not exists metrics (
+                unit_key text not null,
+                attname text not null,
+                data_type text,
+                metric text not null,
+                netezza_number text,
+                snowflake_number text,
+                netezza_text text,
+                snowflake_text text,
+                mismatch integer not null,
+                primary key (unit_key, attname, metric))""")
+
+    @contextmanager
+    def _connect(self):
+        """
+        :description: Opens a connection to the journal, commits the transaction at the end of the block and closes
+                      it. Every update is committed right away, so nothing recorded is lost when the process dies.
+        """
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_finished(self, unit_keys):
+        """
+        :description: Returns the recorded results of the units which finished with a status other than
+                      RETRY_STATUSES.
+        :param unit_keys: Keys of the units of the run, see get_unit_key().
+        :return: dict of unit key --> result dict, see batch.validate_table().
+        """
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(f"""select unit_key, snowflake_table_name, netezza_table_name, status, message, elapsed
+                from units where status not in ({', '.join('?' * len(RETRY_STATUSES))})""",
+                                RETRY_STATUSES).fetchall()
+        unit_keys = set(unit_keys)
+        return {unit_key: {'snowflake_table_name': snowflake_table_name,
+                           'netezza_table_name': netezza_table_name,
+                           'status': status,
+                           'message': message or '',
+                           'elapsed': elapsed}
+                for unit_key, snowflake_table_name, netezza_table_name, status, message, elapsed in rows
+                if unit_key in unit_keys}
+
+    def start(self, unit_key, entry):
+        """
+        :description: Records a unit as RUNNING and counts the attempt. A unit still RUNNING when the next run starts
+                      was interrupted.
+        :param unit_key: Key of the unit, see get_unit_key().
+        :param entry: Manifest entry of the unit.
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute("""insert into units (unit_key, snowflake_table_name, netezza_table_name, status, attempts,
+                                               started_at)
+                values (?, ?, ?, ?, 1, current_timestamp)
+                on conflict (unit_key) do update set status = excluded.status, attempts = attempts + 1,
+                    started_at = excluded.started_at, finished_at = null""",
+                         (unit_key, entry['snowflake_table_name'], entry['netezza_table_name'], RUNNING))
+
+    def finish(self, unit_key, result, partitions=None, counts=(None, None), metric_rows=None, report=None):
+        """
+        :description: Records the result of a unit with its record counts, mismatch report and metrics, and replaces
+                      its per bucket results, in a single transaction.
+        :param unit_key: Key of the unit, see get_unit_key().
+        :param result: Result dict, see batch.validate_table().
+        :param partitions: List of per bucket result dicts, see get_partition_rows(), None to keep the recorded ones.
+        :param counts: (Netezza, Snowflake) record counts, None when not computed.
+        :param metric_rows: pandas.Dataframe of metric rows, see result_sink.get_metric_rows(), None when not compared.
+        :param report: Mismatch report of the unit, None if it passed or was not compared.
+        """
+        counts = [None if count is None or pd.isna(count) else int(count) for count in counts]
+        metrics = [] if metric_rows is None else [
+            (unit_key, *(None if pd.isna(value) else int(value) if key == 'mismatch' else str(value)
+                         for key, value in zip(METRIC_COLUMNS, row)))
+            for row in metric_rows[METRIC_COLUMNS].itertuples(index=False)]
+        with self._lock, self._connect() as conn:
+            conn.execute("""update units set status = ?, message = ?, elapsed = ?, netezza_count = ?,
+                                             snowflake_count = ?, report = ?, finished_at = current_timestamp
+                where unit_key = ?""", (result['status'], result['message'], result['elapsed'], *counts,
+                                        None if not report else json.dumps(report, default=str), unit_key))
+            conn.execute("delete from metrics where unit_key = ?", (unit_key,))
+            conn.executemany(f"insert into metrics values ({', '.join('?' * (len(METRIC_COLUMNS) + 1))})", metrics)
+            if partitions is not None:
+                conn.execute("delete from partitions where unit_key = ?", (unit_key,))
+                conn.executemany("insert into partitions values (?, ?, ?, ?, ?, ?)",
+                                 [(unit_key, *(row[key] for key in PARTITION_COLUMNS)) for row in partitions])
+
+    def load_details(self, unit_key, table_name):
+        """
+        :description: Returns the recorded record counts, metrics and mismatch report of a finished unit, eg: to write
+                      a unit skipped by a restarted run to its result sink.
+        :param unit_key: Key of the unit, see get_unit_key().
+        :param table_name: Full name of the table in Snowflake, the snowflake_table_name of the metric rows.
+        :return: counts: (Netezza, Snowflake) record counts, None when not computed,
+                 metric_rows: pandas.Dataframe with the result_sink.METRIC_SCHEMA columns, None when not compared,
+                 report: mismatch report, None if the unit passed or was not compared.
+        """
+        with self._lock, self._connect() as conn:
+            netezza_count, snowflake_count, report = conn.execute(
+                "select netezza_count, snowflake_count, report from units where unit_key = ?", (unit_key,)).fetchone()
+            rows = conn.execute(f"""select {', '.join(METRIC_COLUMNS)} from metrics where unit_key = ?
+                order by rowid""", (unit_key,)).fetchall()
+        metric_rows = None
+        if rows:
+            metric_rows = pd.DataFrame(rows, columns=METRIC_COLUMNS, dtype=object)
+            metric_rows.insert(0, 'snowflake_table_name', table_name)
+            metric_rows['mismatch'] = metric_rows['mismatch'].astype(bool)
+        return (netezza_count, snowflake_count), metric_rows, None if report is None else json.loads(report)
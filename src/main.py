@@ -1,546 +1,299 @@
 ################################## Netezza to Snowflake Migration Validation Script ####################################
-# Description : Code to validate data migration from netezza to snowflake using snowflake Stored procedures and Netezza queries
-#               Uses snowflake connector and netezza connector libraries
+# Description : Command line of the validation of data migrated from netezza to snowflake, see validation.py for the
+#               Netezza and Snowflake classes and the validation functions. The validation modules are imported once
+#               the arguments are parsed, --help does not load pandas or the database drivers, and --server submits
+#               the validation to a running validation service with client.py instead.
 # Author: Chins Kuriakose
 # Created on: 25/11/2022
 # Last updated on: 25/11/2022
 # Usage: python main.py [-h] [--date_column DATE_COLUMN] [--start_date START_DATE] [--end_date END_DATE] snowflake_table_name netezza_table_name
+#        python main.py [-h] --manifest MANIFEST [--workers WORKERS] [--netezza_concurrency N] [--snowflake_concurrency N]
+#        python main.py [-h] --server URL [--manifest MANIFEST | snowflake_table_name netezza_table_name]
 
 import sys
-import json
-import boto3
 import argparse
-import jaydebeapi
-import numpy as np
-import pandas as pd
-import snowflake.connector as sf
+from defaults import (AUTO_SAMPLE, DEFAULT_ABS_TOL, DEFAULT_CATALOG_PATH, DEFAULT_MAX_ROWS, DEFAULT_NETEZZA_CONCURRENCY,
+                      DEFAULT_REL_TOL, DEFAULT_RETRY_BACKOFF, DEFAULT_SNOWFLAKE_CONCURRENCY, DEFAULT_TARGET_ROWS,
+                      DEFAULT_TOP, DEFAULT_WORKERS, PARTITION_GRAINS)
 
 
-# ssm_client = boto3.client('ssm')
-
-
-class CountValidationError(Exception):
-    """
-        Exception raised when the snowflake data count and netezza data count mismatches after the migration task.
-    """
-
-    def __init__(self, sf_count, net_count) -> None:
-        """
-            :description: constructor function to update the error message in the exception
-            :param sf_count: Count of records in snowflake db after migration.
-            :param net_count: Count of records in netezza db which was migrated to snowflake.
-            :usage: raise CountVaildationError(<sf_count>, <net_count>)
-            :output: Counts mismatched.
-                     Snowflake count : <sf_count>
-                     Netezza count : <net_count>
-        """
-
-        self.message = f"Counts mismatched.\nSnowflake count : {sf_count}\nNetezza count : {net_count}"
-        super().__init__(self.message)
-
-
-class DataValidationError(Exception):
-    """
-        Exception raised when the Data validation between snowflake and netezza databases fail after the migration task.
-    """
-
-    def __init__(self, report: dict) -> None:
-        """
-            :description: constructor function to update the error message in the exception
-            :param report: Dictionary containing info regarding mismatched validation data
-            :usage: raise DataVaildationError(<report>)
-            :output: Data Validation Failed.
-                     Report:
-                     {
-                        "ADD_TYPE": {
-                            "MAX_STR_LENGTH": {
-                                "SF": 22,
-                                "Netezza": 20.0
-                            }
-                        },
-                        "ETL_UPDATE_DATE": {
-                            "MIN": {
-                                "SF": "2015-05-28 15:53:00",
-                                "Netezza": "2015-05-28 15:53:31"
-                            }
-                        }
-                     }
-        """
-
-        self.message = f"Data Validation Failed.\nReport:\n{json.dumps(report, indent=4)}"
-        super().__init__(self.message)
-
-
-class Netezza:
-
-    """
-    Class to represent table in Netezza database.
-
-    ...
-
-    Attributes
-    ----------
-    netezza_date_col: str
-        Load date column for Netezza tables. Used by default if no particular date column is mentioned in the input.
-
-    conn: nzpy connection object
-        A connection object to interact with Netezza
-
-    db_name: str
-        Name of the database in Netezza for the table to be validated.
-
-    schema_name: str
-        Name of the schema in Netezza for the table to be validated.
-
-    table_name: str
-        Name of the table for which validation has to be done.
-
-    full_table_name: str
-        Complete name of the table --> DB.SCHEMA.TABLENAME
-
-    date_col: str
-        Name of the column which contains the date for which the validation has to be done.
-
-    start_date: str
-        Start date/timestamp from which the data has to be queried for validation.
-
-    end_date: str
-        End date/timestamp up to which the data has to be queried for validation.
-
-    where_clause: str
-        Based on the date parameter, the query to get data from the netezza table may use this where clause.
-
-    val_df: pandas.Dataframe
-        Dataframe which would contain the column name, data type and other validation parameters from Netezza.
-
-
-    Methods
-    -------
-    connect_netezza()
-        Creates connection object with credentials from parameter store.
-
-    set_where_clause()
-        Update the where_clause attribute based on the timestamp constraints as per the input.
-
-    get_table_count()
-        Gets count of records from the Netezza table using SQL query.
-
-    get_column_dtype_info()
-        Queries _v_relation_column table to get column details of the table from Netezza.
-
-    int_col_checks(col)
-        Returns average, minimum, maximum, sum for the specified (input) column using SQL query from the Netezza table.
-
-    varchar_col_checks(col)
-        Returns max character length in the specified (input) column from the table in Netezza using SQL query.
-
-    datetime_col_checks(col)
-        Returns minimum and maximum value for the specified (input) column from the table in Netezza using SQL query.
-
-    func_selector(col)
-        Invokes the right validation function based on the column datatype.
-
-    validate_columns()
-        Updates the validation dataframe using pandas apply function with func_selector function.
-
-    """
-
-    netezza_date_col = 'ETL_LOAD_DATE'
-
-    def __init__(self, db_name, schema_name, table_name, date_col=netezza_date_col, start_date=None, end_date=None):
-        """
-        :description: Constructor to create Netezza object.
-        :param db_name: Name of the database in which the table resides.
-        :param schema_name: Name of the schema in which the table resides.
-        :param table_name: Name of the table.
-        :param date_col: Name of the date column that is used to query the table for data validation.
-        :param start_date: Start date from which the data in the table has to be queried.
-        :param end_date: End date up to which the data in the table has to be queried.
-        """
-        self.curs = None
-        self.db_name = db_name
-        self.schema_name = schema_name
-        self.table_name = table_name
-        self.full_table_name = f"{self.db_name}.{self.schema_name}.{self.table_name}"
-        self.date_col = date_col
-        self.start_date = start_date
-        self.end_date = end_date
-        self.where_clause = ''
-        self.val_df = None
-        # self.connect_netezza()
-        self.set_where_clause()
-        self.get_column_dtype_info()
-        self.get_table_count()
-        self.validate_columns()
-
-    def get_conn_details(self):
-        """
-        :description: Gets connection credentials from from SSM parameter store.
-        :return: user: str --> username to connect with the netezza database
-                 password: str --> password to connect with the netezza database
-                 host: str --> connection url for netezza db
-        """
-        user = ssm_client.get_parameter('pf_qa_nz_username')
-        password = ssm_client.get_parameter('pf_qa_nz_password',
-                                            WithDecryption=True)
-        host = ssm_client.get_parameter('pf_qa_nz_url_with_db')
-        return user, password, host
-
-    def connect_netezza(self):
-        """
-        :description: Creates connection object with parameterized username, password, hostname, port and database
-                      from parameter store.
-        """
-        user, password, host = self.get_conn_details()
-        jdbc_driver_name = "org.netezza.Driver"
-        jdbc_driver_loc = "/path/to/nzjdbc3.jar"
-        connection_string = f'jdbc:netezza://{host}'
-        url = f'{connection_string}:user={user};password={password}'
-
-        conn = jaydebeapi.connect(jdbc_driver_name, connection_string, {'user': user, 'password': password},
-                                  jars=jdbc_driver_loc)
-        self.curs = conn.cursor()
-
-    def set_where_clause(self):
-        """
-        :description: Update the where_clause attribute based on the timestamp constraints as per the input.
-        """
-
-        if self.start_date and self.end_date:
-            self.where_clause = f"""\nwhere {self.date_col} > '{self.start_date}'
-                        and {self.date_col} < '{self.end_date}'"""
-        elif self.start_date:
-            self.where_clause = f"""\nwhere {self.date_col} > '{self.start_date}'"""
-        elif self.end_date:
-            self.where_clause = f"""\nwhere {self.date_col} < '{self.end_date}'"""
-
-    def get_table_count(self):
-        """
-        :description: Gets count of records from the Netezza table using SQL query.
-        """
-
-        query = f"""select count(*)
-        from {self.full_table_name}{self.where_clause}"""
-
-        # self.table_count = pd.read_sql(query, conn) # use this line once the connection to netezza is created.
-        # remove this once connection to netezza is established
-        self.table_count = 27
-
-    def get_column_dtype_info(self):
-        """
-        :description: Queries _v_relation_column table to get column details of the table from Netezza.
-        """
-
-        query = f"""select 
-                ATTNAME, FORMAT_TYPE 
-            from {self.db_name}.{self.schema_name}._v_relation_column 
-            where NAME = '{self.table_name}' 
-                and DATABASE = '{self.db_name}' 
-                and OWNER = '{self.schema_name}' 
-            order by ATTNUM;"""
-
-        # self.val_df = pd.read_sql(query, conn) # use this line once the connection to netezza is created.
-        # remove this once connection to netezza is established
-
-        self.val_df = pd.read_csv(
-            'src/netezza_col_dtype_sample.csv', sep=',', header='infer')
-
-    def int_col_checks(self, col):
-        """
-        :description: Returns average, minimum, maximum, sum for the specified (input) column
-                      using SQL query from the Netezza table
-        :param col: Name of the column from which the validation details have to be queried from.
-        :return: <average:float>, <minimum:float>, <maximum:float>, <sum:float>, np.NaN
-        """
-
-        query = f"""select AVG({col}) as AVG, 
-            MIN({col}) as MIN, 
-            MAX({col}) as MAX, 
-            SUM({col}) as SUM
-        from {self.full_table_name}{self.where_clause}"""
-
-        # df = pd.read_sql(query, self.curs) # use this line once the connection to netezza is created
-        # remove this once connection to netezza is established
-        df = pd.read_csv('src/int_col_check_sample.csv')
-        return df['AVG'][0], \
-            df['MIN'][0], \
-            df['MAX'][0], \
-            df['SUM'][0], \
-            np.NaN, \
-            np.NaN, \
-            np.NaN
-
-    def varchar_col_checks(self, col):
-        """
-        :description: Returns max character length in the specified (input) column
-                      from the table in Netezza using SQL query.
-        :param col: Name of the column from which the validation details have to be queried from.
-        :return: np.NaN, np.NaN, np.NaN, np.NaN, <max_length:int>
-        """
-
-        query = f"""select 
-            max(length({col})) as MAX_STR_LENGTH
-        from {self.full_table_name}{self.where_clause}"""
-        # df = pd.read_sql(query, self.curs) # use this line once the connection to netezza is created
-        # remove this once connection to netezza is established
-        df = pd.read_csv('src/varchar_col_check_sample.csv')
-        return np.NaN, \
-            np.NaN, \
-            np.NaN, \
-            np.NaN, \
-            np.NaN, \
-            np.NaN, \
-            df['MAX_STR_LENGTH'][0]
-
-    def datetime_col_checks(self, col):
-        """
-        :description: Returns minimum and maximum value for the specified (input) column
-                      from the table in Netezza using SQL query.
-        :param col: Name of the column from which the validation details have to be queried from.
-        :return: np.NaN, <minimum:float>, <maximum:float>, np.NaN, np.NaN
-        """
-
-        query = f"""select 
-            min({col}) as MIN_DATE,
-            max({col}) as MAX_DATE
-        from {self.full_table_name}{self.where_clause}"""
-        # df = pd.read_sql(query, self.curs) # use this line once the connection to netezza is created
-        # remove this once connection to netezza is established
-        df = pd.read_csv('src/date_col_check_sample.csv')
-        return np.NaN, \
-            np.NaN, \
-            np.NaN, \
-            np.NaN, \
-            df['MIN_DATE'][0], \
-            df['MAX_DATE'][0], \
-            np.NaN
-
-    def func_selector(self, col):
-        """
-        :description: Invokes the right validation function based on the column datatype.
-        :param col: Name of the column from which the validation details have to be queried from.
-        :return: Output of function called in the if block.
-                 Pattern: <average:float>, <minimum:float>, <maximum:float>, <sum:float>, <max_length:int>
-        """
-
-        dtype = self.val_df.loc[self.val_df['ATTNAME'] ==
-                                col, 'FORMAT_TYPE'].iloc[0].split('(')[0].upper()
-        if dtype in ('NUMERIC', 'REAL', 'DOUBLE PRECISION', 'INTEGER', 'BYTEINT', 'SMALLINT', 'BIGINT'):
-            return self.int_col_checks(col)
-        elif 'CHAR' in dtype:
-            return self.varchar_col_checks(col)
-        elif dtype in ['DATE', 'INTERVAL'] or 'TIME' in dtype:
-            return self.datetime_col_checks(col)
-        else:
-            return np.NaN, np.NaN, np.NaN, np.NaN, np.NaN, np.NaN, np.NaN
-
-    def validate_columns(self):
-        """
-        :description: Updates the validation dataframe using pandas apply function with func_selector function.
-        """
-
-        self.val_df['AVG'], \
-            self.val_df['MIN'], \
-            self.val_df['MAX'], \
-            self.val_df['SUM'], \
-            self.val_df['MIN_DATE'], \
-            self.val_df['MAX_DATE'], \
-            self.val_df['MAX_STR_LENGTH'] = zip(
-            *self.val_df['ATTNAME'].apply(self.func_selector))
-
-
-class Snowflake:
-    """
-    Class to represent table in Snowflake database
-
-    ...
-    Attributes
-    ----------
-    sf_validation_sp: str
-        Name of the generic validation SP in snowflake which creates a validation json containing the calculated metrics
-        from the Snowflake table
-
-    db_name: str
-        Name of the database in Snowflake for the table to be validated.
-
-    schema_name: str
-        Name of the schema in Snowflake for the table to be validated.
-
-    table_name: str
-        Name of the table for which validation has to be done.
-
-    full_table_name: str
-        Complete name of the table --> DB.SCHEMA.TABLENAME
-
-    val_json: str
-        JSON data returned from the snowflake stored procedure for the particular table.
-
-    table_count: str
-        Count of records in the Snowflake table retrieved from the validation json
-
-
-    Methods
-    -------
-    connect_snowflake()
-        Creates connection object with credentials from parameter store.
-
-    get_validation_json()
-        Executes the generic snowflake SP and retreives the validation json.
-
-    get_table_count()
-        Retrieves record count from Snowflake validation json.
-    """
-
-    sf_validation_sp = 'COMMON.ADMIN.GENERIC_VALIDATION_SP'
-    snowflake_date_col = 'ETL_LOAD_TYPE'
-    snowflake_role = 'SNOWFLAKE_DW_ELT_NONPROD_PII'
-    snowflake_warehouse = 'ELT_WH_NONPROD'
-
-    def __init__(self, db_name, schema_name, table_name, date_col=snowflake_date_col, start_date=None, end_date=None) -> None:
-        """
-        :description: Constructor to create Snowflake class objects.
-        :param db_name: Name of the database in Snowflake for the table to be validated.
-        :param schema_name: Name of the schema in Snowflake for the table to be validated.
-        :param table_name: Name of the table for which validation has to be done.
-        """
-        self.db_name = db_name
-        self.schema_name = schema_name
-        self.table_name = table_name
-        self.full_table_name = f"{self.db_name}.{self.schema_name}.{self.table_name}"
-        self.val_json = dict()
-        self.date_col = date_col
-        self.start_date = start_date
-        self.end_date = end_date
-        self.table_count = None
-        self.cur = None
-        # self.connect_snowflake()
-        self.get_validation_json()
-        self.get_table_count()
-
-    def get_conn_details(self):
-        """
-        :description: Gets connection credentials from from SSM parameter store.
-        :return: user: str --> username to connect with the snowflake database
-                 password: str --> password to connect with the snowflake database
-                 host: str --> connection url for snowflake db
-        """
-        user = ssm_client.get_parameter('pf_qa_sf_username')
-        password = ssm_client.get_parameter('pf_qa_sf_password',
-                                            WithDecryption=True)
-        host = ssm_client.get_parameter('pf_qa_sf_url')
-        return user, password, host
-
-    def connect_snowflake(self):
-        """
-        :description: Creates connection object with credentials from parameter store.
-        """
-        user, password, host = self.get_conn_details()
-        conn = sf.connect(
-            user=user,
-            password=password,
-            account=host
-        )
-        self.cur = conn.cursor()
-        self.cur.execute(f"USE ROLE {Snowflake.snowflake_role}")
-        self.cur.execute(f"USE WAREHOUSE {Snowflake.snowflake_warehouse}")
-
-    def get_validation_json(self):
-        """
-        :description: Executes the generic snowflake SP and retreives the validation json.
-        """
-        query = f"""call {Snowflake.sf_validation_sp}('{self.db_name}', '{self.schema_name}', '{self.table_name}')"""
-        # self.cur.execute(query)
-        # self.val_json = json.loads(self.cur.fetchone()[0])
-        with open("src/sf_val_json_sample.json") as f:
-            self.val_json = json.load(f)
-
-        # {col1 :{datatype: number, avg: 1, min : 2, max : 3}, clm_nm2 :varchar , lenth : ...}
-
-    def get_table_count(self):
-        """
-        :description: Retrieves record count from Snowflake validation json.
-        """
-        self.table_count = self.val_json.pop('TOTAL_RECORD_COUNT')
-
-
-def count_validation(netezza: Netezza, snowflake: Snowflake):
-    """
-    :description: Validates the count of records in netezza and snowflake.
-                  Raises CountValidationError exception if counts mismatched.
-    :param netezza: Object of class Netezza.
-    :param snowflake: Object of class Snowflake.
-    """
-
-    if netezza.table_count != snowflake.table_count:
-        raise CountValidationError(snowflake.table_count, netezza.table_count)
-
-
-def data_validation(netezza: Netezza, snowflake: Snowflake):
-    """
-    :description: Validates the data received from snowflake after executing the generic stored procedure with
-                  the data from Netezza which is queried in the functions in Netezza class.
-                  If there are any validation errors, will raise DataValidationError Exception.
-    :param netezza: Object of class Netezza.
-    :param snowflake: Object of class Snowflake.
-    """
-
-    report = dict()
-    for col in netezza.val_df['ATTNAME'].values:
-        params = list(snowflake.val_json[col].keys())
-
-        # remove 'Z' in snowflake timestamps
-        if 'MAX_DATE' in params and snowflake.val_json[col]['MAX_DATE'].endswith('Z'):
-            snowflake.val_json[col]['MAX_DATE'] = snowflake.val_json[col]['MAX_DATE'][:-2]
-        if 'MIN_DATE' in params and snowflake.val_json[col]['MIN_DATE'].endswith('Z'):
-            snowflake.val_json[col]['MIN_DATE'] = snowflake.val_json[col]['MIN_DATE'][:-2]
-
-        params.remove('DATA_TYPE')
-        for param in params:
-            if snowflake.val_json[col][param] != netezza.val_df.loc[netezza.val_df['ATTNAME'] == col, param].iloc[0]:
-                if col not in report.keys():
-                    report[col] = dict()
-                if param not in report[col].keys():
-                    report[col][param] = dict()
-                report[col][param]['SF'] = snowflake.val_json[col][param]
-                report[col][param]['Netezza'] = netezza.val_df.loc[netezza.val_df['ATTNAME']
-                                                                   == col, param].iloc[0]
-
-    if report:
-        raise DataValidationError(report)
+# options run in this process only, the validation service validates with its own connection, batch and trace options
+LOCAL_OPTIONS = ('connect', 'local_db', 'validation_sp', 'profile', 'sample_rows', 'row_diff', 'bucket', 'max_rows',
+                 'workers', 'netezza_concurrency', 'snowflake_concurrency', 'journal', 'retries', 'retry_backoff',
+                 'results_jsonl', 'results_parquet', 'queue', 'processes', 'threads', 'schedule', 'history',
+                 'netezza_budget', 'snowflake_credit_budget', 'credits_per_hour', 'catalog', 'plan', 'trace',
+                 'trace_top', 'cprofile')
+# batch options of the thread pool, journal and scheduler runs, a --queue run is resumed from its queue file, spread
+# over --processes and --threads and queues the failed units again without a backoff
+QUEUE_REJECTED_OPTIONS = ('workers', 'journal', 'retry_backoff', 'schedule', 'history', 'netezza_budget',
+                          'snowflake_credit_budget', 'credits_per_hour')
 
 
 if __name__ == '__main__':
     # reading input arguments
     parser = argparse.ArgumentParser()
-    parser.add_argument("snowflake_table_name",
+    parser.add_argument("snowflake_table_name", nargs='?',
                         help="Full name of the table in Snowflake. Format: DB.SCHEMA.TABLE.")
     parser.add_argument(
-        "netezza_table_name", help="Full name of the table in Netezza. Format: DB.SCHEMA.TABLE.")
+        "netezza_table_name", nargs='?', help="Full name of the table in Netezza. Format: DB.SCHEMA.TABLE.")
     parser.add_argument(
         "--date_column", help="Column in the table which can be used to query for the required data validation.")
     parser.add_argument(
         "--start_date", help="Start date from which the data is migrated, hence the date in the table from which the data has to be queried.")
     parser.add_argument(
         "--end_date", help="End date up to which the data is migrated, hence the date in the table up to which the data has to be queried.")
+    parser.add_argument(
+        "--rel_tol", type=float, default=DEFAULT_REL_TOL, help="Relative tolerance for AVG and floating point metrics.")
+    parser.add_argument(
+        "--abs_tol", type=float, default=DEFAULT_ABS_TOL, help="Absolute tolerance for AVG and floating point metrics.")
+    parser.add_argument(
+        "--connect", action="store_true", help="Query the Netezza and Snowflake databases instead of the sample data files.")
+    parser.add_argument(
+        "--local_db",
+        help="SQLite file standing in for both Netezza and Snowflake, implies --connect. See backends.py.")
+    parser.add_argument(
+        "--validation_sp", action="store_true",
+        help="Compute the Snowflake metrics with the generic validation SP instead of the metric queries.")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Also compare NULL counts, approximate distinct counts, STDDEV and quantiles, in the same scan.")
+    parser.add_argument(
+        "--parallel_sides", action="store_true", help="Query Netezza and Snowflake at the same time for each table.")
+    parser.add_argument(
+        "--partition_by", choices=PARTITION_GRAINS,
+        help="Validate counts and metrics per day/month/.. of the date column and report the mismatching buckets.")
+    parser.add_argument(
+        "--incremental_store",
+        help="SQLite file keeping per bucket aggregates between runs. Only the rows from the last stored bucket of "
+             "--partition_by (default day) are scanned and merged into the stored totals.")
+    parser.add_argument(
+        "--fingerprint", action="store_true",
+        help="Compare hash fingerprints of the column values and rows instead of the column metrics, per "
+             "--partition_by bucket when given.")
+    parser.add_argument(
+        "--sample", action="store_true",
+        help="Validate a deterministic sample of the rows, with the fraction tuned from the table count.")
+    parser.add_argument(
+        "--sample_fraction", type=float, help="Fraction of the rows to sample, implies --sample.")
+    parser.add_argument(
+        "--sample_key", help="Column deciding which rows are sampled, the whole row by default.")
+    parser.add_argument(
+        "--sample_rows", type=int, default=DEFAULT_TARGET_ROWS,
+        help="Number of rows to sample when the fraction is tuned automatically.")
+    parser.add_argument(
+        "--row_diff", metavar="KEY_COLUMN",
+        help="Stream both tables ordered by this unique key column and report the missing, extra and changed rows.")
+    parser.add_argument(
+        "--bucket", help="Row diff: start date of the failing --partition_by bucket (default day) to restrict to.")
+    parser.add_argument(
+        "--max_rows", type=int, default=DEFAULT_MAX_ROWS, help="Row diff: number of differing rows to report.")
+    parser.add_argument(
+        "--manifest", help="CSV or YAML file with the table pairs to be validated in batch mode. See batch.py.")
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="Batch mode: number of tables validated at the same time.")
+    parser.add_argument(
+        "--netezza_concurrency", type=int, default=DEFAULT_NETEZZA_CONCURRENCY, help="Batch mode: maximum number of tables queried in Netezza at the same time.")
+    parser.add_argument(
+        "--snowflake_concurrency", type=int, default=DEFAULT_SNOWFLAKE_CONCURRENCY, help="Batch mode: maximum number of tables queried in Snowflake at the same time.")
+    parser.add_argument(
+        "--journal", metavar="JOURNAL_FILE",
+        help="Batch mode: SQLite file recording the tables as they finish. A restarted run with the same journal "
+             "skips the finished tables and validates the failed and interrupted ones again. See journal.py.")
+    parser.add_argument(
+        "--retries", type=int, default=0,
+        help="Batch mode: number of times a table ending with an ERROR is validated again.")
+    parser.add_argument(
+        "--retry_backoff", type=float, default=DEFAULT_RETRY_BACKOFF,
+        help="Batch mode: seconds to wait before the first retry, doubled for each next one.")
+    parser.add_argument(
+        "--results_jsonl", metavar="JSONL_FILE",
+        help="Batch mode: append the status, counts and mismatch report of every table to this JSON lines file as "
+             "it finishes. See result_sink.py.")
+    parser.add_argument(
+        "--results_parquet", metavar="PARQUET_DIR",
+        help="Batch mode: write the tables and their metrics, one typed row per column and metric, to Parquet "
+             "datasets in this directory while the run is going, with a summary.json of the run.")
+    parser.add_argument(
+        "--queue", metavar="QUEUE_FILE",
+        help="Batch mode: split the run into table and --partition_by date bucket units on this SQLite work queue, "
+             "validated by --processes local worker processes and by work_queue.py workers on other hosts.")
+    parser.add_argument(
+        "--processes", type=int, default=1,
+        help="Batch mode with --queue: number of local worker processes, 0 to only use workers on other hosts. "
+             "The Netezza and Snowflake concurrency caps are split between them.")
+    parser.add_argument(
+        "--threads", type=int, default=1,
+        help="Batch mode with --queue: number of units validated at the same time by each worker process.")
+    parser.add_argument(
+        "--schedule", action="store_true",
+        help="Batch mode: order the tables by SLA and estimated cost to finish the run early. See scheduler.py.")
+    parser.add_argument(
+        "--history", help="Batch mode: CSV file of the elapsed time of each table, used and updated by --schedule.")
+    parser.add_argument(
+        "--netezza_budget", type=float, help="Batch mode: maximum estimated Netezza seconds, implies --schedule.")
+    parser.add_argument(
+        "--snowflake_credit_budget", type=float,
+        help="Batch mode: maximum estimated Snowflake credits, implies --schedule.")
+    parser.add_argument(
+        "--credits_per_hour", type=float, default=1.0,
+        help="Batch mode: credits per hour of the Snowflake warehouse, for --snowflake_credit_budget.")
+    parser.add_argument(
+        "--catalog", metavar="CATALOG_FILE", nargs='?', const=DEFAULT_CATALOG_PATH,
+        help="Fetch the column metadata of whole schemas in one query per side and cache it in this SQLite file, "
+             f"refreshed when the schema changes. Default file: {DEFAULT_CATALOG_PATH}.")
+    parser.add_argument(
+        "--plan", action="store_true",
+        help="Dry run: print the SQL of every check on each side with its parameters and the bytes EXPLAIN estimates "
+             "it scans, without running the checks. Needs --connect. See query_plan.py.")
+    parser.add_argument(
+        "--trace", metavar="TRACE_FILE",
+        help="Record every query and local phase to this JSON lines file and print the slowest tables and columns.")
+    parser.add_argument(
+        "--trace_top", type=int, default=DEFAULT_TOP,
+        help="Number of tables, columns and functions in the trace summary.")
+    parser.add_argument(
+        "--cprofile", metavar="STATS_FILE",
+        help="Profile the validation of every table with cProfile and dump the merged statistics to this file.")
+    parser.add_argument(
+        "--server", metavar="URL",
+        help="Submit the validation to a running validation service (see service.py) instead of validating in this "
+             "process. The service connects and validates with its own connection and batch options.")
     args = parser.parse_args()
-
-    sf_db, sf_schema, sf_table = args.snowflake_table_name.split('.')
-    net_db, net_schema, net_table = args.netezza_table_name.split('.')
-    date_col = None
-    start_date = None
-    end_date = None
-
+    if args.server:
+        from client import run_client
+        local = [f"--{name}" for name in LOCAL_OPTIONS if getattr(args, name) != parser.get_default(name)]
+        if local:
+            parser.error(f"{', '.join(local)} cannot be used with --server")
+        if not args.manifest and (not args.snowflake_table_name or not args.netezza_table_name):
+            parser.error("snowflake_table_name and netezza_table_name are required unless --manifest is given")
+        if args.sample and not args.sample_fraction:
+            args.sample_fraction = AUTO_SAMPLE
+        sys.exit(run_client(args))
+
+    from backends import SQLiteBackend
+    from catalog import SchemaCatalog
+    from result_store import ResultStore
+    from tracing import print_trace_summary, tracer
+    from validation import (Netezza, Snowflake, count_validation, data_validation, fingerprint_validation,
+                            incremental_validation, load_tables, partition_validation, row_diff_validation,
+                            sample_validation)
+    Snowflake.use_validation_sp = args.validation_sp
+    Netezza.profile = Snowflake.profile = args.profile
+    if args.local_db:
+        Netezza.use_backend(SQLiteBackend(args.local_db))
+        Snowflake.use_backend(SQLiteBackend(args.local_db))
+        args.connect = True
+    if args.catalog:
+        Netezza.catalog = Snowflake.catalog = SchemaCatalog(args.catalog)
+    tracing = bool(args.trace or args.cprofile)
+    if tracing:
+        tracer.start(args.trace, cprofile=bool(args.cprofile))
+
+    if args.plan:
+        from batch import load_manifest
+        from query_plan import plan_tables, print_query_plan
+        if args.manifest:
+            entries = load_manifest(args.manifest)
+        elif args.snowflake_table_name and args.netezza_table_name:
+            entries = [{'snowflake_table_name': args.snowflake_table_name,
+                        'netezza_table_name': args.netezza_table_name,
+                        'date_column': args.date_column, 'start_date': args.start_date, 'end_date': args.end_date,
+                        'sample_fraction': (str(args.sample_fraction) if args.sample_fraction else
+                                            AUTO_SAMPLE if args.sample else None),
+                        'sample_key': args.sample_key}]
+        else:
+            parser.error("snowflake_table_name and netezza_table_name are required unless --manifest is given")
+        store = ResultStore(args.incremental_store) if args.incremental_store else None
+        statements, errors = plan_tables(entries, args.connect, args.partition_by, store, args.fingerprint,
+                                         args.row_diff, args.bucket)
+        print_query_plan(statements, errors)
+        if tracing:
+            tracer.close()
+            print_trace_summary(args.trace_top, args.cprofile)
+        sys.exit(1 if errors else 0)
+
+    if args.manifest:
+        from batch import PASSED, load_manifest, print_summary, run_batch
+        if args.queue:
+            rejected = [f"--{name}" for name in QUEUE_REJECTED_OPTIONS
+                        if getattr(args, name) != parser.get_default(name)]
+            if rejected:
+                parser.error(f"{', '.join(rejected)} cannot be used with --queue, use --processes and --threads")
+            if args.processes > min(args.netezza_concurrency, args.snowflake_concurrency):
+                parser.error("--processes cannot be more than --netezza_concurrency and --snowflake_concurrency, "
+                             "which are split between the worker processes")
+        sink = None
+        if args.results_jsonl or args.results_parquet:
+            from result_sink import ResultSink, print_stream_summary
+            sink = ResultSink(args.results_jsonl, args.results_parquet)
+        if args.queue:
+            from work_queue import get_config, run_sharded_batch
+            results = run_sharded_batch(
+                load_manifest(args.manifest), args.queue, args.processes, args.threads, args.rel_tol, args.abs_tol,
+                args.connect, args.parallel_sides, args.partition_by, args.incremental_store, args.fingerprint,
+                get_config(args), netezza_concurrency=args.netezza_concurrency,
+                snowflake_concurrency=args.snowflake_concurrency, sink=sink, sample_rows=args.sample_rows,
+                retries=args.retries)
+        elif args.schedule or args.netezza_budget is not None or args.snowflake_credit_budget is not None:
+            from scheduler import print_plan, run_scheduled_batch
+            results, plan, makespan = run_scheduled_batch(
+                load_manifest(args.manifest), args.workers, args.netezza_concurrency, args.snowflake_concurrency,
+                args.rel_tol, args.abs_tol, args.connect, args.parallel_sides, args.partition_by,
+                args.incremental_store, args.fingerprint, args.history, args.netezza_budget,
+                args.snowflake_credit_budget, args.credits_per_hour, args.journal, args.retries, args.retry_backoff,
+                sink, args.sample_rows)
+            print_plan(plan, makespan)
+        else:
+            results = run_batch(load_manifest(args.manifest), args.workers, args.netezza_concurrency,
+                                args.snowflake_concurrency, args.rel_tol, args.abs_tol, args.connect,
+                                args.parallel_sides, args.partition_by, args.incremental_store, args.fingerprint,
+                                args.journal, args.retries, args.retry_backoff, sink, args.sample_rows)
+        print_summary(results)
+        if sink is not None:
+            sink.close()
+            print_stream_summary(sink.summary.to_dict())
+        if tracing:
+            tracer.close()
+            print_trace_summary(args.trace_top, args.cprofile)
+        sys.exit(0 if all(result['status'] == PASSED for result in results) else 1)
+    if not args.snowflake_table_name or not args.netezza_table_name:
+        parser.error("snowflake_table_name and netezza_table_name are required unless --manifest is given")
+
+    kwargs = {'start_date': args.start_date, 'end_date': args.end_date, 'connect': args.connect}
     if args.date_column:
-        date_col = args.date_column
-    if args.start_date:
-        start_date = args.start_date
-    if args.end_date:
-        end_date = args.end_date
-
-    netezza = Netezza(sf_db, sf_schema, sf_table,
-                      date_col, start_date, end_date)
-    snowflake = Snowflake(net_db, net_schema, net_table,
-                          date_col, start_date, end_date)
-
-    count_validation(netezza, snowflake)
-    data_validation(netezza, snowflake)
+        kwargs['date_col'] = args.date_column
+    try:
+        with tracer.hot_path(), tracer.phase('table', table=args.snowflake_table_name,
+                                             netezza_table=args.netezza_table_name):
+            if args.incremental_store:
+                netezza, snowflake = load_tables(args.netezza_table_name, args.snowflake_table_name, validate=False,
+                                                 **kwargs)
+                incremental_validation(netezza, snowflake, ResultStore(args.incremental_store),
+                                       args.partition_by or 'day', args.rel_tol, args.abs_tol)
+            elif args.sample or args.sample_fraction:
+                netezza, snowflake = load_tables(args.netezza_table_name, args.snowflake_table_name, validate=False,
+                                                 **kwargs)
+                sample_validation(netezza, snowflake, args.sample_fraction, args.sample_key, args.sample_rows,
+                                  rel_tol=args.rel_tol, abs_tol=args.abs_tol)
+            elif args.row_diff:
+                netezza, snowflake = load_tables(args.netezza_table_name, args.snowflake_table_name, validate=False,
+                                                 **kwargs)
+                row_diff_validation(netezza, snowflake, args.row_diff, args.bucket, args.partition_by,
+                                    max_rows=args.max_rows, rel_tol=args.rel_tol, abs_tol=args.abs_tol)
+            elif args.fingerprint:
+                netezza, snowflake = load_tables(args.netezza_table_name, args.snowflake_table_name, validate=False,
+                                                 **kwargs)
+                fingerprint_validation(netezza, snowflake, args.partition_by)
+            elif args.partition_by:
+                netezza, snowflake = load_tables(args.netezza_table_name, args.snowflake_table_name, validate=False,
+                                                 **kwargs)
+                partition_validation(netezza, snowflake, args.partition_by, args.rel_tol, args.abs_tol)
+            else:
+                netezza, snowflake = load_tables(args.netezza_table_name, args.snowflake_table_name,
+                                                 args.parallel_sides, **kwargs)
+                count_validation(netezza, snowflake)
+                data_validation(netezza, snowflake, args.rel_tol, args.abs_tol)
+    finally:
+        if tracing:
+            tracer.close()
+            print_trace_summary(args.trace_top, args.cprofile)
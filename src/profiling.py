@@ -0,0 +1,111 @@
+############################################ Column Profiling Metrics ##################################################
+# Description : Extra column metrics computed in the same scan as the validation metrics, to catch NULL handling and
+#               deduplication bugs: NULL count, approximate distinct count, standard deviation and approximate
+#               quantiles. Snowflake uses its sketches (APPROX_COUNT_DISTINCT, APPROX_PERCENTILE). Netezza has no
+#               distinct count sketch, it counts the distinct values of a hash sample of the values instead, and
+#               computes the quantiles exactly. The approximate metrics are compared within their error bounds.
+
+import numpy as np
+import pandas as pd
+
+from comparison import DEFAULT_ABS_TOL, DEFAULT_REL_TOL, to_native
+from fingerprint import HASH_TEMPLATES
+from query_builder import METRIC_COLUMNS, METRIC_TEMPLATES
+
+
+# quantile metric name --> quantile
+QUANTILES = (('P50', 0.5), ('P95', 0.95))
+PROFILE_COLUMNS = ['NULL_COUNT', 'APPROX_DISTINCT', 'STDDEV'] + [metric for metric, _ in QUANTILES]
+
+# Netezza counts the distinct values whose hash is a multiple of DISTINCT_SAMPLING and scales the count up
+DISTINCT_SAMPLING = 16
+# relative standard error of Snowflake APPROX_COUNT_DISTINCT (HyperLogLog)
+HLL_RELATIVE_ERROR = 0.0162
+# maximum rank error of Snowflake APPROX_PERCENTILE, as a fraction of the values
+QUANTILE_RANK_ERROR = 0.01
+# STDDEV is computed with different floating point algorithms on the two systems
+STDDEV_REL_TOL = 1e-6
+# number of standard errors of the approximate distinct counts tolerated
+DISTINCT_Z = 3
+
+NULL_COUNT_TEMPLATE = "SUM(CASE WHEN {col} IS NULL THEN 1 ELSE 0 END)"
+
+DISTINCT_TEMPLATES = {
+    'netezza': (f"COUNT(DISTINCT CASE WHEN MOD("
+                f"{HASH_TEMPLATES['netezza'].format(expr='CAST({col} AS VARCHAR(1000))')}, {DISTINCT_SAMPLING}) = 0 "
+                f"THEN {{col}} END) * {DISTINCT_SAMPLING}"),
+    'snowflake': "APPROX_COUNT_DISTINCT({col})",
+}
+
+QUANTILE_TEMPLATES = {
+    'netezza': "PERCENTILE_CONT({quantile}) WITHIN GROUP (ORDER BY {{col}})",
+    'snowflake': "APPROX_PERCENTILE({{col}}, {quantile})",
+}
+
+
+def get_profile_templates(dialect):
+    """
+    :description: Metric templates of the validation metrics extended with the profiling metrics of the database,
+                  see query_builder.get_select_items().
+    :param dialect: 'netezza' or 'snowflake'
+    :return: dict of check type --> ((metric name, aggregate expression), ..)
+    """
+
+    common = (('NULL_COUNT', NULL_COUNT_TEMPLATE), ('APPROX_DISTINCT', DISTINCT_TEMPLATES[dialect]))
+    numeric = (('STDDEV', 'STDDEV_SAMP({col})'),) + tuple(
+        (metric, QUANTILE_TEMPLATES[dialect].format(quantile=quantile)) for metric, quantile in QUANTILES)
+
+    templates = {check_type: metrics + common for check_type, metrics in METRIC_TEMPLATES.items()}
+    templates['NUMBER'] = templates['NUMBER'] + numeric
+    return templates
+
+
+def get_distinct_bound(nz_distinct, sf_distinct):
+    """
+    :description: Tolerated difference between the Netezza hash sampled and the Snowflake HyperLogLog distinct counts.
+                  The relative standard error of the hash sample is sqrt((DISTINCT_SAMPLING - 1) / distinct count).
+    """
+
+    distinct = np.maximum(nz_distinct, sf_distinct)
+    nz_error = np.sqrt((DISTINCT_SAMPLING - 1) * distinct)
+    sf_error = HLL_RELATIVE_ERROR * distinct
+    return DISTINCT_Z * np.sqrt(nz_error ** 2 + sf_error ** 2)
+
+
+def compare_profiles(val_df, sf_df, rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Compares the profiling metrics of Netezza and Snowflake with error aware tolerances:
+                  NULL_COUNT exactly, STDDEV within STDDEV_REL_TOL, APPROX_DISTINCT within the combined error of the
+                  two estimates and the quantiles within QUANTILE_RANK_ERROR of the value range (MAX - MIN).
+    :param val_df: Validation dataframe from Netezza with ATTNAME and the metric and profiling columns.
+    :param sf_df: Snowflake dataframe indexed by ATTNAME with the metric and profiling columns.
+    :return: report: dict of ATTNAME --> metric --> {'SF': <value>, 'Netezza': <value>}. Empty if all the profiles match.
+    """
+
+    nz_df = val_df.set_index('ATTNAME')
+    sf_df = sf_df.reindex(index=nz_df.index)
+    columns = [metric for metric in PROFILE_COLUMNS if metric in nz_df.columns and metric in sf_df.columns]
+    nz_num = nz_df.reindex(columns=columns + METRIC_COLUMNS).apply(pd.to_numeric, errors='coerce').astype(float)
+    sf_num = sf_df.reindex(columns=columns + METRIC_COLUMNS).apply(pd.to_numeric, errors='coerce').astype(float)
+
+    value_range = (nz_num['MAX'] - nz_num['MIN']).abs().fillna(0)
+    quantiles = dict(QUANTILES)
+
+    def get_bound(metric):
+        if metric == 'APPROX_DISTINCT':
+            return get_distinct_bound(nz_num[metric], sf_num[metric])
+        elif metric == 'STDDEV':
+            return max(rel_tol, STDDEV_REL_TOL) * np.maximum(nz_num[metric].abs(), sf_num[metric].abs())
+        elif metric in quantiles:
+            return QUANTILE_RANK_ERROR * value_range
+        return pd.Series(0.0, index=nz_num.index)
+
+    report = dict()
+    for metric in columns:
+        nz_values, sf_values = nz_num[metric], sf_num[metric]
+        tolerance = get_bound(metric).fillna(0) + abs_tol
+        mismatch = ((nz_values - sf_values).abs() > tolerance) | (nz_values.isna() != sf_values.isna())
+        for col in nz_df.index[mismatch.values]:
+            report.setdefault(col, dict())[metric] = {'SF': to_native(sf_df.at[col, metric]),
+                                                      'Netezza': to_native(nz_df.at[col, metric])}
+    return report
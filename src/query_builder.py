@@ -0,0 +1,340 @@
+############################################ Validation Query Builder ##################################################
+# Description : Builds the aggregate SQL used to validate Netezza tables. All the column checks (AVG/MIN/MAX/SUM,
+#               MAX(LENGTH), MIN/MAX date) and the record count are fused into as few table scans as possible.
+#               The select list is split into several wide statements only when it exceeds the SQL length limits.
+#               The same queries can be grouped by a date bucket (day/month/..) to validate a table partition-wise.
+#               The date ranges are half open and bound as parameters, see WhereClause.
+
+import numpy as np
+import pandas as pd
+
+from defaults import PARTITION_GRAINS
+
+
+# column alias used for the record count in the first fused statement
+TOTAL_RECORD_COUNT = 'TOTAL_RECORD_COUNT'
+# column alias of the date bucket in the grouped queries
+BUCKET = 'BUCKET'
+# bucket label of the results of queries which are not grouped
+ALL_BUCKET = 'ALL'
+# length of a bucket of each grain
+GRAIN_OFFSETS = {
+    'day': pd.DateOffset(days=1),
+    'week': pd.DateOffset(weeks=1),
+    'month': pd.DateOffset(months=1),
+    'quarter': pd.DateOffset(months=3),
+    'year': pd.DateOffset(years=1),
+}
+
+# validation dataframe columns, in the order func_selector returns them
+METRIC_COLUMNS = ['AVG', 'MIN', 'MAX', 'SUM', 'MIN_DATE', 'MAX_DATE', 'MAX_STR_LENGTH']
+
+# Netezza types, followed by the Snowflake INFORMATION_SCHEMA types which Netezza does not have
+NUMBER_TYPES = ('NUMERIC', 'REAL', 'DOUBLE PRECISION', 'INTEGER', 'BYTEINT', 'SMALLINT', 'BIGINT',
+                'NUMBER', 'DECIMAL', 'FLOAT', 'DOUBLE')
+VARCHAR_TYPES = ('TEXT', 'STRING')
+DATETIME_TYPES = ('DATE', 'INTERVAL')
+
+# metric name --> aggregate expression, per check type
+METRIC_TEMPLATES = {
+    'NUMBER': (('AVG', 'AVG({col})'),
+               ('MIN', 'MIN({col})'),
+               ('MAX', 'MAX({col})'),
+               ('SUM', 'SUM({col})')),
+    'VARCHAR': (('MAX_STR_LENGTH', 'MAX(LENGTH({col}))'),),
+    'DATETIME': (('MIN_DATE', 'MIN({col})'),
+                 ('MAX_DATE', 'MAX({col})')),
+}
+
+# metrics which can be merged across date buckets, AVG is derived from SUM and VALUE_COUNT after merging
+MERGEABLE_TEMPLATES = {
+    'NUMBER': (('MIN', 'MIN({col})'),
+               ('MAX', 'MAX({col})'),
+               ('SUM', 'SUM({col})'),
+               ('VALUE_COUNT', 'COUNT({col})')),
+    'VARCHAR': (('MAX_STR_LENGTH', 'MAX(LENGTH({col}))'),),
+    'DATETIME': (('MIN_DATE', 'MIN({col})'),
+                 ('MAX_DATE', 'MAX({col})')),
+}
+
+# Netezza rejects statements longer than 64KB and select lists wider than 1600 columns.
+# Both limits are kept well below the hard limits so that the generated SQL stays readable in query history.
+MAX_QUERY_LENGTH = 60000
+MAX_SELECT_ITEMS = 1000
+
+
+def get_check_type(format_type):
+    """
+    :description: Maps a Netezza FORMAT_TYPE, or a Snowflake DATA_TYPE, to the kind of checks that apply to the column.
+    :param format_type: Data type of the column as in _v_relation_column. Eg: CHARACTER VARYING(20)
+    :return: 'NUMBER', 'VARCHAR', 'DATETIME' or None if the column is not validated.
+    """
+
+    dtype = format_type.split('(')[0].strip().upper()
+    if dtype in NUMBER_TYPES:
+        return 'NUMBER'
+    elif 'CHAR' in dtype or dtype in VARCHAR_TYPES:
+        return 'VARCHAR'
+    elif dtype in DATETIME_TYPES or 'TIME' in dtype:
+        return 'DATETIME'
+    return None
+
+
+class WhereClause(str):
+    """
+    Where clause with bind parameters. It is used as text in the f-strings of the query builders, the values of its
+    ? markers are kept in the params attribute and passed to cursor.execute() with the built query, see get_params().
+    The date values are compared to the columns as bound constants, the databases convert them to the type of the
+    column, so the columns are not converted and the zone maps (Netezza) and the micro-partition pruning (Snowflake)
+    skip the blocks out of the range. The SQL text is the same for every table, date range and bucket with the same
+    shape, so the statements can be reused by the statement caches of the drivers and databases.
+    """
+
+    def __new__(cls, text='', params=()):
+        clause = super().__new__(cls, text)
+        clause.params = tuple(params)
+        return clause
+
+
+def get_params(where_clause):
+    """
+    :description: Returns the bind parameters of a where clause, empty for where clauses without parameters.
+    :param where_clause: WhereClause, or plain str.
+    :return: tuple of the values of the ? markers, in the order of the markers.
+    """
+
+    return getattr(where_clause, 'params', ())
+
+
+def to_param(value):
+    """
+    :description: Converts a date/timestamp bound to the text bound to a ? marker, 'YYYY-MM-DD' for dates and
+                  'YYYY-MM-DD HH:MM:SS[.ffffff]' for timestamps, which both databases convert to DATE and TIMESTAMP.
+    """
+
+    if isinstance(value, str):
+        return value
+    value = pd.Timestamp(value)
+    if value == value.normalize():
+        return f"{value:%Y-%m-%d}"
+    return value.isoformat(sep=' ')
+
+
+def build_where_clause(date_col, start_date=None, end_date=None):
+    """
+    :description: Builds the where clause restricting the validation to the rows from start_date (included) up to
+                  end_date (excluded). The half open range does not lose the rows on the bounds and consecutive
+                  ranges do not overlap.
+    :param date_col: Name of the date column.
+    :param start_date: Start date/timestamp from which the data has to be queried.
+    :param end_date: End date/timestamp up to which the data has to be queried.
+    :return: WhereClause starting with a new line, empty if there is no date constraint.
+    """
+
+    conditions = []
+    params = []
+    if start_date:
+        conditions.append(f"{date_col} >= ?")
+        params.append(to_param(start_date))
+    if end_date:
+        conditions.append(f"{date_col} < ?")
+        params.append(to_param(end_date))
+    if not conditions:
+        return WhereClause()
+    return WhereClause("\nwhere " + "\n                        and ".join(conditions), params)
+
+
+def build_watermark_clause(date_col, watermark, where_clause=''):
+    """
+    :description: Restricts the where clause of an incremental validation to the rows from the watermark on and the
+                  rows without a date, which cannot be told apart from the ones validated before.
+    :param date_col: Name of the date column.
+    :param watermark: Start of the last validated date bucket, None if the table was never validated.
+    :param where_clause: Where clause of the table, see build_where_clause().
+    """
+
+    if watermark is None:
+        return WhereClause(where_clause, get_params(where_clause))
+    return add_condition(where_clause, f"({date_col} >= ? or {date_col} is null)", (to_param(watermark),))
+
+
+def add_condition(where_clause, condition, params=()):
+    """
+    :description: Adds a condition to a where clause built by the functions above.
+    :param where_clause: Where clause starting with a new line, or empty string.
+    :param condition: SQL condition. Eg: ID is not null
+    :param params: Values of the ? markers of the condition.
+    :return: WhereClause with the parameters of the where clause followed by the ones of the condition.
+    """
+
+    params = get_params(where_clause) + tuple(params)
+    if where_clause:
+        return WhereClause(f"""{where_clause}
+                        and {condition}""", params)
+    return WhereClause(f"""\nwhere {condition}""", params)
+
+
+def build_bucket_clause(date_col, bucket, grain, where_clause=''):
+    """
+    :description: Restricts a where clause to the rows of one date bucket, eg: a bucket reported by partition validation.
+    :param date_col: Name of the date column.
+    :param bucket: Start of the bucket as 'YYYY-MM-DD'.
+    :param grain: One of PARTITION_GRAINS.
+    :param where_clause: Where clause of the table, see build_where_clause().
+    """
+
+    if grain not in PARTITION_GRAINS:
+        raise ValueError(f"Partition grain must be one of {', '.join(PARTITION_GRAINS)}, not {grain}")
+    if bucket == 'NULL':
+        return add_condition(where_clause, f"{date_col} is null")
+    start = pd.Timestamp(bucket)
+    end = start + GRAIN_OFFSETS[grain]
+    return add_condition(where_clause, f"{date_col} >= ? and {date_col} < ?", (to_param(start), to_param(end)))
+
+
+def build_count_query(full_table_name, where_clause=''):
+    """
+    :description: Builds the record count query of the table, it has the parameters of the where clause.
+    """
+
+    return f"""select count(*)
+        from {full_table_name}{where_clause}"""
+
+
+def get_bucket_expression(date_col, grain):
+    """
+    :description: Expression truncating the date column to its bucket, identical in Netezza and Snowflake.
+    :param date_col: Name of the date column.
+    :param grain: One of PARTITION_GRAINS.
+    """
+
+    if grain not in PARTITION_GRAINS:
+        raise ValueError(f"Partition grain must be one of {', '.join(PARTITION_GRAINS)}, not {grain}")
+    return f"DATE_TRUNC('{grain.upper()}', {date_col})"
+
+
+def get_select_items(columns, templates=METRIC_TEMPLATES):
+    """
+    :description: Generates the aggregate expressions for every column of the table.
+    :param columns: Iterable of (ATTNAME, FORMAT_TYPE) pairs.
+    :param templates: dict of check type --> (metric name, aggregate expression) pairs. Eg: MERGEABLE_TEMPLATES
+    :return: List of (sql expression, alias, column name, metric name) tuples.
+    """
+
+    items = []
+    for idx, (col, format_type) in enumerate(columns):
+        for metric, template in templates.get(get_check_type(format_type), ()):
+            items.append((template.format(col=col), f"{metric}_{idx}", col, metric))
+    return items
+
+
+def build_metric_queries(full_table_name, columns, where_clause='', group_by=None, templates=METRIC_TEMPLATES,
+                         max_query_length=MAX_QUERY_LENGTH, max_select_items=MAX_SELECT_ITEMS):
+    """
+    :description: Builds the fused aggregate queries for the table. The first statement also returns the record count,
+                  so the whole validation needs a single scan unless the select list has to be split.
+    :param full_table_name: Complete name of the table --> DB.SCHEMA.TABLENAME
+    :param columns: Iterable of (ATTNAME, FORMAT_TYPE) pairs.
+    :param where_clause: Where clause restricting the rows to be validated.
+    :param group_by: Optional expression to group the metrics by, returned as the BUCKET column of every statement.
+                     Every split statement repeats the count(*) so that each one can be compared on its own.
+    :param templates: Metrics to be computed for each check type, see get_select_items().
+    :param max_query_length: Maximum number of characters in a generated statement.
+    :param max_select_items: Maximum number of expressions in the select list of a generated statement.
+    :return: List of (query, aliases) tuples where aliases maps each result column to its (column name, metric name).
+    """
+
+    return build_queries(full_table_name, get_select_items(columns, templates), where_clause, group_by,
+                         max_query_length, max_select_items)
+
+
+def build_queries(full_table_name, items, where_clause='', group_by=None,
+                  max_query_length=MAX_QUERY_LENGTH, max_select_items=MAX_SELECT_ITEMS):
+    """
+    :description: Packs the aggregate expressions into as few statements as the SQL length limits allow, with the
+                  record count in the first statement (in every statement when grouped).
+    :param full_table_name: Complete name of the table --> DB.SCHEMA.TABLENAME
+    :param items: List of (sql expression, alias, column name, metric name) tuples, see get_select_items().
+    :param where_clause: Where clause restricting the rows to be validated.
+    :param group_by: Optional expression to group the metrics by, see build_metric_queries().
+    :param max_query_length: Maximum number of characters in a generated statement.
+    :param max_select_items: Maximum number of expressions in the select list of a generated statement.
+    :return: List of (query, aliases) tuples where aliases maps each result column to its (column name, metric name).
+    """
+
+    prefix = f"select {group_by} as {BUCKET},\n    " if group_by else 'select '
+    suffix = f"\nfrom {full_table_name}{where_clause}"
+    if group_by:
+        suffix += f"\ngroup by {group_by}"
+    count_item = ("count(*)", TOTAL_RECORD_COUNT, None, TOTAL_RECORD_COUNT)
+    items = [count_item] + list(items)
+
+    batches = []
+    batch = []
+    batch_length = len(prefix) + len(suffix)
+    for expr, alias, col, metric in items:
+        item_length = len(f"{expr} as {alias},\n    ")
+        if batch and (batch_length + item_length > max_query_length or len(batch) >= max_select_items):
+            batches.append(batch)
+            batch = [count_item] if group_by else []
+            batch_length = len(prefix) + len(suffix) + sum(len(f"{i[0]} as {i[1]},\n    ") for i in batch)
+        batch.append((expr, alias, col, metric))
+        batch_length += item_length
+    if batch:
+        batches.append(batch)
+
+    queries = []
+    for batch in batches:
+        select_list = ',\n    '.join(f"{expr} as {alias}" for expr, alias, _, _ in batch)
+        aliases = {alias: (col, metric) for _, alias, col, metric in batch}
+        queries.append((f"{prefix}{select_list}{suffix}", aliases))
+    return queries
+
+
+def parse_metric_results(attnames, results, metric_columns=METRIC_COLUMNS):
+    """
+    :description: Converts the single row results of the fused queries into validation dataframe columns.
+    :param attnames: Column names of the table in the order of the validation dataframe.
+    :param results: List of (result row, aliases) tuples. result row is a dict like object keyed by upper case alias.
+    :param metric_columns: Names of the metrics to be returned, eg: with the profiling metrics.
+    :return: table_count, dict of metric name --> list of values aligned with attnames.
+    """
+
+    table_count = None
+    values = dict()
+    for row, aliases in results:
+        for alias, (col, metric) in aliases.items():
+            if metric == TOTAL_RECORD_COUNT:
+                table_count = row[alias]
+            else:
+                values[(col, metric)] = row[alias]
+
+    metrics = {metric: [values.get((col, metric), np.NaN) for col in attnames] for metric in metric_columns}
+    return table_count, metrics
+
+
+def parse_bucket_results(results):
+    """
+    :description: Converts the results of the grouped fused queries into one dataframe per table side.
+    :param results: List of (result dataframe, aliases) tuples. Each result dataframe has a BUCKET column and one
+                    column per alias, with upper case column names. Results of queries without group by are
+                    labelled ALL_BUCKET.
+    :return: counts: pandas.Series of record counts indexed by BUCKET,
+             metrics: pandas.Dataframe indexed by BUCKET with (ATTNAME, metric name) columns.
+    """
+
+    frames = []
+    for df, aliases in results:
+        if BUCKET not in df.columns:
+            df = df.assign(**{BUCKET: ALL_BUCKET})
+        df = df.set_index(BUCKET)[list(aliases)]
+        df.columns = pd.MultiIndex.from_tuples([(aliases[alias][0] or TOTAL_RECORD_COUNT, aliases[alias][1])
+                                                for alias in df.columns])
+        frames.append(df)
+    merged = pd.concat(frames, axis=1)
+    count_column = (TOTAL_RECORD_COUNT, TOTAL_RECORD_COUNT)
+    counts = merged[count_column]
+    if isinstance(counts, pd.DataFrame):
+        counts = counts.iloc[:, 0]
+    metrics = merged.drop(columns=[count_column])
+    return counts.rename(TOTAL_RECORD_COUNT), metrics
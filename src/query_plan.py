@@ -0,0 +1,216 @@
+############################################ Query Plan (Dry Run) ######################################################
+# Description : Dry run of a validation. Builds every statement the checks of a table pair would run on each side,
+#               with the same query builders and where clauses as the validation, and asks each database for its plan
+#               with EXPLAIN (see backends.Backend.explain()) instead of running it. Prints the statements with their
+#               bind parameters and the bytes the databases estimate they scan after zone map and partition pruning.
+#               Only the column metadata lookups are run, the statements depend on the columns of the tables.
+
+from itertools import groupby
+
+from validation import Netezza, Snowflake, load_tables
+from batch import get_entry_sample_fraction, get_table_kwargs
+from query_builder import (MERGEABLE_TEMPLATES, METRIC_TEMPLATES, add_condition, build_bucket_clause,
+                           build_count_query, build_metric_queries, build_watermark_clause, get_bucket_expression,
+                           get_params)
+from fingerprint import build_fingerprint_queries
+from profiling import get_profile_templates
+from row_diff import build_row_query
+from sampling import SAMPLE_TEMPLATES, build_sample_condition
+
+
+def get_table_statements(netezza: Netezza, snowflake: Snowflake, grain=None, fingerprint=False, store=None,
+                         sample=False, sample_fraction=None, sample_key=None, row_diff_key=None, bucket=None):
+    """
+    :description: Builds the statements the validation of a table pair runs on each side, for the same options as
+                  main.py: incremental with store, sampled, row diff, fingerprint, partitioned by grain or full.
+    :param netezza: Object of class Netezza, created with validate=False.
+    :param snowflake: Object of class Snowflake, created with validate=False.
+    :param grain: --partition_by grain.
+    :param fingerprint: Fingerprint validation, per bucket of grain when given.
+    :param store: ResultStore of incremental validation, only its watermarks are read.
+    :param sample: Sampled validation.
+    :param sample_fraction: Fraction of the sample. When None the fraction is tuned from the Snowflake record count
+                            at run time, only the count statement is planned.
+    :param sample_key: Column deciding which rows are sampled.
+    :param row_diff_key: Key column of the row diff.
+    :param bucket: Row diff: start of the date bucket of grain (default day) to restrict to.
+    :return: List of dicts with side, table, check, query and params keys, Netezza first.
+    """
+
+    columns = list(zip(netezza.val_df['ATTNAME'], netezza.val_df['FORMAT_TYPE']))
+    sides = (('NETEZZA', netezza), ('SNOWFLAKE', snowflake))
+    statements = []
+
+    def add(side, table, check, queries, where_clause):
+        for query in queries:
+            statements.append({'side': side, 'table': table.full_table_name, 'check': check, 'query': query,
+                               'params': get_params(where_clause)})
+
+    if store is not None:
+        grain = grain or 'day'
+        for side, table in sides:
+            where_clause = build_watermark_clause(table.date_col, store.get_watermark(table.full_table_name, side,
+                                                                                      grain), table.where_clause)
+            add(side, table, f'incremental {grain} buckets',
+                [query for query, _ in build_metric_queries(table.full_table_name, columns, where_clause,
+                                                            get_bucket_expression(table.date_col, grain),
+                                                            MERGEABLE_TEMPLATES)], where_clause)
+    elif sample and sample_fraction is None:
+        add('SNOWFLAKE', snowflake, 'sample count, the sample fraction is tuned from it',
+            [build_count_query(snowflake.full_table_name, snowflake.where_clause)], snowflake.where_clause)
+    elif sample:
+        for side, table in sides:
+            condition = build_sample_condition(columns, table.dialect, sample_fraction, sample_key)
+            where_clause = add_condition(table.where_clause, condition) if condition else table.where_clause
+            add(side, table, f'sample {sample_fraction:g}',
+                [query for query, _ in build_metric_queries(table.full_table_name, columns, where_clause,
+                                                            templates=SAMPLE_TEMPLATES)], where_clause)
+    elif row_diff_key:
+        key = row_diff_key.upper()
+        names = [col.upper() for col, _ in columns]
+        for side, table in sides:
+            where_clause = table.where_clause
+            if bucket:
+                where_clause = build_bucket_clause(table.date_col, bucket, grain or 'day', where_clause)
+            add(side, table, 'row diff', [build_row_query(table.full_table_name, names, key, where_clause)],
+                where_clause)
+    elif fingerprint:
+        for side, table in sides:
+            group_by = get_bucket_expression(table.date_col, grain) if grain else None
+            add(side, table, f'fingerprint {grain or "table"}',
+                [query for query, _ in build_fingerprint_queries(table.full_table_name, columns, table.dialect,
+                                                                 table.where_clause, group_by)], table.where_clause)
+    elif grain:
+        for side, table in sides:
+            add(side, table, f'{grain} buckets',
+                [query for query, _ in build_metric_queries(table.full_table_name, columns, table.where_clause,
+                                                            get_bucket_expression(table.date_col, grain))],
+                table.where_clause)
+    else:
+        templates = get_profile_templates(netezza.dialect) if Netezza.profile else METRIC_TEMPLATES
+        add('NETEZZA', netezza, 'metrics',
+            [query for query, _ in build_metric_queries(netezza.full_table_name, columns, netezza.where_clause,
+                                                        templates=templates)], netezza.where_clause)
+        if Snowflake.use_validation_sp:
+            add('SNOWFLAKE', snowflake, 'validation SP',
+                [f"""call {Snowflake.sf_validation_sp}('{snowflake.db_name}', '{snowflake.schema_name}', """
+                 f"""'{snowflake.table_name}')"""], '')
+        else:
+            with snowflake.session():
+                snowflake.get_column_types()
+            templates = get_profile_templates(snowflake.dialect) if Snowflake.profile else METRIC_TEMPLATES
+            add('SNOWFLAKE', snowflake, 'metrics',
+                [query for query, _ in build_metric_queries(snowflake.full_table_name, snowflake.col_types,
+                                                            snowflake.where_clause, templates=templates)],
+                snowflake.where_clause)
+    return statements
+
+
+def explain_statements(statements, netezza: Netezza, snowflake: Snowflake):
+    """
+    :description: Adds the plan of every statement from the database of its side, on one connection per side.
+                  Stored procedure calls cannot be explained, a statement which fails to explain keeps the error as
+                  its plan.
+    :param statements: List of statement dicts, see get_table_statements(). Updated in place with the bytes,
+                       partitions, total_partitions and plan keys, see backends.Backend.explain().
+    """
+
+    for side, table in (('NETEZZA', netezza), ('SNOWFLAKE', snowflake)):
+        with table.session():
+            for statement in statements:
+                if statement['side'] != side:
+                    continue
+                if statement['query'].startswith('call '):
+                    statement.update(bytes=None, partitions=None, total_partitions=None,
+                                     plan='stored procedure, not explained')
+                    continue
+                try:
+                    statement.update(table.explain(statement['query'], statement['params']))
+                except Exception as e:
+                    statement.update(bytes=None, partitions=None, total_partitions=None,
+                                     plan=f"EXPLAIN failed: {e}")
+
+
+def plan_tables(entries, connect=False, partition_by=None, store=None, fingerprint=False, row_diff_key=None,
+                bucket=None):
+    """
+    :description: Dry run of the validation of table pairs: loads the column metadata of each pair, builds its
+                  statements and explains them. No check is run. A table pair whose metadata cannot be loaded, eg:
+                  a missing table, is reported and the next one is planned.
+    :param entries: Manifest entries, see batch.load_manifest(). Entries with a sample_fraction are planned as
+                    sampled validations.
+    :param connect: Queries the databases when True, EXPLAIN needs a connection.
+    :param partition_by: Validates per date bucket of this grain.
+    :param store: ResultStore of incremental validation.
+    :param fingerprint: Compares content fingerprints.
+    :param row_diff_key: Key column of a row diff.
+    :param bucket: Row diff: start of the date bucket to restrict to.
+    :return: statements: List of the explained statement dicts of all the entries, in the order of the entries,
+             errors: List of (snowflake table name, error message) tuples of the entries which could not be planned.
+    """
+
+    statements = []
+    errors = []
+    for entry in entries:
+        try:
+            netezza, snowflake = load_tables(entry['netezza_table_name'], entry['snowflake_table_name'],
+                                             connect=connect, validate=False, **get_table_kwargs(entry))
+        except Exception as e:
+            errors.append((entry['snowflake_table_name'], f"{type(e).__name__}: {e}"))
+            continue
+        sample = bool(entry.get('sample_fraction'))
+        table_statements = get_table_statements(netezza, snowflake, partition_by, fingerprint, store, sample,
+                                                get_entry_sample_fraction(entry) if sample else None,
+                                                entry.get('sample_key'), row_diff_key, bucket)
+        explain_statements(table_statements, netezza, snowflake)
+        statements.extend(table_statements)
+    return statements, errors
+
+
+def format_bytes(value):
+    """
+    :description: Human readable number of bytes, 'unknown' if the database does not estimate them.
+    """
+
+    if value is None:
+        return 'unknown'
+    value = float(value)
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if value < 1024 or unit == 'TB':
+            return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def print_query_plan(statements, errors=()):
+    """
+    :description: Prints the statements of each table and side with their bind parameters and estimated bytes, the
+                  plan text when the database does not estimate bytes, and the totals per side. Statements with the
+                  same SQL text only differ by their parameters and share their prepared statement.
+    :param statements: List of explained statement dicts, see plan_tables().
+    :param errors: List of (table name, error message) tuples of the tables which could not be planned.
+    """
+
+    for (side, table), group in groupby(statements, key=lambda statement: (statement['side'], statement['table'])):
+        print(f"\n=== {side} {table}")
+        for statement in group:
+            partitions = ''
+            if statement['total_partitions'] is not None:
+                partitions = f", {statement['partitions']}/{statement['total_partitions']} partitions"
+            print(f"-- {statement['check']}: estimated scan {format_bytes(statement['bytes'])}{partitions}")
+            print(statement['query'])
+            if statement['params']:
+                print(f"-- params: {list(statement['params'])}")
+            if statement['bytes'] is None and statement['plan']:
+                print('\n'.join(f"-- plan: {line}" for line in statement['plan'].splitlines()))
+
+    print()
+    for side in ('NETEZZA', 'SNOWFLAKE'):
+        side_statements = [statement for statement in statements if statement['side'] == side]
+        estimated = [statement['bytes'] for statement in side_statements if statement['bytes'] is not None]
+        unknown = len(side_statements) - len(estimated)
+        print(f"{side}: {len(side_statements)} statements, "
+              f"{len({statement['query'] for statement in side_statements})} distinct SQL texts, "
+              f"estimated scan {format_bytes(sum(estimated)) if estimated else 'unknown'}"
+              f"{f' + {unknown} statements without estimate' if estimated and unknown else ''}")
+    for table, message in errors:
+        print(f"NOT PLANNED {table}: {message}")
@@ -0,0 +1,364 @@
+############################################ Streaming Result Sink #####################################################
+# Description : Writes the result of every validated table as soon as it finishes, so that a batch run over thousands
+#               of tables does not keep their metrics in memory and the results can be read while the run is going.
+#               Each table is appended as one JSON line (status, counts and the mismatch report), and its metrics as
+#               long format rows with typed columns (one row per column and metric, numbers and dates in their own
+#               columns, the numbers as exact decimal text) to Parquet files. The Parquet rows are buffered and written as a new part file of a dataset
+#               directory every flush_rows rows. A summary of the run is aggregated as the tables arrive and written
+#               next to the Parquet parts at every flush.
+
+import os
+import json
+import heapq
+import datetime
+import threading
+from decimal import Decimal, InvalidOperation
+from collections import Counter
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from comparison import DATE_METRICS, flatten_validation_json
+from profiling import PROFILE_COLUMNS
+from query_builder import METRIC_COLUMNS
+
+
+DEFAULT_FLUSH_ROWS = 100000
+DEFAULT_SLOWEST = 10
+
+TABLE_SCHEMA = pa.schema([
+    ('snowflake_table_name', pa.string()),
+    ('netezza_table_name', pa.string()),
+    ('status', pa.string()),
+    ('elapsed', pa.float64()),
+    ('netezza_count', pa.int64()),
+    ('snowflake_count', pa.int64()),
+    ('mismatches', pa.int64()),
+    ('message', pa.string()),
+    ('finished_at', pa.string()),
+])
+
+METRIC_SCHEMA = pa.schema([
+    ('snowflake_table_name', pa.string()),
+    ('attname', pa.string()),
+    ('data_type', pa.string()),
+    ('metric', pa.string()),
+    ('netezza_number', pa.string()),
+    ('snowflake_number', pa.string()),
+    ('netezza_text', pa.string()),
+    ('snowflake_text', pa.string()),
+    ('mismatch', pa.bool_()),
+])
+
+
+def to_count(value):
+    """
+    :description: Record count of a side as int, None if it was not computed. Eg: the Snowflake count is a string
+                  when it comes from the validation json.
+    """
+
+    return None if value is None or pd.isna(value) else int(value)
+
+
+def to_number_text(value):
+    """
+    :description: Exact text of a metric number, so that the sums of large or decimal columns keep all their digits,
+                  which a float64 column would round. Eg: Decimal('12345678901234567.89') --> '12345678901234567.89'
+    :return: Decimal text, None if the value is missing or not a number.
+    """
+
+    if value is None or pd.isna(value):
+        return None
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        return None
+    return str(number) if number.is_finite() else None
+
+
+def get_metric_rows(table_name, val_df, sf_df, report):
+    """
+    :description: Builds the long format metric rows of a table from the validation dataframes of both sides.
+                  Only the metrics computed on at least one side are kept, instead of the NaN padded metric columns of
+                  the validation dataframes. Dates are kept as text, the other metrics as exact decimal text, see
+                  to_number_text().
+    :param table_name: Full name of the table in Snowflake.
+    :param val_df: Validation dataframe from Netezza with ATTNAME, FORMAT_TYPE and the metric columns.
+    :param sf_df: Snowflake dataframe indexed by ATTNAME with a DATA_TYPE column and the metric columns, eg:
+                  Snowflake.metrics_df or the flattened validation json.
+    :param report: Mismatch report of validation.data_validation(), empty if all the metrics matched.
+    :return: pandas.Dataframe with the METRIC_SCHEMA columns.
+    """
+
+    nz_df = val_df.set_index('ATTNAME')
+    metrics = [metric for metric in METRIC_COLUMNS + PROFILE_COLUMNS if metric in nz_df.columns]
+    sf_df = sf_df.reindex(index=nz_df.index, columns=metrics)
+
+    nz_long = nz_df[metrics].reset_index().melt(id_vars='ATTNAME', var_name='metric', value_name='NETEZZA')
+    sf_long = sf_df.reset_index().melt(id_vars='ATTNAME', var_name='metric', value_name='SNOWFLAKE')
+    rows = nz_long.merge(sf_long, on=['ATTNAME', 'metric'])
+    rows = rows[rows['NETEZZA'].notna() | rows['SNOWFLAKE'].notna()].reset_index(drop=True)
+
+    is_text = rows['metric'].isin(DATE_METRICS)
+    mismatched = {(col, metric) for col, col_report in report.items() for metric in col_report}
+    metric_rows = pd.DataFrame({
+        'snowflake_table_name': table_name,
+        'attname': rows['ATTNAME'],
+        'data_type': rows['ATTNAME'].map(nz_df['FORMAT_TYPE']),
+        'metric': rows['metric'],
+        'netezza_number': rows['NETEZZA'].where(~is_text).astype(object).map(to_number_text),
+        'snowflake_number': rows['SNOWFLAKE'].where(~is_text).astype(object).map(to_number_text),
+        'netezza_text': rows['NETEZZA'].where(is_text & rows['NETEZZA'].notna()).astype(object),
+        'snowflake_text': rows['SNOWFLAKE'].where(is_text & rows['SNOWFLAKE'].notna()).astype(object),
+        'mismatch': [pair in mismatched for pair in zip(rows['ATTNAME'], rows['metric'])],
+    })
+    for column in ('netezza_text', 'snowflake_text'):
+        metric_rows[column] = metric_rows[column].map(lambda value: None if pd.isna(value) else str(value))
+
+    # columns missing in Snowflake are reported by their data type only
+    missing = [{'snowflake_table_name': table_name, 'attname': col, 'data_type': details['Netezza'],
+                'metric': 'DATA_TYPE', 'netezza_number': None, 'snowflake_number': None,
+                'netezza_text': details['Netezza'], 'snowflake_text': details['SF'], 'mismatch': True}
+               for col, col_report in report.items() for metric, details in col_report.items() if metric == 'DATA_TYPE']
+    if missing:
+        missing = pd.DataFrame(missing, columns=metric_rows.columns).astype(metric_rows.dtypes.to_dict())
+        metric_rows = pd.concat([metric_rows, missing], ignore_index=True)
+    return metric_rows
+
+
+def get_table_metric_rows(table_name, netezza, snowflake, report):
+    """
+    :description: Metric rows of a table after validation.data_validation(), from the Snowflake metric queries or the
+                  validation json.
+    :param table_name: Full name of the table in Snowflake, as given in the manifest.
+    :param netezza: Object of class validation.Netezza.
+    :param snowflake: Object of class validation.Snowflake.
+    :param report: Mismatch report of validation.data_validation(), empty if all the metrics matched.
+    :return: pandas.Dataframe with the METRIC_SCHEMA columns, see get_metric_rows().
+    """
+
+    sf_df = snowflake.metrics_df if snowflake.metrics_df is not None else flatten_validation_json(snowflake.val_json)
+    return get_metric_rows(table_name, netezza.val_df, sf_df, report)
+
+
+class StreamingSummary:
+    """
+    Class to represent the summary of a run, aggregated as the tables arrive. Its size does not grow with the number
+    of tables.
+
+    ...
+
+    Attributes
+    ----------
+    tables: int
+        Number of tables received.
+
+    statuses: collections.Counter
+        Number of tables per status.
+
+    elapsed: float
+        Total seconds of the tables.
+
+    metric_mismatches: collections.Counter
+        Number of mismatching columns per metric.
+
+    slowest: list
+        Heap of the (elapsed, snowflake_table_name) of the slowest tables.
+
+
+    Methods
+    -------
+    update(result, counts, metric_rows)
+        Adds a table to the summary.
+
+    to_dict()
+        Returns the summary as a JSON serializable dict.
+    """
+
+    def __init__(self, top=DEFAULT_SLOWEST):
+        """
+        :description: Constructor to create StreamingSummary objects.
+        :param top: Number of slowest tables kept.
+        """
+        self.top = top
+        self.tables = 0
+        self.statuses = Counter()
+        self.elapsed = 0.0
+        self.rows = {'netezza': 0, 'snowflake': 0}
+        self.metric_mismatches = Counter()
+        self.slowest = []
+
+    def update(self, result, counts=(None, None), metric_rows=None):
+        """
+        :description: Adds a table to the summary.
+        :param result: Result dict, see batch.validate_table().
+        :param counts: (Netezza, Snowflake) record counts, None when not computed.
+        :param metric_rows: pandas.Dataframe of metric rows, see get_metric_rows(), None when not compared.
+        """
+        self.tables += 1
+        self.statuses[result['status']] += 1
+        self.elapsed += result['elapsed'] or 0.0
+        for side, count in zip(('netezza', 'snowflake'), counts):
+            self.rows[side] += count or 0
+        if metric_rows is not None:
+            self.metric_mismatches.update(metric_rows.loc[metric_rows['mismatch'], 'metric'])
+        item = (result['elapsed'] or 0.0, result['snowflake_table_name'])
+        if len(self.slowest) < self.top:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+    def to_dict(self):
+        """
+        :description: Returns the summary as a JSON serializable dict, the slowest tables first.
+        """
+        return {'tables': self.tables,
+                'statuses': dict(self.statuses),
+                'elapsed': round(self.elapsed, 3),
+                'rows': dict(self.rows),
+                'metric_mismatches': dict(self.metric_mismatches),
+                'slowest': [{'snowflake_table_name': table_name, 'elapsed': elapsed}
+                            for elapsed, table_name in sorted(self.slowest, reverse=True)]}
+
+
+class ResultSink:
+    """
+    Class to represent the streaming output of the results of a run. Thread safe.
+
+    ...
+
+    Attributes
+    ----------
+    jsonl_path: str
+        JSON lines file the tables are appended to, one line per table. Not written if None.
+
+    parquet_dir: str
+        Directory of the Parquet datasets, tables/ and metrics/, and of summary.json. Not written if None.
+
+    flush_rows: int
+        Number of buffered Parquet rows written as a new part file.
+
+    summary: StreamingSummary
+        Summary of the tables written so far.
+
+
+    Methods
+    -------
+    write(result, counts, metric_rows, report)
+        Writes the result of a table.
+
+    flush()
+        Writes the buffered Parquet rows and the summary.
+
+    close()
+        Flushes and closes the JSON lines file.
+    """
+
+    def __init__(self, jsonl_path=None, parquet_dir=None, flush_rows=DEFAULT_FLUSH_ROWS):
+        """
+        :description: Constructor to create ResultSink objects. The JSON lines file is appended to, so that a run
+                      resumed with a journal adds the tables of the restart to the same file. The Parquet part files
+                      are named after the start of the run, the parts of previous runs are kept.
+        :param jsonl_path: JSON lines file, not written if None.
+        :param parquet_dir: Directory of the Parquet datasets, not written if None.
+        :param flush_rows: Number of buffered Parquet rows written as a new part file.
+        """
+        self.jsonl_path = jsonl_path
+        self.parquet_dir = parquet_dir
+        self.flush_rows = flush_rows
+        self.summary = StreamingSummary()
+        self._run_id = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+        self._part = 0
+        self._tables = []
+        self._metrics = []
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        if parquet_dir:
+            for dataset in ('tables', 'metrics'):
+                os.makedirs(os.path.join(parquet_dir, dataset), exist_ok=True)
+
+    def write(self, result, counts=(None, None), metric_rows=None, report=None):
+        """
+        :description: Writes the result of a table: appends its JSON line right away and buffers its Parquet rows,
+                      which are written when flush_rows rows are buffered.
+        :param result: Result dict, see batch.validate_table().
+        :param counts: (Netezza, Snowflake) record counts, None when not computed.
+        :param metric_rows: pandas.Dataframe of metric rows, see get_metric_rows(), None when not compared.
+        :param report: Mismatch report of the table, None if it passed or was not compared.
+        """
+        counts = tuple(to_count(count) for count in counts)
+        finished_at = datetime.datetime.now().isoformat(timespec='seconds')
+        mismatches = int(metric_rows['mismatch'].sum()) if metric_rows is not None else len(report or ())
+        table_row = {**{key: result[key] for key in ('snowflake_table_name', 'netezza_table_name', 'status',
+                                                     'elapsed')},
+                     'netezza_count': counts[0], 'snowflake_count': counts[1], 'mismatches': mismatches,
+                     'message': result['message'], 'finished_at': finished_at}
+        with self._lock:
+            self.summary.update(result, counts, metric_rows)
+            if self._jsonl is not None:
+                line = {**table_row, 'report': report or dict()}
+                self._jsonl.write(json.dumps(line, default=str) + '\n')
+                self._jsonl.flush()
+            if self.parquet_dir:
+                self._tables.append(table_row)
+                self._buffered += 1
+                if metric_rows is not None and len(metric_rows):
+                    self._metrics.append(metric_rows)
+                    self._buffered += len(metric_rows)
+                if self._buffered >= self.flush_rows:
+                    self._flush()
+
+    def _flush(self):
+        """
+        :description: Writes the buffered rows as new part files and replaces summary.json. The lock must be held.
+        """
+        if self._tables:
+            name = f"part-{self._run_id}-{self._part:05d}.parquet"
+            pq.write_table(pa.Table.from_pylist(self._tables, schema=TABLE_SCHEMA),
+                           os.path.join(self.parquet_dir, 'tables', name))
+            if self._metrics:
+                metrics = pd.concat(self._metrics, ignore_index=True)
+                pq.write_table(pa.Table.from_pandas(metrics, schema=METRIC_SCHEMA, preserve_index=False),
+                               os.path.join(self.parquet_dir, 'metrics', name))
+            self._part += 1
+            self._tables, self._metrics, self._buffered = [], [], 0
+
+        # written then renamed, so a reader never sees a partial file
+        path = os.path.join(self.parquet_dir, 'summary.json')
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.summary.to_dict(), f, indent=4)
+        os.replace(f"{path}.tmp", path)
+
+    def flush(self):
+        """
+        :description: Writes the buffered Parquet rows and the summary.
+        """
+        with self._lock:
+            if self.parquet_dir:
+                self._flush()
+
+    def close(self):
+        """
+        :description: Flushes the buffered rows and closes the JSON lines file.
+        """
+        self.flush()
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+
+
+def print_stream_summary(summary):
+    """
+    :description: Prints the summary of a run: tables per status, rows and the mismatching metrics.
+    :param summary: dict from StreamingSummary.to_dict().
+    """
+
+    statuses = ', '.join(f"{status} {count}" for status, count in sorted(summary['statuses'].items()))
+    print(f"\n{summary['tables']} tables in {summary['elapsed']:.1f}s: {statuses}")
+    print(f"Rows: Netezza {summary['rows']['netezza']}, Snowflake {summary['rows']['snowflake']}")
+    if summary['metric_mismatches']:
+        print("Mismatching columns per metric: " + ', '.join(
+            f"{metric} {count}" for metric, count in sorted(summary['metric_mismatches'].items())))
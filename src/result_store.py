@@ -0,0 +1,237 @@
+############################################ Incremental Validation Store #############################################
+# Description : Local SQLite store of mergeable aggregates (count, sum, min, max, max length) per table, side and
+#               date bucket. An incremental run only scans the rows from the last stored bucket (the watermark) on,
+#               and the rows without a date, replaces those buckets in the store and merges all the buckets into the
+#               table totals.
+#               AVG is never stored, it is derived from the merged SUM and VALUE_COUNT.
+
+import math
+import sqlite3
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from query_builder import METRIC_COLUMNS, TOTAL_RECORD_COUNT
+
+
+DEFAULT_STORE_PATH = 'validation_store.db'
+
+# how each stored metric is merged across the date buckets
+MERGE_FUNCTIONS = {
+    TOTAL_RECORD_COUNT: 'sum',
+    'SUM': 'sum',
+    'VALUE_COUNT': 'sum',
+    'MIN': 'min',
+    'MAX': 'max',
+    'MIN_DATE': 'min',
+    'MAX_DATE': 'max',
+    'MAX_STR_LENGTH': 'max',
+}
+
+DATE_METRICS = ('MIN_DATE', 'MAX_DATE')
+
+
+def to_storable(value):
+    """
+    :description: Converts a metric value to a type that SQLite can store without losing it.
+                  Decimals are stored as text so that large NUMERIC sums keep their digits.
+    """
+
+    if value is None or (np.isscalar(value) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def to_number(value):
+    """
+    :description: Converts a stored metric value back to a number. Decimals stored as text are read back as Decimal.
+    """
+
+    if isinstance(value, str):
+        return Decimal(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def merge_numbers(values, function):
+    """
+    :description: Merges the values of a numeric metric across the buckets without rounding them to float, so that
+                  the merged SUM of NUMERIC columns keeps all its digits. Sums of floating point columns use fsum.
+    :param values: pandas.Series of the stored values of the metric, one per bucket.
+    :param function: 'sum', 'min' or 'max', see MERGE_FUNCTIONS.
+    """
+
+    values = [to_number(value) for value in values.dropna()]
+    if not values:
+        return np.NaN
+    if function == 'sum' and any(isinstance(value, float) for value in values):
+        return math.fsum(values)
+    return {'sum': sum, 'min': min, 'max': max}[function](values)
+
+
+def merge_bucket_aggregates(counts, metrics):
+    """
+    :description: Merges the per bucket aggregates into the totals of the table.
+    :param counts: pandas.Series of record counts indexed by bucket.
+    :param metrics: pandas.Dataframe indexed by bucket with (ATTNAME, metric name) columns of MERGEABLE_TEMPLATES.
+    :return: table_count: int, totals: pandas.Dataframe indexed by ATTNAME with the METRIC_COLUMNS columns.
+    """
+
+    table_count = int(merge_numbers(counts, 'sum')) if counts.notna().any() else 0
+    totals = dict()
+    for (col, metric), values in metrics.items():
+        function = MERGE_FUNCTIONS[metric]
+        if metric in DATE_METRICS:
+            dates = values.dropna().astype(str)
+            merged = getattr(dates, function)() if len(dates) else np.NaN
+        else:
+            merged = merge_numbers(values, function)
+        totals.setdefault(col, dict())[metric] = merged
+
+    totals = pd.DataFrame.from_dict(totals, orient='index', dtype=object)
+    totals.index.name = 'ATTNAME'
+    if 'SUM' in totals and 'VALUE_COUNT' in totals:
+        totals['AVG'] = pd.to_numeric(totals['SUM']) / pd.to_numeric(totals['VALUE_COUNT']).replace(0, np.NaN)
+    return table_count, totals.reindex(columns=METRIC_COLUMNS)
+
+
+class ResultStore:
+    """
+    Class to represent the local SQLite store of per bucket aggregates used by incremental validation.
+
+    ...
+
+    Attributes
+    ----------
+    path: str
+        Path of the SQLite database file.
+
+
+    Methods
+    -------
+    get_watermark(table_name, side, grain)
+        Returns the start of the last stored bucket, from where the next incremental run has to scan.
+
+    save_buckets(table_name, side, grain, counts, metrics, watermark)
+        Replaces the stored buckets from the watermark on and the NULL bucket with the newly scanned aggregates.
+
+    load_buckets(table_name, side, grain)
+        Returns all the stored buckets of the table.
+
+    load_totals(table_name, side, grain)
+        Returns the table totals merged from all the stored buckets.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        """
+        :description: Constructor to create ResultStore objects. Creates the SQLite tables if they do not exist.
+        :param path: Path of the SQLite database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""create table if not exists bucket_aggregates (
+                table_name text not null,
+                side text not null,
+                grain text not null,
+                bucket text not null,
+                attname text not null,
+                metric text not null,
+                value,
+                primary key (table_name, side, grain, bucket, attname, metric))""")
+            conn.execute("""create table if not exists watermarks (
+                table_name text not null,
+                side text not null,
+                grain text not null,
+                watermark text not null,
+                updated_at text not null default current_timestamp,
+                primary key (table_name, side, grain))""")
+
+    @contextmanager
+    def _connect(self):
+        """
+        :description: Opens a connection to the store, commits the transaction at the end of the block and closes it.
+        """
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_watermark(self, table_name, side, grain):
+        """
+        :description: Returns the start of the last stored bucket of the table. The bucket may have been incomplete
+                      when it was scanned, so the next incremental run scans it again.
+        :param table_name: Full name of the table. Format: DB.SCHEMA.TABLE
+        :param side: 'NETEZZA' or 'SNOWFLAKE'
+        :param grain: Size of the date buckets. Eg: 'day'
+        :return: Watermark as 'YYYY-MM-DD' or None if the table has not been validated incrementally yet.
+        """
+        with self._lock, self._connect() as conn:
+            row = conn.execute("select watermark from watermarks where table_name = ? and side = ? and grain = ?",
+                               (table_name, side, grain)).fetchone()
+        return row[0] if row else None
+
+    def save_buckets(self, table_name, side, grain, counts, metrics, watermark=None):
+        """
+        :description: Replaces the stored buckets from the watermark on with the newly scanned aggregates and moves
+                      the watermark to the last bucket, in a single transaction. Rows without a date are scanned
+                      by every run, the NULL bucket is always replaced.
+        :param table_name: Full name of the table. Format: DB.SCHEMA.TABLE
+        :param side: 'NETEZZA' or 'SNOWFLAKE'
+        :param grain: Size of the date buckets. Eg: 'day'
+        :param counts: pandas.Series of record counts indexed by normalized bucket.
+        :param metrics: pandas.Dataframe indexed by normalized bucket with (ATTNAME, metric name) columns.
+        :param watermark: Watermark used for the scan, None if the whole table was scanned.
+        """
+        rows = [(table_name, side, grain, bucket, TOTAL_RECORD_COUNT, TOTAL_RECORD_COUNT, to_storable(count))
+                for bucket, count in counts.items()]
+        for (col, metric), values in metrics.items():
+            rows.extend((table_name, side, grain, bucket, col, metric, to_storable(value))
+                        for bucket, value in values.items())
+
+        with self._lock, self._connect() as conn:
+            conn.execute("""delete from bucket_aggregates
+                where table_name = ? and side = ? and grain = ? and (bucket >= ? or bucket = 'NULL')""",
+                         (table_name, side, grain, watermark or ''))
+            conn.executemany("insert or replace into bucket_aggregates values (?, ?, ?, ?, ?, ?, ?)", rows)
+            last_bucket = conn.execute("""select max(bucket) from bucket_aggregates
+                where table_name = ? and side = ? and grain = ? and bucket <> 'NULL'""",
+                                       (table_name, side, grain)).fetchone()[0]
+            if last_bucket is not None:
+                conn.execute("insert or replace into watermarks (table_name, side, grain, watermark) values (?, ?, ?, ?)",
+                             (table_name, side, grain, last_bucket))
+
+    def load_buckets(self, table_name, side, grain):
+        """
+        :description: Returns all the stored buckets of the table.
+        :return: counts: pandas.Series of record counts indexed by bucket,
+                 metrics: pandas.Dataframe indexed by bucket with (ATTNAME, metric name) columns.
+        """
+        with self._lock, self._connect() as conn:
+            rows = conn.execute("""select bucket, attname, metric, value from bucket_aggregates
+                where table_name = ? and side = ? and grain = ?""", (table_name, side, grain)).fetchall()
+        # object values keep the large integer sums exact, read_sql would convert them to float with the others
+        df = pd.DataFrame(rows, columns=['bucket', 'attname', 'metric', 'value'], dtype=object)
+
+        is_count = df['metric'] == TOTAL_RECORD_COUNT
+        counts = df[is_count].set_index('bucket')['value'].rename(TOTAL_RECORD_COUNT)
+        metrics = df[~is_count].pivot(index='bucket', columns=['attname', 'metric'], values='value')
+        return counts, metrics.reindex(counts.index)
+
+    def load_totals(self, table_name, side, grain):
+        """
+        :description: Returns the table totals merged from all the stored buckets, see merge_bucket_aggregates().
+        """
+        return merge_bucket_aggregates(*self.load_buckets(table_name, side, grain))
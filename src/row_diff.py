@@ -0,0 +1,193 @@
+############################################ Streaming Row Diff ########################################################
+# Description : Drill down for tables which fail data validation. The rows of both tables are streamed ordered by a
+#               unique key column in fixed size chunks and merge joined, so that only about one chunk per side is held
+#               in memory whatever the size of the table. Reports the rows missing in Snowflake, the extra rows in
+#               Snowflake and the rows whose values changed, restricted to the failing date range or bucket.
+#               The key must sort the same way on both systems: a number or a plain ASCII string.
+
+import numpy as np
+import pandas as pd
+
+from arrow_fetch import execute
+from comparison import DEFAULT_ABS_TOL, DEFAULT_REL_TOL, compare_metric, to_native
+from defaults import DEFAULT_MAX_ROWS
+from query_builder import add_condition, get_check_type
+
+
+DEFAULT_CHUNK_SIZE = 50000
+
+MISSING_IN_SF = 'MISSING_IN_SF'
+EXTRA_IN_SF = 'EXTRA_IN_SF'
+CHANGED = 'CHANGED'
+
+
+def build_row_query(full_table_name, columns, key, where_clause=''):
+    """
+    :description: Builds the query streaming the rows of the table ordered by the key column.
+    :param full_table_name: Complete name of the table --> DB.SCHEMA.TABLENAME
+    :param columns: Names of the columns to be compared, the key included.
+    :param key: Name of the unique key column.
+    :param where_clause: Where clause starting with a new line, or empty string. The query has the parameters of the
+                         where clause, see query_builder.get_params().
+    """
+
+    return f"""select {', '.join(columns)}
+        from {full_table_name}{add_condition(where_clause, f"{key} is not null")}
+        order by {key}"""
+
+
+def iter_fetchmany(cursor, query, chunk_size=DEFAULT_CHUNK_SIZE, params=()):
+    """
+    :description: Streams the result set of a DB-API cursor (eg: the Netezza JDBC cursor) with fetchmany.
+    :param params: Values of the ? markers of the query.
+    :return: Generator of pandas.Dataframes of at most chunk_size rows, with upper case column names.
+    """
+
+    execute(cursor, query, params)
+    columns = [desc[0].upper() for desc in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield pd.DataFrame(rows, columns=columns)
+
+
+def iter_pandas_batches(cursor, query, chunk_size=DEFAULT_CHUNK_SIZE, params=()):
+    """
+    :description: Streams the result set of a Snowflake cursor as the Arrow result batches of the connector, converted
+                  to pandas one batch at a time. Falls back to fetchmany for cursors without batch fetching.
+    :return: Generator of pandas.Dataframes with upper case column names.
+    """
+
+    if not hasattr(cursor, 'fetch_pandas_batches'):
+        yield from iter_fetchmany(cursor, query, chunk_size, params)
+        return
+    execute(cursor, query, params)
+    for df in cursor.fetch_pandas_batches():
+        df.columns = [col.upper() for col in df.columns]
+        yield df
+
+
+def normalize_keys(values, key_type):
+    """
+    :description: Converts the key values of both systems to comparable python values.
+    :param values: pandas.Series of key values.
+    :param key_type: Check type of the key column, see query_builder.get_check_type().
+    """
+
+    if key_type == 'NUMBER':
+        return pd.to_numeric(values.map(to_native))
+    return values.astype(str).str.rstrip()
+
+
+def compare_values(nz_values, sf_values, check_type, rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Compares the values of one column for the rows present on both sides, see comparison.compare_metric().
+    :param nz_values: pandas.Series of the Netezza values indexed by key.
+    :param sf_values: pandas.Series of the Snowflake values, aligned with nz_values.
+    :param check_type: Check type of the column, see query_builder.get_check_type().
+    :return: Boolean pandas.Series, True where the values differ. Two NULLs are equal.
+    """
+
+    nz_null = nz_values.isna()
+    sf_null = sf_values.isna()
+    if check_type == 'VARCHAR':
+        differ = nz_values.astype(str).str.rstrip() != sf_values.astype(str).str.rstrip()
+    else:
+        metric = 'MIN_DATE' if check_type == 'DATETIME' else 'VALUE'
+        is_float = nz_values.map(lambda value: isinstance(value, float)) | \
+            sf_values.map(lambda value: isinstance(value, float))
+        differ = compare_metric(metric, sf_values, nz_values, is_float, rel_tol, abs_tol)
+    return (nz_null != sf_null) | (differ & ~nz_null & ~sf_null)
+
+
+def diff_block(nz_df, sf_df, key, check_types, report, max_rows, rel_tol, abs_tol):
+    """
+    :description: Diffs the rows of one key range of both sides and adds them to the report.
+    :param nz_df: pandas.Dataframe of Netezza rows indexed by normalized key.
+    :param sf_df: pandas.Dataframe of Snowflake rows indexed by normalized key, the same key range.
+    :param key: Name of the key column.
+    :param check_types: dict of column name --> check type of the compared columns.
+    """
+
+    for side, df in (('Netezza', nz_df), ('SF', sf_df)):
+        if df.index.has_duplicates:
+            raise ValueError(f"Key column {key} is not unique in {side}: {to_native(df.index[df.index.duplicated()][0])}")
+
+    def add_row(kind, row_key, details):
+        report[kind] += 1
+        if len(report['ROWS']) < max_rows:
+            report['ROWS'].append({'TYPE': kind, key: to_native(row_key), **details})
+
+    for row_key in nz_df.index.difference(sf_df.index):
+        add_row(MISSING_IN_SF, row_key, {})
+    for row_key in sf_df.index.difference(nz_df.index):
+        add_row(EXTRA_IN_SF, row_key, {})
+
+    common = nz_df.index.intersection(sf_df.index)
+    if common.empty:
+        return
+    nz_df = nz_df.loc[common]
+    sf_df = sf_df.loc[common]
+    mask = pd.DataFrame({col: compare_values(nz_df[col], sf_df[col], check_type, rel_tol, abs_tol)
+                         for col, check_type in check_types.items()}, index=common)
+    for row_key in common[mask.any(axis=1).values]:
+        changed = mask.columns[mask.loc[row_key].values]
+        add_row(CHANGED, row_key, {'COLUMNS': {col: {'SF': to_native(sf_df.at[row_key, col]),
+                                                      'Netezza': to_native(nz_df.at[row_key, col])}
+                                               for col in changed}})
+
+
+def diff_row_streams(nz_chunks, sf_chunks, key, columns, max_rows=DEFAULT_MAX_ROWS, rel_tol=DEFAULT_REL_TOL,
+                     abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Merge joins two streams of row chunks sorted by the key column. Rows are diffed up to the smallest
+                  last key of the sides which still have rows to stream, the rest is kept for the next chunk, so at
+                  most about two chunks per side are in memory.
+    :param nz_chunks: Iterable of Netezza pandas.Dataframes ordered by key, see iter_fetchmany().
+    :param sf_chunks: Iterable of Snowflake pandas.Dataframes ordered by key, see iter_pandas_batches().
+    :param key: Name of the unique key column, upper case.
+    :param columns: Iterable of (ATTNAME, FORMAT_TYPE) pairs of the compared columns, the Netezza column details.
+    :param max_rows: Number of differing rows listed in the report.
+    :return: report: dict with the MISSING_IN_SF, EXTRA_IN_SF and CHANGED row counts and the first differing ROWS.
+    """
+
+    format_types = {col.upper(): format_type for col, format_type in columns}
+    key_type = get_check_type(format_types[key])
+    check_types = {col: get_check_type(format_type) for col, format_type in format_types.items() if col != key}
+    report = {MISSING_IN_SF: 0, EXTRA_IN_SF: 0, CHANGED: 0, 'ROWS': []}
+
+    streams = [iter(nz_chunks), iter(sf_chunks)]
+    buffers = [None, None]
+    done = [False, False]
+    last_keys = [None, None]
+    while True:
+        for side in (0, 1):
+            while not done[side] and (buffers[side] is None or buffers[side].empty):
+                chunk = next(streams[side], None)
+                if chunk is None:
+                    done[side] = True
+                    break
+                chunk.index = normalize_keys(chunk[key], key_type)
+                if not chunk.index.is_monotonic_increasing or (
+                        last_keys[side] is not None and len(chunk) and chunk.index[0] < last_keys[side]):
+                    raise ValueError(f"Rows are not ordered by {key} the same way on both sides, use a numeric key")
+                if len(chunk):
+                    last_keys[side] = chunk.index[-1]
+                buffers[side] = chunk if buffers[side] is None else pd.concat([buffers[side], chunk])
+
+        pending = [buffer for buffer in buffers if buffer is not None and not buffer.empty]
+        if not pending:
+            return report
+        open_lasts = [buffers[side].index[-1] for side in (0, 1) if not done[side]]
+        boundary = min(open_lasts) if open_lasts else None
+
+        blocks = []
+        for side in (0, 1):
+            buffer = buffers[side]
+            if buffer is None:
+                buffer = pd.DataFrame(columns=list(format_types), index=pd.Index([]))
+            take = np.ones(len(buffer), dtype=bool) if boundary is None else (buffer.index <= boundary)
+            blocks.append(buffer[take])
+            buffers[side] = buffer[~take]
+        diff_block(blocks[0], blocks[1], key, check_types, report, max_rows, rel_tol, abs_tol)
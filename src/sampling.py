@@ -0,0 +1,151 @@
+############################################ Sampled Validation ########################################################
+# Description : Approximate validation of very large tables on a sample of their rows. Both systems select the same
+#               rows with a deterministic hash modulo predicate on a key column (or on the whole row), using the
+#               canonical hashes of fingerprint.py, so the sampled metrics are computed on matching row subsets.
+#               MIN/MAX/length/dates and the sample count are compared exactly. When both samples have the same
+#               count they are the same rows and their SUM and value count are compared exactly too, otherwise AVG and
+#               SUM are estimated for the whole table and compared within confidence bounds. Snowflake SAMPLE/TABLESAMPLE is not used since its rows cannot
+#               be reproduced on Netezza.
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from fingerprint import HASH_TEMPLATES, get_canonical_expression, get_canonical_type, get_row_expression
+from comparison import DEFAULT_ABS_TOL, DEFAULT_REL_TOL, to_native
+from defaults import DEFAULT_TARGET_ROWS
+
+
+# the hash of a row is reduced modulo SAMPLE_MODULUS, the rows below fraction * SAMPLE_MODULUS are sampled
+SAMPLE_MODULUS = 1000000
+# normal quantile of the confidence bounds, 1.96 for 95%
+DEFAULT_CONFIDENCE_Z = 1.96
+
+# metrics of the sample, SUM_SQUARES and VALUE_COUNT are only used for the confidence bounds
+SAMPLE_TEMPLATES = {
+    'NUMBER': (('MIN', 'MIN({col})'),
+               ('MAX', 'MAX({col})'),
+               ('SUM', 'SUM({col})'),
+               ('VALUE_COUNT', 'COUNT({col})'),
+               ('SUM_SQUARES', 'SUM(CAST({col} AS DOUBLE PRECISION) * CAST({col} AS DOUBLE PRECISION))')),
+    'VARCHAR': (('MAX_STR_LENGTH', 'MAX(LENGTH({col}))'),),
+    'DATETIME': (('MIN_DATE', 'MIN({col})'),
+                 ('MAX_DATE', 'MAX({col})')),
+}
+
+# metrics of the sample which have to be identical on both systems
+EXACT_METRICS = ('MIN', 'MAX', 'MAX_STR_LENGTH', 'MIN_DATE', 'MAX_DATE')
+# metrics of the sample which are also identical when both sides sampled the same rows
+SAME_SAMPLE_METRICS = ('SUM', 'VALUE_COUNT')
+# metrics estimated for the whole table with confidence bounds
+ESTIMATED_METRICS = ('AVG', 'SUM')
+
+
+def get_sample_fraction(table_count, target_rows=DEFAULT_TARGET_ROWS):
+    """
+    :description: Tunes the sampling fraction so that about target_rows rows are sampled.
+    :param table_count: Number of records in the table (or in the validated date range).
+    :param target_rows: Number of rows to be sampled.
+    :return: Fraction between 1 / SAMPLE_MODULUS and 1, 1 for tables smaller than target_rows.
+    """
+
+    if not table_count or table_count <= target_rows:
+        return 1.0
+    return max(math.ceil(target_rows / table_count * SAMPLE_MODULUS), 1) / SAMPLE_MODULUS
+
+
+def build_sample_condition(columns, dialect, fraction, key=None):
+    """
+    :description: Builds the predicate selecting the same sample of rows in Netezza and Snowflake.
+    :param columns: Iterable of (ATTNAME, FORMAT_TYPE) pairs, the Netezza column details.
+    :param dialect: 'netezza' or 'snowflake'
+    :param fraction: Fraction of the rows to be sampled, see get_sample_fraction().
+    :param key: Column whose value decides if a row is sampled, the whole row if None.
+    :return: SQL condition, None if all the rows are sampled.
+    """
+
+    if fraction >= 1:
+        return None
+    if key:
+        format_types = {col.upper(): format_type for col, format_type in columns}
+        if key.upper() not in format_types:
+            raise ValueError(f"Sample key column {key} not found")
+        expr = get_canonical_expression(key, format_types[key.upper()], dialect)
+    else:
+        expr = get_row_expression(columns, dialect)
+    if expr is None:
+        raise ValueError("No column of the table can be hashed for sampling")
+    hash_expr = HASH_TEMPLATES[dialect].format(expr=expr)
+    return f"MOD({hash_expr}, {SAMPLE_MODULUS}) < {round(fraction * SAMPLE_MODULUS)}"
+
+
+def get_float_columns(columns):
+    """
+    :description: Names of the columns stored as floating point, see fingerprint.get_canonical_type().
+    """
+
+    return [col for col, format_type in columns if get_canonical_type(format_type) == 'FLOAT']
+
+
+def estimate_totals(sample_count, metrics, fraction, z=DEFAULT_CONFIDENCE_Z):
+    """
+    :description: Estimates the table count and the AVG and SUM of every numeric column from the sample.
+                  SUM is the Horvitz-Thompson estimate sample sum / fraction, with the variance of Bernoulli sampling
+                  (1 - fraction) / fraction^2 * sum of squares. AVG is the sample mean with the finite population
+                  corrected standard error.
+    :param sample_count: Number of sampled records.
+    :param metrics: pandas.Dataframe indexed by ATTNAME with the SAMPLE_TEMPLATES metric columns.
+    :param fraction: Sampling fraction.
+    :param z: Normal quantile of the confidence bounds.
+    :return: table_count estimate, pandas.Dataframe indexed by ATTNAME with AVG, AVG_BOUND, SUM and SUM_BOUND
+             columns. A bound is the half width of the confidence interval.
+    """
+
+    numbers = metrics.reindex(columns=['SUM', 'VALUE_COUNT', 'SUM_SQUARES']).apply(pd.to_numeric,
+                                                                                    errors='coerce').astype(float)
+    total, count, squares = numbers['SUM'], numbers['VALUE_COUNT'], numbers['SUM_SQUARES']
+
+    estimates = pd.DataFrame(index=metrics.index)
+    estimates['AVG'] = total / count.replace(0, np.NaN)
+    variance = (squares - total * total / count.replace(0, np.NaN)) / (count - 1).where(count > 1)
+    estimates['AVG_BOUND'] = z * np.sqrt((1 - fraction) * variance.clip(lower=0) / count)
+    estimates['SUM'] = total / fraction
+    estimates['SUM_BOUND'] = z * np.sqrt((1 - fraction) * squares.clip(lower=0)) / fraction
+    return sample_count / fraction, estimates
+
+
+def compare_estimates(nz_estimates, sf_estimates, rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Compares the AVG and SUM estimates of both systems. An estimate mismatches when the difference is
+                  larger than the combined confidence bounds of the two sides plus the tolerances.
+    :param nz_estimates: Netezza estimates, see estimate_totals().
+    :param sf_estimates: Snowflake estimates, aligned with nz_estimates.
+    :param rel_tol: Relative tolerance added to the bounds, for the float arithmetic of the estimates.
+    :param abs_tol: Absolute tolerance added to the bounds.
+    :return: report: dict of ATTNAME --> metric --> {'SF': <value>, 'Netezza': <value>, 'BOUND': <value>}.
+    """
+
+    report = dict()
+    for metric in ESTIMATED_METRICS:
+        bound = np.sqrt(nz_estimates[f"{metric}_BOUND"].fillna(0) ** 2 + sf_estimates[f"{metric}_BOUND"].fillna(0) ** 2)
+        nz_values, sf_values = nz_estimates[metric], sf_estimates[metric]
+        tolerance = bound + abs_tol + rel_tol * np.maximum(nz_values.abs(), sf_values.abs())
+        mismatch = ((nz_values - sf_values).abs() > tolerance) | (nz_values.isna() != sf_values.isna())
+        for col in nz_estimates.index[mismatch.values]:
+            report.setdefault(col, dict())[metric] = {'SF': to_native(sf_values[col]),
+                                                      'Netezza': to_native(nz_values[col]),
+                                                      'BOUND': to_native(bound[col])}
+    return report
+
+
+def to_column_metrics(metrics):
+    """
+    :description: Reshapes the single bucket results of query_builder.parse_bucket_results() into a dataframe
+                  indexed by ATTNAME with one column per metric.
+    """
+
+    if metrics.empty or metrics.columns.empty:
+        return pd.DataFrame()
+    return metrics.iloc[0].unstack(level=1)
+
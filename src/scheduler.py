@@ -0,0 +1,278 @@
+############################################ Cost Aware Batch Scheduler ################################################
+# Description : Orders the tables of a batch run so that the run finishes as early as possible. The cost of each table
+#               is estimated from the Netezza _v_table row counts and the Snowflake INFORMATION_SCHEMA.TABLES bytes
+#               (one catalog query per schema and side), or from the elapsed time of the table in previous runs.
+#               Tables with an SLA run first, earliest deadline first, the others longest first (LPT), which keeps
+#               the small tables from queueing behind a huge one at the end of the run. Tables beyond the Netezza
+#               seconds or Snowflake credit budget are skipped. The tables are then validated with batch.run_batch().
+# Usage: python main.py --manifest tables.csv --schedule [--history history.csv] [--snowflake_credit_budget 10]
+
+import os
+import csv
+import heapq
+import datetime
+
+import pandas as pd
+
+from batch import DEFAULT_NETEZZA_CONCURRENCY, DEFAULT_SNOWFLAKE_CONCURRENCY, DEFAULT_WORKERS, ERROR, run_batch
+from comparison import DEFAULT_ABS_TOL, DEFAULT_REL_TOL
+from defaults import DEFAULT_RETRY_BACKOFF, DEFAULT_TARGET_ROWS
+from validation import Netezza, Snowflake
+
+
+SKIPPED = 'SKIPPED'
+
+# throughput assumptions of the cost model, for the tables without timings from previous runs
+NETEZZA_ROWS_PER_SECOND = 2000000
+SNOWFLAKE_BYTES_PER_SECOND = 100 * 2 ** 20
+# bytes per row of the Snowflake tables without a size in the catalog
+DEFAULT_BYTES_PER_ROW = 100
+# metadata lookup, compilation and round trips of each side
+TABLE_OVERHEAD_SECONDS = 1.0
+# estimated seconds of each side for tables without catalog statistics or history
+DEFAULT_TABLE_SECONDS = 60.0
+# credits per hour of the validation warehouse, 1 for X-Small
+DEFAULT_CREDITS_PER_HOUR = 1.0
+
+HISTORY_COLUMNS = ['snowflake_table_name', 'netezza_table_name', 'status', 'elapsed', 'netezza_elapsed',
+                   'snowflake_elapsed', 'finished_at']
+PLAN_COLUMNS = ['snowflake_table_name', 'netezza_table_name', 'sla', 'source', 'netezza_seconds', 'snowflake_seconds',
+                'seconds', 'credits', 'order', 'estimated_start', 'estimated_finish']
+
+
+def fetch_table_stats(table_names, get_table_stats):
+    """
+    :description: Reads the catalog statistics of the tables with one query per schema. Schemas whose catalog cannot
+                  be read are left out, their tables fall back to the history or the default cost.
+    :param table_names: Full names of the tables. Format: DB.SCHEMA.TABLE
+    :param get_table_stats: Netezza.get_table_stats or Snowflake.get_table_stats.
+    :return: dict of upper case full table name --> (row count, bytes or None)
+    """
+
+    schemas = {tuple(name.upper().split('.')[:2]) for name in table_names}
+    stats = dict()
+    for db_name, schema_name in sorted(schemas):
+        try:
+            df = get_table_stats(db_name, schema_name)
+        except Exception as e:
+            print(f"Catalog statistics of {db_name}.{schema_name} not available: {type(e).__name__}: {e}")
+            continue
+        for table_name, row_count, size in zip(df['TABLE_NAME'], df['ROW_COUNT'], df['BYTES']):
+            stats[f"{db_name}.{schema_name}.{str(table_name).upper()}"] = (
+                None if pd.isna(row_count) else int(row_count), None if pd.isna(size) else int(size))
+    return stats
+
+
+def load_history(path):
+    """
+    :description: Reads the elapsed seconds of the tables in previous runs, written by save_history().
+                  Tables which ended with an ERROR are left out, their time says nothing about their size.
+                  Rows without the seconds of a side, eg: written before they were recorded, charge the elapsed
+                  seconds of the table to that side.
+    :param path: CSV file with HISTORY_COLUMNS, nothing is read if it does not exist.
+    :return: dict of (snowflake_table_name, netezza_table_name) --> (elapsed, Netezza, Snowflake seconds)
+    """
+
+    if not path or not os.path.exists(path):
+        return dict()
+    history = dict()
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            if row['status'] in (ERROR, SKIPPED) or not row['elapsed']:
+                continue
+            elapsed = float(row['elapsed'])
+            history[(row['snowflake_table_name'], row['netezza_table_name'])] = (
+                elapsed, *(float(row[key]) if row.get(key) else elapsed
+                           for key in ('netezza_elapsed', 'snowflake_elapsed')))
+    return history
+
+
+def save_history(path, results):
+    """
+    :description: Writes the elapsed seconds of the validated tables, and of each side, to the history file,
+                  replacing the previous timings of the same tables and keeping the others.
+    :param path: CSV file with HISTORY_COLUMNS.
+    :param results: List of result dicts from run_scheduled_batch().
+    """
+
+    rows = dict()
+    if os.path.exists(path):
+        with open(path, newline='') as f:
+            rows = {(row['snowflake_table_name'], row['netezza_table_name']): row for row in csv.DictReader(f)}
+    finished_at = datetime.datetime.now().isoformat(timespec='seconds')
+    for result in results:
+        if result['status'] != SKIPPED:
+            rows[(result['snowflake_table_name'], result['netezza_table_name'])] = {
+                **{key: result.get(key) for key in HISTORY_COLUMNS[:-1]}, 'finished_at': finished_at}
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=HISTORY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows.values())
+
+
+def estimate_cost(entry, netezza_stats, snowflake_stats, history, parallel_sides=False,
+                  credits_per_hour=DEFAULT_CREDITS_PER_HOUR):
+    """
+    :description: Estimates the seconds each side spends on a table and the Snowflake credits it uses.
+                  The seconds each side was queried in a previous run are used when known. Otherwise Netezza is costed
+                  from its row count and Snowflake from its bytes, with the row count of the other side when one
+                  catalog has no statistics for the table. The credits assume the warehouse runs for the Snowflake
+                  seconds of the table, an upper bound when several tables share the warehouse.
+    :param entry: Manifest entry, see batch.load_manifest().
+    :param netezza_stats: dict from fetch_table_stats() for the Netezza tables.
+    :param snowflake_stats: dict from fetch_table_stats() for the Snowflake tables.
+    :param history: dict from load_history().
+    :param parallel_sides: The table takes the time of the slower side instead of the sum of both.
+    :param credits_per_hour: Credits per hour of the validation warehouse.
+    :return: dict with source ('history', 'catalog' or 'default'), netezza_seconds, snowflake_seconds, seconds
+             and credits.
+    """
+
+    elapsed, history_nz_seconds, history_sf_seconds = history.get(
+        (entry['snowflake_table_name'], entry['netezza_table_name']), (None, None, None))
+    nz_rows, _ = netezza_stats.get(entry['netezza_table_name'].upper(), (None, None))
+    sf_rows, sf_bytes = snowflake_stats.get(entry['snowflake_table_name'].upper(), (None, None))
+    rows = nz_rows if nz_rows is not None else sf_rows
+
+    if elapsed is not None:
+        source, nz_seconds, sf_seconds = 'history', history_nz_seconds, history_sf_seconds
+    elif rows is not None:
+        source = 'catalog'
+        if sf_bytes is None:
+            sf_bytes = (sf_rows if sf_rows is not None else rows) * DEFAULT_BYTES_PER_ROW
+        nz_seconds = TABLE_OVERHEAD_SECONDS + rows / NETEZZA_ROWS_PER_SECOND
+        sf_seconds = TABLE_OVERHEAD_SECONDS + sf_bytes / SNOWFLAKE_BYTES_PER_SECOND
+    else:
+        source, nz_seconds, sf_seconds = 'default', DEFAULT_TABLE_SECONDS, DEFAULT_TABLE_SECONDS
+
+    if source == 'history':
+        seconds = elapsed
+    else:
+        seconds = max(nz_seconds, sf_seconds) if parallel_sides else nz_seconds + sf_seconds
+    return {'source': source, 'netezza_seconds': nz_seconds, 'snowflake_seconds': sf_seconds, 'seconds': seconds,
+            'credits': sf_seconds * credits_per_hour / 3600}
+
+
+def get_sla_seconds(entry):
+    """
+    :description: SLA of a manifest entry in seconds from the start of the run, None without SLA.
+                  The sla column of the manifest is given in minutes.
+    """
+
+    return float(entry['sla']) * 60 if entry.get('sla') else None
+
+
+def plan_schedule(manifest, costs, slots, netezza_budget=None, credit_budget=None):
+    """
+    :description: Orders the tables and simulates the run to estimate when each one finishes.
+                  Tables with an SLA come first, earliest deadline first, then the others longest first. Each table
+                  starts on the first free slot. Following this order, the tables which would exceed the Netezza
+                  seconds or Snowflake credits budget are skipped, so the tables with an SLA get the budget first.
+    :param manifest: List of manifest entries.
+    :param costs: List of estimate_cost() dicts aligned with manifest.
+    :param slots: Number of tables validated at the same time.
+    :param netezza_budget: Maximum Netezza seconds of the run, no limit if None.
+    :param credit_budget: Maximum Snowflake credits of the run, no limit if None.
+    :return: planned: list of manifest indexes in the order to run them,
+             skipped: list of manifest indexes left out by the budgets,
+             plan: list of dicts with PLAN_COLUMNS aligned with manifest,
+             makespan: estimated seconds of the whole run.
+    """
+
+    def priority(index):
+        sla = get_sla_seconds(manifest[index])
+        return (0, sla, -costs[index]['seconds']) if sla is not None else (1, 0, -costs[index]['seconds'])
+
+    planned, skipped = [], []
+    netezza_seconds = credits = 0
+    for index in sorted(range(len(manifest)), key=priority):
+        cost = costs[index]
+        if (netezza_budget is not None and netezza_seconds + cost['netezza_seconds'] > netezza_budget) or \
+                (credit_budget is not None and credits + cost['credits'] > credit_budget):
+            skipped.append(index)
+            continue
+        netezza_seconds += cost['netezza_seconds']
+        credits += cost['credits']
+        planned.append(index)
+
+    plan = [{'snowflake_table_name': entry['snowflake_table_name'], 'netezza_table_name': entry['netezza_table_name'],
+             'sla': get_sla_seconds(entry), **cost, 'order': None, 'estimated_start': None, 'estimated_finish': None}
+            for entry, cost in zip(manifest, costs)]
+    free_at = [0.0] * max(slots, 1)
+    for order, index in enumerate(planned):
+        start = heapq.heappop(free_at)
+        plan[index]['order'] = order
+        plan[index]['estimated_start'] = start
+        plan[index]['estimated_finish'] = start + costs[index]['seconds']
+        heapq.heappush(free_at, plan[index]['estimated_finish'])
+    makespan = max((plan[index]['estimated_finish'] for index in planned), default=0.0)
+    return planned, skipped, plan, makespan
+
+
+def run_scheduled_batch(manifest, workers=DEFAULT_WORKERS, netezza_concurrency=DEFAULT_NETEZZA_CONCURRENCY,
+                        snowflake_concurrency=DEFAULT_SNOWFLAKE_CONCURRENCY, rel_tol=DEFAULT_REL_TOL,
+                        abs_tol=DEFAULT_ABS_TOL, connect=False, parallel_sides=False, partition_by=None,
+                        store_path=None, fingerprint=False, history_path=None, netezza_budget=None,
+                        credit_budget=None, credits_per_hour=DEFAULT_CREDITS_PER_HOUR, journal_path=None, retries=0,
+                        retry_backoff=DEFAULT_RETRY_BACKOFF, sink=None, sample_rows=DEFAULT_TARGET_ROWS):
+    """
+    :description: Estimates the cost of every table, plans the order with plan_schedule() and validates the planned
+                  tables with batch.run_batch(), which starts them in that order. Saves the elapsed times to the
+                  history file for the next run.
+    :param manifest: List of manifest entries, see batch.load_manifest().
+    :param history_path: CSV file of the elapsed times of previous runs, read and updated when given.
+    :param netezza_budget: Maximum estimated Netezza seconds of the run, no limit if None.
+    :param credit_budget: Maximum estimated Snowflake credits of the run, no limit if None.
+    :param credits_per_hour: Credits per hour of the validation warehouse.
+    The other parameters are passed to batch.run_batch().
+    :return: results: list of result dicts in the order of the manifest, SKIPPED for the tables over budget,
+             plan: list of plan dicts, see plan_schedule(),
+             makespan: estimated seconds of the run.
+    """
+
+    Netezza.pool_size = netezza_concurrency
+    Snowflake.pool_size = snowflake_concurrency
+    netezza_stats, snowflake_stats = dict(), dict()
+    if connect:
+        netezza_stats = fetch_table_stats([entry['netezza_table_name'] for entry in manifest], Netezza.get_table_stats)
+        snowflake_stats = fetch_table_stats([entry['snowflake_table_name'] for entry in manifest],
+                                            Snowflake.get_table_stats)
+    history = load_history(history_path)
+    costs = [estimate_cost(entry, netezza_stats, snowflake_stats, history, parallel_sides, credits_per_hour)
+             for entry in manifest]
+    planned, skipped, plan, makespan = plan_schedule(
+        manifest, costs, min(workers, netezza_concurrency, snowflake_concurrency), netezza_budget, credit_budget)
+
+    results = [None] * len(manifest)
+    batch_results = run_batch([manifest[index] for index in planned], workers, netezza_concurrency,
+                              snowflake_concurrency, rel_tol, abs_tol, connect, parallel_sides, partition_by,
+                              store_path, fingerprint, journal_path, retries, retry_backoff, sink, sample_rows)
+    for index, result in zip(planned, batch_results):
+        results[index] = result
+    for index in skipped:
+        results[index] = {'snowflake_table_name': manifest[index]['snowflake_table_name'],
+                          'netezza_table_name': manifest[index]['netezza_table_name'],
+                          'status': SKIPPED,
+                          'message': f"Over budget, estimated {costs[index]['netezza_seconds']:.1f} Netezza seconds "
+                                     f"and {costs[index]['credits']:.4g} Snowflake credits",
+                          'elapsed': 0.0}
+    if history_path:
+        save_history(history_path, results)
+    return results, plan, makespan
+
+
+def print_plan(plan, makespan):
+    """
+    :description: Prints the estimated cost and finish time of the planned tables in the planned order, and the SLAs
+                  which the estimate misses.
+    :param plan: List of plan dicts from run_scheduled_batch().
+    :param makespan: Estimated seconds of the run.
+    """
+
+    planned = sorted((row for row in plan if row['order'] is not None), key=lambda row: row['order'])
+    for row in planned:
+        late = row['sla'] is not None and row['estimated_finish'] > row['sla']
+        print(f"{row['source']:<8} {row['seconds']:>9.1f}s  finish ~{row['estimated_finish']:>9.1f}s"
+              f"{'  SLA AT RISK' if late else ''}  {row['snowflake_table_name']} <- {row['netezza_table_name']}")
+    print(f"\nEstimated run time {makespan:.1f}s for {len(planned)} tables, "
+          f"{sum(row['credits'] for row in planned):.4g} Snowflake credits.\n")
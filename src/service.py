@@ -0,0 +1,348 @@
+############################################ Validation Service ########################################################
+# Description : Long running validation server. The database drivers are loaded and the Netezza and Snowflake
+#               connection pools are logged in once, then every validation job reuses the warm JVM and sessions
+#               instead of paying the start up cost of a new CLI process. Jobs are posted as JSON over HTTP (see
+#               client.py) and validated on a thread pool shared by all the jobs, with the concurrency caps of batch
+#               mode. The result of every table is streamed back as a JSON line as soon as it is finished.
+# Usage: python src/service.py [--host 127.0.0.1] [--port 8765] [--connect] [--local_db bench.db] [--warm]
+#                              [--store_dir stores/]
+
+import os
+import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backends import SQLiteBackend
+from batch import (DEFAULT_NETEZZA_CONCURRENCY, DEFAULT_SNOWFLAKE_CONCURRENCY, DEFAULT_WORKERS, normalize_manifest,
+                   parse_manifest, validate_table)
+from catalog import SchemaCatalog
+from comparison import DEFAULT_ABS_TOL, DEFAULT_REL_TOL
+from defaults import DEFAULT_CATALOG_PATH
+from validation import Netezza, Snowflake
+from query_builder import PARTITION_GRAINS
+from result_store import ResultStore
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# options of a job and their defaults, passed to batch.validate_table()
+JOB_OPTIONS = {
+    'rel_tol': DEFAULT_REL_TOL,
+    'abs_tol': DEFAULT_ABS_TOL,
+    'parallel_sides': False,
+    'partition_by': None,
+    'incremental_store': None,
+    'fingerprint': False,
+}
+# JSON types accepted for each job option, None is accepted where the default is None
+OPTION_TYPES = {
+    'rel_tol': (int, float),
+    'abs_tol': (int, float),
+    'parallel_sides': bool,
+    'partition_by': str,
+    'incremental_store': str,
+    'fingerprint': bool,
+}
+
+
+class JobError(Exception):
+    """
+        Exception raised when a posted validation job is not valid. Sent back to the client with HTTP status 400.
+    """
+
+
+def parse_job(job):
+    """
+    :description: Reads the table pairs and the options of a validation job.
+                  The tables are given either as a list of manifest entries under 'tables', or as the text of a CSV or
+                  YAML manifest under 'manifest' (with 'manifest_format': 'yaml' for YAML).
+                  The options are the keys of JOB_OPTIONS under 'options'.
+    :param job: dict decoded from the JSON body of the request.
+    :return: manifest: list of manifest entries, see batch.load_manifest(),
+             options: dict with all the JOB_OPTIONS keys.
+    """
+
+    if not isinstance(job, dict):
+        raise JobError("The job must be a JSON object")
+    try:
+        if job.get('manifest') is not None:
+            manifest = parse_manifest(job['manifest'], job.get('manifest_format') == 'yaml', 'the posted manifest')
+        else:
+            manifest = normalize_manifest(job.get('tables') or [], 'the posted tables')
+    except (ValueError, AttributeError) as e:
+        raise JobError(str(e))
+    if not manifest:
+        raise JobError("The job has no tables, give 'tables' or 'manifest'")
+
+    options = job.get('options') or dict()
+    unknown = set(options) - set(JOB_OPTIONS)
+    if unknown:
+        raise JobError(f"Unknown job options: {', '.join(sorted(unknown))}")
+    options = {**JOB_OPTIONS, **options}
+    for name, value in options.items():
+        if value is None and JOB_OPTIONS[name] is None:
+            continue
+        # bool is a subclass of int, a tolerance of true is a client bug
+        if not isinstance(value, OPTION_TYPES[name]) or (isinstance(value, bool) and OPTION_TYPES[name] is not bool):
+            raise JobError(f"Job option {name} has the wrong type: {value!r}")
+    if options['rel_tol'] < 0 or options['abs_tol'] < 0:
+        raise JobError("rel_tol and abs_tol must not be negative")
+    if options['partition_by'] is not None and options['partition_by'] not in PARTITION_GRAINS:
+        raise JobError(f"partition_by must be one of {', '.join(PARTITION_GRAINS)}")
+    return manifest, options
+
+
+class ValidationService:
+    """
+    Class to represent the state kept warm between validation jobs: the thread pool, the concurrency caps and the
+    result stores. The connection pools are the class level pools of Netezza and Snowflake.
+
+    ...
+
+    Attributes
+    ----------
+    connect: bool
+        Queries the databases when True, otherwise the sample data files are used.
+
+    store_dir: str
+        Directory of the incremental_store files of the jobs, None if the jobs cannot use incremental validation.
+
+    netezza_slots: threading.BoundedSemaphore
+        Limits the number of tables queried in Netezza at the same time, across all the jobs.
+
+    snowflake_slots: threading.BoundedSemaphore
+        Limits the number of tables queried in Snowflake at the same time, across all the jobs.
+
+    executor: concurrent.futures.ThreadPoolExecutor
+        Thread pool validating the tables of all the jobs.
+
+    stats: dict
+        Number of jobs received and tables validated since start.
+
+
+    Methods
+    -------
+    warm()
+        Opens and logs in all the pooled connections, so that the first job does not wait for them.
+
+    run_job(manifest, options, store)
+        Validates the tables of a job and yields their results as they finish.
+
+    get_store(name)
+        Returns the ResultStore of an incremental_store file name of store_dir, shared by the jobs.
+
+    close()
+        Waits for the running tables and closes the pooled connections.
+    """
+
+    def __init__(self, connect=False, workers=DEFAULT_WORKERS, netezza_concurrency=DEFAULT_NETEZZA_CONCURRENCY,
+                 snowflake_concurrency=DEFAULT_SNOWFLAKE_CONCURRENCY, store_dir=None):
+        """
+        :description: Constructor to create ValidationService objects.
+        :param connect: Queries the databases when True, otherwise the sample data files are used.
+        :param store_dir: Directory of the incremental_store files of the jobs, None to reject incremental jobs.
+        :param workers: Number of tables validated at the same time, across all the jobs.
+        :param netezza_concurrency: Maximum number of tables queried in Netezza at the same time.
+        :param snowflake_concurrency: Maximum number of tables queried in Snowflake at the same time.
+        """
+        self.connect = connect
+        self.store_dir = store_dir
+        if store_dir is not None:
+            os.makedirs(store_dir, exist_ok=True)
+        Netezza.pool_size = netezza_concurrency
+        Snowflake.pool_size = snowflake_concurrency
+        self.netezza_slots = threading.BoundedSemaphore(netezza_concurrency)
+        self.snowflake_slots = threading.BoundedSemaphore(snowflake_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='validation')
+        self.stats = {'jobs': 0, 'tables': 0}
+        self._stores = dict()
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """
+        :description: Opens and logs in all the pooled connections of both sides: starts the JVM of the Netezza JDBC
+                      driver, reads the SSM credentials and sets the Snowflake role and warehouse.
+        """
+        if not self.connect:
+            return
+        for pool in (Netezza.get_pool(), Snowflake.get_pool()):
+            conns = [pool.acquire() for _ in range(pool.max_size)]
+            for conn in conns:
+                pool.release(conn)
+
+    def get_store(self, name):
+        """
+        :description: Returns the ResultStore of an incremental_store, created on first use. Clients only name a
+                      file of store_dir, they cannot open or create SQLite files anywhere else on the server.
+        :param name: File name of the store in store_dir, None for jobs without incremental validation.
+        :return: ResultStore, None if name is None.
+        """
+        if name is None:
+            return None
+        if self.store_dir is None:
+            raise JobError("incremental_store is disabled, start the service with --store_dir")
+        if name != os.path.basename(name) or name in ('', '.', '..'):
+            raise JobError(f"incremental_store must be a file name in the store directory, not {name!r}")
+        path = os.path.join(self.store_dir, name)
+        with self._lock:
+            if path not in self._stores:
+                self._stores[path] = ResultStore(path)
+            return self._stores[path]
+
+    def run_job(self, manifest, options, store=None):
+        """
+        :description: Validates the tables of a job on the shared thread pool with batch.validate_table().
+                      The tables which did not start yet are cancelled if the generator is closed, eg: when the
+                      client disconnects.
+        :param manifest: List of manifest entries, see parse_job().
+        :param options: Job options, see JOB_OPTIONS.
+        :param store: ResultStore of the incremental_store option, see get_store().
+        :return: Generator of the result dicts in the order they finish, with the index of the table in the manifest.
+        """
+        with self._lock:
+            self.stats['jobs'] += 1
+        futures = {self.executor.submit(validate_table, entry, self.netezza_slots, self.snowflake_slots,
+                                        options['rel_tol'], options['abs_tol'], self.connect,
+                                        options['parallel_sides'], options['partition_by'], store,
+                                        options['fingerprint']): index
+                   for index, entry in enumerate(manifest)}
+        try:
+            for future in as_completed(futures):
+                with self._lock:
+                    self.stats['tables'] += 1
+                yield {'index': futures[future], **future.result()}
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        """
+        :description: Waits for the running tables and closes the pooled connections.
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.connect:
+            Netezza.get_pool().close_all()
+            Snowflake.get_pool().close_all()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler of the validation service.
+
+    GET /health returns the stats of the service.
+    POST /validate takes a JSON job (see parse_job()) and streams one JSON line per validated table.
+    """
+
+    service = None
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        self.send_json(200, {'status': 'ok', **self.service.stats})
+
+    def do_POST(self):
+        if self.path != '/validate':
+            self.send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            manifest, options = parse_job(json.loads(body or b'{}'))
+            store = self.service.get_store(options['incremental_store'])
+        except (ValueError, JobError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+
+        # no Content-Length, the results are streamed until the connection is closed
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        results = self.service.run_job(manifest, options, store)
+        try:
+            for result in results:
+                self.wfile.write(json.dumps(result, default=str).encode() + b'\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            results.close()
+
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    :description: Serves validation jobs until interrupted, then closes the service.
+    :param service: ValidationService
+    :param host: Address to listen on. The service has no authentication, keep it on localhost or a private network.
+    :param port: Port to listen on.
+    """
+
+    ServiceHandler.service = service
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    print(f"Validation service listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve validation jobs with warm database connections.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on.")
+    parser.add_argument(
+        "--connect", action="store_true",
+        help="Query the Netezza and Snowflake databases instead of the sample data files.")
+    parser.add_argument(
+        "--local_db",
+        help="SQLite file standing in for both Netezza and Snowflake, implies --connect. See backends.py.")
+    parser.add_argument(
+        "--validation_sp", action="store_true",
+        help="Compute the Snowflake metrics with the generic validation SP instead of the metric queries.")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Also compare NULL counts, approximate distinct counts, STDDEV and quantiles, in the same scan.")
+    parser.add_argument(
+        "--catalog", metavar="CATALOG_FILE", nargs='?', const=DEFAULT_CATALOG_PATH,
+        help="Cache the column metadata of whole schemas in this SQLite file, shared by all the jobs.")
+    parser.add_argument(
+        "--store_dir",
+        help="Directory of the incremental_store files the jobs can name. Incremental jobs are rejected without it.")
+    parser.add_argument(
+        "--warm", action="store_true", help="Open and log in all the pooled connections before accepting jobs.")
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="Number of tables validated at the same time.")
+    parser.add_argument(
+        "--netezza_concurrency", type=int, default=DEFAULT_NETEZZA_CONCURRENCY,
+        help="Maximum number of tables queried in Netezza at the same time.")
+    parser.add_argument(
+        "--snowflake_concurrency", type=int, default=DEFAULT_SNOWFLAKE_CONCURRENCY,
+        help="Maximum number of tables queried in Snowflake at the same time.")
+    args = parser.parse_args()
+    Snowflake.use_validation_sp = args.validation_sp
+    Netezza.profile = Snowflake.profile = args.profile
+    if args.local_db:
+        Netezza.use_backend(SQLiteBackend(args.local_db))
+        Snowflake.use_backend(SQLiteBackend(args.local_db))
+        args.connect = True
+    if args.catalog:
+        Netezza.catalog = Snowflake.catalog = SchemaCatalog(args.catalog)
+
+    validation_service = ValidationService(args.connect, args.workers, args.netezza_concurrency,
+                                           args.snowflake_concurrency, args.store_dir)
+    if args.warm:
+        validation_service.warm()
+    serve(validation_service, args.host, args.port)
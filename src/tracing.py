@@ -0,0 +1,467 @@
+############################################ Query Tracing and Profiling ##############################################
+# Description : Instrumentation of the validation runs. Every query issued on a traced cursor is recorded with its
+#               side, backend, SQL fingerprint, start/end time, rows and bytes fetched and Snowflake query id, and
+#               every local phase (metadata lookup, column checks, comparison, ..) with its duration. The records are
+#               written as JSON lines and aggregated into a summary of the slowest tables, columns and phases.
+#               Optional cProfile hot path profiling per table. When the tracer is not started, cursors are not
+#               wrapped and phases are a shared no-op context, so the validation runs as before.
+
+import io
+import re
+import sys
+import json
+import time
+import pstats
+import hashlib
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import partial
+
+import pandas as pd
+
+from defaults import DEFAULT_TOP
+
+
+# number of characters of the SQL text written to the trace, the fingerprint covers the whole statement
+SQL_PREVIEW_LENGTH = 200
+
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r'\s+')
+
+_NO_PHASE = nullcontext()
+
+
+def get_sql_fingerprint(query):
+    """
+    :description: Fingerprint of the shape of a SQL statement. Literals are replaced with ? and white space is
+                  collapsed, so the same query run for another date range gets the same fingerprint.
+    :return: 16 hex characters.
+    """
+
+    normalized = WHITESPACE.sub(' ', SQL_LITERALS.sub('?', query)).strip().lower()
+    return hashlib.md5(normalized.encode()).hexdigest()[:16]
+
+
+def get_query_columns(aliases):
+    """
+    :description: Names of the table columns computed by a fused metric query, see query_builder.build_queries().
+    :param aliases: dict of result column --> (column name, metric name).
+    """
+
+    return sorted({col for col, _ in aliases.values() if col is not None})
+
+
+def estimate_row_bytes(rows):
+    """
+    :description: Approximate size of python result rows, used for the cursors which do not fetch Arrow.
+    """
+
+    return sum(sys.getsizeof(value) for row in rows for value in row)
+
+
+class TracedCursor:
+    """
+    DB-API cursor wrapper recording the queries executed on it with the tracer. A query starts with execute(), or
+    execute_async() for Snowflake, and ends when its result set is exhausted, the next query starts or the cursor is
+    closed. Every other attribute is the attribute of the wrapped cursor, so fetch methods missing on the wrapped cursor
+    (eg: fetch_arrow_all on JDBC) are missing on the wrapper too.
+
+    ...
+
+    Attributes
+    ----------
+    cursor: DB-API cursor
+        The wrapped cursor.
+
+    tracer: Tracer
+        Tracer the query records are written to.
+
+    labels: dict
+        Attributes of the trace records, eg: side and table, plus the labels of the next query set with label_next().
+
+
+    Methods
+    -------
+    label_next(**labels)
+        Adds attributes to the record of the next query executed on the cursor.
+    """
+
+    # fetch methods of the wrapped cursor --> function returning (rows, bytes, exhausted) of their result
+    FETCH_METHODS = {
+        'fetchone': lambda row: (0, 0, True) if row is None else (1, estimate_row_bytes([row]), False),
+        'fetchmany': lambda rows: (len(rows), estimate_row_bytes(rows), not rows),
+        'fetchall': lambda rows: (len(rows), estimate_row_bytes(rows), True),
+        'fetch_arrow_all': lambda table: (0, 0, True) if table is None else (table.num_rows, table.nbytes, True),
+    }
+
+    def __init__(self, cursor, tracer, **labels):
+        """
+        :description: Constructor to create TracedCursor objects.
+        :param cursor: DB-API cursor to be wrapped.
+        :param tracer: Tracer the query records are written to.
+        :param labels: Attributes of every record, eg: side='NETEZZA', table='DB.SCHEMA.TABLE'.
+        """
+        self.cursor = cursor
+        self.tracer = tracer
+        self.labels = labels
+        self._next_labels = dict()
+        self._current = None
+        self._submitted = dict()
+
+    def label_next(self, **labels):
+        """
+        :description: Adds attributes to the record of the next query, eg: the columns of a fused metric query.
+        """
+        self._next_labels.update(labels)
+
+    def _start(self, query):
+        record = self.tracer.start_query(query, **self.labels, **self._next_labels)
+        self._next_labels = dict()
+        return record
+
+    def _finish(self, record, error=None):
+        if record is not None:
+            self.tracer.end_query(record, error)
+
+    def execute(self, query, *args, **kwargs):
+        self._finish(self._current)
+        self._current = self._start(query)
+        try:
+            result = self.cursor.execute(query, *args, **kwargs)
+        except Exception as e:
+            self._finish(self._current, e)
+            self._current = None
+            raise
+        self._current['query_id'] = getattr(self.cursor, 'sfqid', None)
+        return self if result is self.cursor else result
+
+    def execute_async(self, query, *args, **kwargs):
+        record = self._start(query)
+        try:
+            result = self.cursor.execute_async(query, *args, **kwargs)
+        except Exception as e:
+            self._finish(record, e)
+            raise
+        record['query_id'] = self.cursor.sfqid
+        self._submitted[record['query_id']] = record
+        return result
+
+    def get_results_from_sfqid(self, query_id, *args, **kwargs):
+        self._finish(self._current)
+        self._current = self._submitted.pop(query_id, None) or self._start(f"-- results of {query_id}")
+        self._current['query_id'] = query_id
+        return self.cursor.get_results_from_sfqid(query_id, *args, **kwargs)
+
+    def close(self):
+        self._finish(self._current)
+        self._current = None
+        for record in self._submitted.values():
+            self._finish(record)
+        self._submitted.clear()
+        return self.cursor.close()
+
+    def _fetch_pandas_batches(self, fetch_pandas_batches, *args, **kwargs):
+        record = self._current
+        for df in fetch_pandas_batches(*args, **kwargs):
+            if record is not None:
+                record['rows'] += len(df)
+                record['bytes'] += int(df.memory_usage(index=False).sum())
+            yield df
+        if record is not None and record is self._current:
+            self._finish(record)
+            self._current = None
+
+    def __getattr__(self, name):
+        attr = getattr(self.cursor, name)
+        if name == 'fetch_pandas_batches':
+            return partial(self._fetch_pandas_batches, attr)
+        if name not in self.FETCH_METHODS:
+            return attr
+        measure = self.FETCH_METHODS[name]
+
+        def fetch(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            record = self._current
+            if record is not None:
+                rows, size, exhausted = measure(result)
+                record['rows'] += rows
+                record['bytes'] += size
+                if exhausted:
+                    self._finish(record)
+                    self._current = None
+            return result
+        return fetch
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+
+class Tracer:
+    """
+    Thread safe recorder of the queries and phases of the validation runs. Disabled until start() is called.
+
+    ...
+
+    Attributes
+    ----------
+    enabled: bool
+        Records queries and phases when True.
+
+    cprofile: bool
+        Profiles the hot path of every table with cProfile when True, see hot_path().
+
+
+    Methods
+    -------
+    start(path, cprofile)
+        Enables the tracer, writing the JSON lines trace to path when given.
+
+    close()
+        Stops recording and closes the trace file.
+
+    wrap_cursor(cursor, **labels)
+        Returns a TracedCursor recording the queries of the cursor, the cursor itself when disabled.
+
+    label_next(cursor, **labels)
+        Adds attributes to the record of the next query executed on a traced cursor.
+
+    phase(name, **labels)
+        Context manager recording the duration of a local phase.
+
+    hot_path()
+        Context manager profiling the block with cProfile.
+
+    start_query(query, **labels) / end_query(record, error)
+        Records a query whose start and end are not on a cursor.
+
+    summary(top)
+        Returns the slowest tables, columns and phases as dataframes.
+
+    get_profile_stats()
+        Returns the merged cProfile statistics.
+    """
+
+    def __init__(self):
+        """
+        :description: Constructor to create Tracer objects, disabled.
+        """
+        self.enabled = False
+        self.cprofile = False
+        self._file = None
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self._profile_stats = None
+        self._tables = dict()
+        self._columns = dict()
+        self._phases = dict()
+
+    def start(self, path=None, cprofile=False):
+        """
+        :description: Enables the tracer and drops the aggregates of a previous run.
+        :param path: File the JSON lines trace is written to, only the summary is kept if None.
+        :param cprofile: Profiles the hot path of every table with cProfile.
+        """
+        with self._lock:
+            self._file = open(path, 'w') if path else None
+            self._tables, self._columns, self._phases = dict(), dict(), dict()
+            self._profile_stats = None
+            self.cprofile = cprofile
+            self.enabled = True
+
+    def close(self):
+        """
+        :description: Stops recording and closes the trace file. The summary stays available.
+        """
+        with self._lock:
+            self.enabled = False
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def wrap_cursor(self, cursor, **labels):
+        """
+        :description: Returns a TracedCursor recording the queries executed on the cursor, the cursor itself when the
+                      tracer is disabled.
+        :param cursor: DB-API cursor.
+        :param labels: Attributes of every record, eg: side, backend and table.
+        """
+        if not self.enabled:
+            return cursor
+        return TracedCursor(cursor, self, **labels)
+
+    @staticmethod
+    def label_next(cursor, **labels):
+        """
+        :description: Adds attributes to the record of the next query executed on the cursor, if it is traced.
+        """
+        if isinstance(cursor, TracedCursor):
+            cursor.label_next(**labels)
+
+    def phase(self, name, **labels):
+        """
+        :description: Context manager recording the duration of a local phase, eg: the comparison of the metrics.
+                      Returns a shared no-op context when the tracer is disabled.
+        :param name: Name of the phase.
+        :param labels: Attributes of the record, eg: table and column.
+        """
+        if not self.enabled:
+            return _NO_PHASE
+        return self._phase(name, labels)
+
+    @contextmanager
+    def _phase(self, name, labels):
+        record = {'event': 'phase', 'name': name, **labels, 'thread': threading.current_thread().name,
+                  'start': time.time()}
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            record['end'] = record['start'] + record['seconds']
+            self.write(record)
+
+    def hot_path(self):
+        """
+        :description: Context manager profiling the block with cProfile, when the tracer was started with cprofile.
+                      One block is profiled at a time, blocks started in other threads meanwhile run unprofiled.
+                      cProfile follows the thread it is started in, the work of executor threads started in the
+                      block is not profiled before Python 3.12.
+        """
+        if not (self.enabled and self.cprofile):
+            return _NO_PHASE
+        return self._hot_path()
+
+    @contextmanager
+    def _hot_path(self):
+        if not self._profile_lock.acquire(blocking=False):
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                stats = pstats.Stats(profile, stream=io.StringIO())
+                if self._profile_stats is None:
+                    self._profile_stats = stats
+                else:
+                    self._profile_stats.add(stats)
+        finally:
+            self._profile_lock.release()
+
+    def start_query(self, query, **labels):
+        """
+        :description: Returns the record of a query starting now, to be passed to end_query().
+        :param query: SQL text of the query.
+        :param labels: Attributes of the record, eg: side, backend, table and columns.
+        """
+        return {'event': 'query', **labels, 'sql_fingerprint': get_sql_fingerprint(query),
+                'sql': WHITESPACE.sub(' ', query).strip()[:SQL_PREVIEW_LENGTH], 'query_id': None,
+                'thread': threading.current_thread().name, 'start': time.time(), 'rows': 0, 'bytes': 0,
+                '_perf_start': time.perf_counter()}
+
+    def end_query(self, record, error=None):
+        """
+        :description: Completes and writes the record of a query.
+        :param record: Record returned by start_query().
+        :param error: Exception raised by the query, if any.
+        """
+        record['seconds'] = time.perf_counter() - record.pop('_perf_start')
+        record['end'] = record['start'] + record['seconds']
+        if error is not None:
+            record['error'] = f"{type(error).__name__}: {error}"
+        self.write(record)
+
+    def write(self, record):
+        """
+        :description: Adds a completed record to the aggregates and writes it to the trace file.
+        """
+        with self._lock:
+            if not self.enabled:
+                return
+            self._aggregate(record)
+            if self._file is not None:
+                self._file.write(json.dumps(record, default=str) + '\n')
+
+    def _aggregate(self, record):
+        seconds = record['seconds']
+        if record['event'] == 'phase':
+            stats = self._phases.setdefault(record['name'], [0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            if record.get('column'):
+                self._add_column(record.get('table'), record['column'], seconds)
+            return
+
+        stats = self._tables.setdefault((record.get('side'), record.get('table')), [0, 0.0, 0, 0])
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] += record['rows']
+        stats[3] += record['bytes']
+        # the scan time of a fused metric query is shared by the columns it computes
+        columns = record.get('columns') or []
+        for col in columns:
+            self._add_column(record.get('table'), col, seconds / len(columns))
+
+    def _add_column(self, table, column, seconds):
+        stats = self._columns.setdefault((table, column), [0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+
+    def summary(self, top=DEFAULT_TOP):
+        """
+        :description: Returns the slowest tables, columns and phases of the run.
+        :param top: Number of tables and columns returned.
+        :return: tables: pandas.Dataframe of SIDE, TABLE, QUERIES, SECONDS, ROWS, BYTES,
+                 columns: pandas.Dataframe of TABLE, COLUMN, QUERIES, SECONDS,
+                 phases: pandas.Dataframe of PHASE, COUNT, SECONDS. All sorted by SECONDS, slowest first.
+        """
+        with self._lock:
+            tables = pd.DataFrame([(side, table, *stats) for (side, table), stats in self._tables.items()],
+                                  columns=['SIDE', 'TABLE', 'QUERIES', 'SECONDS', 'ROWS', 'BYTES'])
+            columns = pd.DataFrame([(table, column, *stats) for (table, column), stats in self._columns.items()],
+                                   columns=['TABLE', 'COLUMN', 'QUERIES', 'SECONDS'])
+            phases = pd.DataFrame([(name, *stats) for name, stats in self._phases.items()],
+                                  columns=['PHASE', 'COUNT', 'SECONDS'])
+        return (tables.sort_values('SECONDS', ascending=False).head(top).reset_index(drop=True),
+                columns.sort_values('SECONDS', ascending=False).head(top).reset_index(drop=True),
+                phases.sort_values('SECONDS', ascending=False).reset_index(drop=True))
+
+    def get_profile_stats(self):
+        """
+        :description: Returns the cProfile statistics merged from all the profiled blocks, None if nothing was profiled.
+        :return: pstats.Stats
+        """
+        return self._profile_stats
+
+
+tracer = Tracer()
+
+
+def print_trace_summary(top=DEFAULT_TOP, profile_path=None):
+    """
+    :description: Prints the slowest tables, columns and phases recorded by the tracer, and the functions with the
+                  highest cumulative time when the hot path was profiled.
+    :param top: Number of tables, columns and functions printed.
+    :param profile_path: File the merged cProfile statistics are dumped to, for pstats or snakeviz.
+    """
+
+    tables, columns, phases = tracer.summary(top)
+    for title, df in (('Slowest tables (query time)', tables), ('Slowest columns (share of the scan time)', columns),
+                      ('Local phases', phases)):
+        print(f"\n{title}:")
+        print(df.to_string(index=False, float_format='{:.3f}'.format) if not df.empty else '  none')
+
+    stats = tracer.get_profile_stats()
+    if stats is not None:
+        if profile_path:
+            stats.dump_stats(profile_path)
+        stats.stream = sys.stdout
+        print("\nHot path (cProfile, cumulative time):")
+        stats.sort_stats('cumulative').print_stats(top)
@@ -0,0 +1,1389 @@
+############################################ Migration Validation #######################################################
+# Description : The Netezza and Snowflake table classes and the validation functions comparing a migrated table pair:
+#               count, column metrics, date buckets, incremental, fingerprints, samples and row diff. Configured by the
+#               main.py command line or by the callers (batch.py, service.py, work_queue.py) through the class
+#               attributes, eg: Netezza.use_backend(), Snowflake.profile.
+
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+from comparison import (DEFAULT_ABS_TOL, DEFAULT_REL_TOL, FLOAT_DATA_TYPES, compare_bucket_metrics,
+                        compare_validation_data, compare_validation_frames, normalize_buckets)
+from query_builder import (ALL_BUCKET, MERGEABLE_TEMPLATES, METRIC_COLUMNS, METRIC_TEMPLATES, add_condition,
+                           build_bucket_clause, build_metric_queries, build_watermark_clause, build_where_clause,
+                           get_bucket_expression, get_check_type, get_params, parse_bucket_results,
+                           parse_metric_results)
+from result_store import ResultStore
+from fingerprint import build_fingerprint_queries
+from sampling import (DEFAULT_CONFIDENCE_Z, DEFAULT_TARGET_ROWS, EXACT_METRICS, SAME_SAMPLE_METRICS,
+                      SAMPLE_TEMPLATES, build_sample_condition, compare_estimates, estimate_totals, get_float_columns,
+                      get_sample_fraction, to_column_metrics)
+from profiling import PROFILE_COLUMNS, compare_profiles, get_profile_templates
+from arrow_fetch import arrow_to_frame, cursor_to_arrow
+from row_diff import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_ROWS, build_row_query, diff_row_streams
+from backends import NetezzaBackend, SnowflakeBackend
+from connections import ConnectionPool
+from tracing import get_query_columns, tracer
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+
+# load date column of the migrated tables, the same column on both sides unless a date column is given
+DEFAULT_DATE_COL = 'ETL_LOAD_DATE'
+
+
+class CountValidationError(Exception):
+    """
+        Exception raised when the snowflake data count and netezza data count mismatches after the migration task.
+    """
+
+    def __init__(self, sf_count, net_count) -> None:
+        """
+            :description: constructor function to update the error message in the exception
+            :param sf_count: Count of records in snowflake db after migration.
+            :param net_count: Count of records in netezza db which was migrated to snowflake.
+            :usage: raise CountVaildationError(<sf_count>, <net_count>)
+            :output: Counts mismatched.
+                     Snowflake count : <sf_count>
+                     Netezza count : <net_count>
+        """
+
+        self.message = f"Counts mismatched.\nSnowflake count : {sf_count}\nNetezza count : {net_count}"
+        super().__init__(self.message)
+
+
+class DataValidationError(Exception):
+    """
+        Exception raised when the Data validation between snowflake and netezza databases fail after the migration task.
+    """
+
+    def __init__(self, report: dict) -> None:
+        """
+            :description: constructor function to update the error message in the exception
+            :param report: Dictionary containing info regarding mismatched validation data
+            :usage: raise DataVaildationError(<report>)
+            :output: Data Validation Failed.
+                     Report:
+                     {
+                        "ADD_TYPE": {
+                            "MAX_STR_LENGTH": {
+                                "SF": 22,
+                                "Netezza": 20.0
+                            }
+                        },
+                        "ETL_UPDATE_DATE": {
+                            "MIN": {
+                                "SF": "2015-05-28 15:53:00",
+                                "Netezza": "2015-05-28 15:53:31"
+                            }
+                        }
+                     }
+        """
+
+        self.report = report
+        self.message = f"Data Validation Failed.\nReport:\n{json.dumps(report, indent=4)}"
+        super().__init__(self.message)
+
+
+class Netezza:
+
+    """
+    Class to represent table in Netezza database.
+
+    ...
+
+    Attributes
+    ----------
+    netezza_date_col: str
+        Load date column for Netezza tables. Used by default if no particular date column is mentioned in the input.
+
+    backend: backends.Backend
+        Database operations of the Netezza side, NetezzaBackend or a local stand-in set with use_backend().
+
+    pool: connections.ConnectionPool
+        Connection pool shared by all the Netezza objects of the process, created on first connect.
+
+    pool_size: int
+        Maximum number of Netezza connections open at the same time.
+
+    profile: bool
+        Adds the profiling metrics of profiling.py to the validation scan when True.
+
+    catalog: catalog.SchemaCatalog
+        Cached column metadata of whole schemas, replaces the per table _v_relation_column query when set.
+
+    conn: jaydebeapi connection object
+        A pooled connection object to interact with Netezza, held while the validation queries run.
+
+    db_name: str
+        Name of the database in Netezza for the table to be validated.
+
+    schema_name: str
+        Name of the schema in Netezza for the table to be validated.
+
+    table_name: str
+        Name of the table for which validation has to be done.
+
+    full_table_name: str
+        Complete name of the table --> DB.SCHEMA.TABLENAME
+
+    date_col: str
+        Name of the column which contains the date for which the validation has to be done.
+
+    start_date: str
+        Start date/timestamp from which the data has to be queried for validation.
+
+    end_date: str
+        End date/timestamp up to which the data has to be queried for validation.
+
+    where_clause: str
+        Based on the date parameter, the query to get data from the netezza table may use this where clause.
+
+    val_df: pandas.Dataframe
+        Dataframe which would contain the column name, data type and other validation parameters from Netezza.
+
+    bucket_counts: pandas.Series
+        Record counts per date bucket of the last partitioned or fingerprint validation, None before.
+
+    elapsed: float
+        Seconds the table held a pooled connection of this side, the time the table costs this side.
+
+
+    Methods
+    -------
+    use_backend(backend)
+        Replaces the backend of the Netezza side and closes the connection pool of the previous one.
+
+    get_table_stats(db_name, schema_name)
+        Returns the row counts of all the tables of a schema from _v_table.
+
+    connect_netezza()
+        Acquires a connection from the shared Netezza connection pool.
+
+    close()
+        Releases the connection back to the pool.
+
+    session()
+        Context manager holding a pooled connection for the queries run in the block.
+
+    set_where_clause()
+        Update the where_clause attribute based on the timestamp constraints as per the input.
+
+    get_table_count()
+        Gets count of records from the Netezza table using SQL query.
+
+    get_column_dtype_info()
+        Gets the column details of the table from _v_relation_column, or from the schema catalog when set.
+
+    run_query(query, params)
+        Executes a query on the Netezza cursor and returns the result set as a dataframe.
+
+    explain(query, params)
+        Returns the Netezza plan of a query and the estimated bytes it scans, without running it.
+
+    int_col_checks(col)
+        Returns average, minimum, maximum, sum for the specified (input) column using SQL query from the Netezza table.
+
+    varchar_col_checks(col)
+        Returns max character length in the specified (input) column from the table in Netezza using SQL query.
+
+    datetime_col_checks(col)
+        Returns minimum and maximum value for the specified (input) column from the table in Netezza using SQL query.
+
+    func_selector(col)
+        Invokes the right validation function based on the column datatype.
+
+    validate_columns_per_column()
+        Updates the validation dataframe using pandas apply function with func_selector function.
+
+    validate_columns()
+        Updates the validation dataframe and the table count using the fused single scan validation queries.
+
+    get_bucket_metrics(grain, where_clause, templates)
+        Returns the record count and column metrics per date bucket of date_col, in a single grouped scan.
+
+    get_fingerprints(grain)
+        Returns the record count and the content fingerprints of the table, or of each date bucket.
+
+    iter_rows(columns, key, where_clause, chunk_size)
+        Streams the rows of the table ordered by the key column in chunks fetched with fetchmany.
+
+    get_sample_metrics(fraction, key)
+        Returns the record count and the sampling metrics of a deterministic sample of the rows.
+
+    """
+
+    netezza_date_col = DEFAULT_DATE_COL
+    dialect = 'netezza'
+    profile = False
+    catalog = None
+    backend = NetezzaBackend()
+    pool = None
+    pool_size = 4
+    _pool_lock = threading.Lock()
+
+    def __init__(self, db_name, schema_name, table_name, date_col=netezza_date_col, start_date=None, end_date=None,
+                 connect=False, validate=True):
+        """
+        :description: Constructor to create Netezza object.
+        :param db_name: Name of the database in which the table resides.
+        :param schema_name: Name of the schema in which the table resides.
+        :param table_name: Name of the table.
+        :param date_col: Name of the date column that is used to query the table for data validation.
+        :param start_date: Start date from which the data in the table has to be queried.
+        :param end_date: End date up to which the data in the table has to be queried.
+        :param connect: Queries the Netezza database when True, otherwise the sample data files are used.
+        :param validate: Runs the column checks when True, otherwise only the column details are queried.
+                         Eg: for partitioned validation with get_bucket_metrics().
+        """
+        self.connect = connect
+        self.conn = None
+        self.curs = None
+        self.elapsed = 0.0
+        self.db_name = db_name
+        self.schema_name = schema_name
+        self.table_name = table_name
+        self.full_table_name = self.backend.table_name(self.db_name, self.schema_name, self.table_name)
+        self.date_col = date_col
+        self.start_date = start_date
+        self.end_date = end_date
+        self.where_clause = ''
+        self.val_df = None
+        self.bucket_counts = None
+        self.set_where_clause()
+        with self.session():
+            with tracer.phase('get_column_dtype_info', side='NETEZZA', table=self.full_table_name):
+                self.get_column_dtype_info()
+            if validate:
+                with tracer.phase('validate_columns', side='NETEZZA', table=self.full_table_name):
+                    self.validate_columns()
+
+    @classmethod
+    def use_backend(cls, backend):
+        """
+        :description: Replaces the backend of the Netezza side, eg: with backends.SQLiteBackend to run the validation
+                      on a local database. The connections of the previous backend are closed.
+        :param backend: backends.Backend
+        """
+        with cls._pool_lock:
+            if cls.pool is not None:
+                cls.pool.close_all()
+            cls.backend = backend
+            cls.pool = None
+
+    @classmethod
+    def get_pool(cls):
+        """
+        :description: Returns the Netezza connection pool of the process, created on first use with pool_size.
+        """
+        with cls._pool_lock:
+            if cls.pool is None:
+                cls.pool = ConnectionPool(cls.backend.connect, cls.backend.setup, max_size=cls.pool_size)
+            return cls.pool
+
+    @classmethod
+    def get_table_stats(cls, db_name, schema_name):
+        """
+        :description: Returns the row counts and sizes of all the tables of a schema from the Netezza catalog, in one
+                      query on a pooled connection. See backends.Backend.get_table_stats().
+        :return: pandas.Dataframe with TABLE_NAME, ROW_COUNT and BYTES columns.
+        """
+        with cls.get_pool().connection() as conn:
+            cur = conn.cursor()
+            try:
+                return cls.backend.get_table_stats(cur, db_name, schema_name)
+            finally:
+                cur.close()
+
+    def connect_netezza(self):
+        """
+        :description: Acquires a connection from the shared Netezza connection pool. Blocks while all the pooled
+                      connections are in use by other tables.
+        """
+        self.conn = self.get_pool().acquire()
+        self._acquired_at = time.perf_counter()
+        self.curs = tracer.wrap_cursor(self.conn.cursor(), side='NETEZZA', backend=type(self.backend).__name__,
+                                       table=self.full_table_name)
+
+    def close(self):
+        """
+        :description: Closes the cursor and releases the connection back to the pool.
+        """
+        if self.conn is None:
+            return
+        self.elapsed += time.perf_counter() - self._acquired_at
+        try:
+            self.curs.close()
+            self.get_pool().release(self.conn)
+        except Exception:
+            self.get_pool().release(self.conn, discard=True)
+        self.conn = None
+        self.curs = None
+
+    @contextmanager
+    def session(self):
+        """
+        :description: Holds a pooled connection for the queries run in the block and releases it at the end.
+                      Does nothing without connect or if the object already holds a connection.
+        """
+        if not self.connect or self.conn is not None:
+            yield
+            return
+        self.connect_netezza()
+        try:
+            yield
+        finally:
+            self.close()
+
+    def set_where_clause(self):
+        """
+        :description: Update the where_clause attribute based on the timestamp constraints as per the input.
+        """
+
+        self.where_clause = build_where_clause(self.date_col, self.start_date, self.end_date)
+
+    def get_table_count(self):
+        """
+        :description: Gets count of records from the Netezza table using SQL query.
+        """
+
+        if self.curs is not None:
+            self.table_count = self.backend.count(self.curs, self.full_table_name, self.where_clause)
+            return
+
+        # remove this once connection to netezza is established
+        self.table_count = 27
+
+    def get_column_dtype_info(self):
+        """
+        :description: Queries _v_relation_column table to get column details of the table from Netezza.
+                      With a schema catalog the columns of the whole schema are fetched once and served from memory.
+        """
+
+        if self.curs is not None and Netezza.catalog is not None:
+            self.val_df = Netezza.catalog.get_columns('NETEZZA', self.backend, self.curs, self.db_name,
+                                                      self.schema_name, self.table_name)
+            return
+        if self.curs is not None:
+            self.val_df = self.backend.get_columns(self.curs, self.db_name, self.schema_name, self.table_name)
+            return
+
+        # remove this once connection to netezza is established
+
+        self.val_df = pd.read_csv(
+            'src/netezza_col_dtype_sample.csv', sep=',', header='infer')
+
+    def run_query(self, query, params=()):
+        """
+        :description: Executes a query on the Netezza cursor and returns the result set as a dataframe.
+                      The JDBC result set is fetched in chunks into columnar Arrow arrays, see arrow_fetch.py.
+        :param query: SQL query to be executed.
+        :param params: Values of the ? markers of the query, see query_builder.get_params().
+        :return: pandas.Dataframe with upper case column names.
+        """
+
+        return self.backend.run_query(self.curs, query, params)
+
+    def explain(self, query, params=()):
+        """
+        :description: Asks Netezza for the plan of a query without running it, see backends.Backend.explain().
+        :return: dict with bytes, partitions, total_partitions and plan keys.
+        """
+
+        with self.session():
+            if self.curs is None:
+                raise RuntimeError("Query plans need a connection to Netezza, use --connect")
+            return self.backend.explain(self.curs, query, params)
+
+    def int_col_checks(self, col):
+        """
+        :description: Returns average, minimum, maximum, sum for the specified (input) column
+                      using SQL query from the Netezza table
+        :param col: Name of the column from which the validation details have to be queried from.
+        :return: <average:float>, <minimum:float>, <maximum:float>, <sum:float>, np.NaN
+        """
+
+        query = f"""select AVG({col}) as AVG, 
+            MIN({col}) as MIN, 
+            MAX({col}) as MAX, 
+            SUM({col}) as SUM
+        from {self.full_table_name}{self.where_clause}"""
+
+        if self.curs is not None:
+            df = self.run_query(query, get_params(self.where_clause))
+        else:
+            # remove this once connection to netezza is established
+            df = pd.read_csv('src/int_col_check_sample.csv')
+        return df['AVG'][0], \
+            df['MIN'][0], \
+            df['MAX'][0], \
+            df['SUM'][0], \
+            np.NaN, \
+            np.NaN, \
+            np.NaN
+
+    def varchar_col_checks(self, col):
+        """
+        :description: Returns max character length in the specified (input) column
+                      from the table in Netezza using SQL query.
+        :param col: Name of the column from which the validation details have to be queried from.
+        :return: np.NaN, np.NaN, np.NaN, np.NaN, <max_length:int>
+        """
+
+        query = f"""select 
+            max(length({col})) as MAX_STR_LENGTH
+        from {self.full_table_name}{self.where_clause}"""
+        if self.curs is not None:
+            df = self.run_query(query, get_params(self.where_clause))
+        else:
+            # remove this once connection to netezza is established
+            df = pd.read_csv('src/varchar_col_check_sample.csv')
+        return np.NaN, \
+            np.NaN, \
+            np.NaN, \
+            np.NaN, \
+            np.NaN, \
+            np.NaN, \
+            df['MAX_STR_LENGTH'][0]
+
+    def datetime_col_checks(self, col):
+        """
+        :description: Returns minimum and maximum value for the specified (input) column
+                      from the table in Netezza using SQL query.
+        :param col: Name of the column from which the validation details have to be queried from.
+        :return: np.NaN, <minimum:float>, <maximum:float>, np.NaN, np.NaN
+        """
+
+        query = f"""select 
+            min({col}) as MIN_DATE,
+            max({col}) as MAX_DATE
+        from {self.full_table_name}{self.where_clause}"""
+        if self.curs is not None:
+            df = self.run_query(query, get_params(self.where_clause))
+        else:
+            # remove this once connection to netezza is established
+            df = pd.read_csv('src/date_col_check_sample.csv')
+        return np.NaN, \
+            np.NaN, \
+            np.NaN, \
+            np.NaN, \
+            df['MIN_DATE'][0], \
+            df['MAX_DATE'][0], \
+            np.NaN
+
+    def func_selector(self, col):
+        """
+        :description: Invokes the right validation function based on the column datatype.
+        :param col: Name of the column from which the validation details have to be queried from.
+        :return: Output of function called in the if block.
+                 Pattern: <average:float>, <minimum:float>, <maximum:float>, <sum:float>, <max_length:int>
+        """
+
+        check_type = get_check_type(self.val_df.loc[self.val_df['ATTNAME'] == col, 'FORMAT_TYPE'].iloc[0])
+        with tracer.phase('column_checks', side='NETEZZA', table=self.full_table_name, column=col):
+            if check_type == 'NUMBER':
+                return self.int_col_checks(col)
+            elif check_type == 'VARCHAR':
+                return self.varchar_col_checks(col)
+            elif check_type == 'DATETIME':
+                return self.datetime_col_checks(col)
+            else:
+                return np.NaN, np.NaN, np.NaN, np.NaN, np.NaN, np.NaN, np.NaN
+
+    def validate_columns(self):
+        """
+        :description: Updates the validation dataframe and the table count. All the column checks and the record count
+                      are computed by the fused queries from query_builder, so the table is scanned once instead of
+                      once per column. The queries are split into a few wide statements only for very wide tables.
+                      With profile the profiling metrics are computed in the same scan.
+        """
+
+        if self.curs is None:
+            # remove this once connection to netezza is established
+            self.get_table_count()
+            self.validate_columns_per_column()
+            return
+
+        columns = list(zip(self.val_df['ATTNAME'], self.val_df['FORMAT_TYPE']))
+        templates = get_profile_templates(self.dialect) if Netezza.profile else METRIC_TEMPLATES
+        metric_columns = METRIC_COLUMNS + PROFILE_COLUMNS if Netezza.profile else METRIC_COLUMNS
+        results = []
+        for query, aliases in build_metric_queries(self.full_table_name, columns, self.where_clause,
+                                                   templates=templates):
+            tracer.label_next(self.curs, columns=get_query_columns(aliases))
+            results.append((self.run_query(query, get_params(self.where_clause)).iloc[0], aliases))
+
+        self.table_count, metrics = parse_metric_results(self.val_df['ATTNAME'].values, results, metric_columns)
+        for metric in metric_columns:
+            self.val_df[metric] = metrics[metric]
+
+    def get_bucket_metrics(self, grain, where_clause=None, templates=METRIC_TEMPLATES):
+        """
+        :description: Computes the record count and the column metrics per date bucket of date_col in one grouped scan.
+        :param grain: Size of the date buckets, one of query_builder.PARTITION_GRAINS. Eg: 'month'
+        :param where_clause: Where clause restricting the scanned rows, the where_clause attribute if None.
+        :param templates: Metrics to be computed, see query_builder.get_select_items().
+        :return: counts: pandas.Series of record counts indexed by bucket,
+                 metrics: pandas.Dataframe indexed by bucket with (ATTNAME, metric name) columns.
+        """
+
+        columns = list(zip(self.val_df['ATTNAME'], self.val_df['FORMAT_TYPE']))
+        where_clause = self.where_clause if where_clause is None else where_clause
+        group_by = get_bucket_expression(self.date_col, grain)
+        with self.session():
+            if self.curs is None:
+                raise RuntimeError("Partitioned validation needs a connection to Netezza, use --connect")
+            results = [(self.run_query(query, get_params(where_clause)), aliases) for query, aliases in
+                       build_metric_queries(self.full_table_name, columns, where_clause, group_by, templates)]
+        return parse_bucket_results(results)
+
+    def get_fingerprints(self, grain=None):
+        """
+        :description: Computes the record count and the content fingerprints (see fingerprint.py) in one scan.
+        :param grain: Size of the date buckets to fingerprint separately, the whole table if None.
+        :return: counts: pandas.Series of record counts indexed by bucket,
+                 fingerprints: pandas.Dataframe indexed by bucket with (ATTNAME, 'FINGERPRINT') columns.
+        """
+
+        columns = list(zip(self.val_df['ATTNAME'], self.val_df['FORMAT_TYPE']))
+        group_by = get_bucket_expression(self.date_col, grain) if grain else None
+        with self.session():
+            if self.curs is None:
+                raise RuntimeError("Fingerprint validation needs a connection to Netezza, use --connect")
+            results = [(self.run_query(query, get_params(self.where_clause)), aliases) for query, aliases in
+                       build_fingerprint_queries(self.full_table_name, columns, self.dialect, self.where_clause,
+                                                 group_by)]
+        return parse_bucket_results(results)
+
+    def iter_rows(self, columns, key, where_clause=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :description: Streams the rows of the table ordered by the key column, for the row diff (see row_diff.py).
+                      The connection is held until the stream is exhausted or closed.
+        :param columns: Names of the columns to be streamed, the key included.
+        :param key: Name of the unique key column.
+        :param where_clause: Where clause restricting the rows, self.where_clause if None.
+        :param chunk_size: Number of rows fetched at a time.
+        :return: Generator of pandas.Dataframes with upper case column names.
+        """
+
+        where_clause = self.where_clause if where_clause is None else where_clause
+        with self.session():
+            if self.curs is None:
+                raise RuntimeError("Row diff needs a connection to Netezza, use --connect")
+            yield from self.backend.iter_rows(self.curs, build_row_query(self.full_table_name, columns, key,
+                                                                         where_clause), chunk_size,
+                                              get_params(where_clause))
+
+    def get_sample_metrics(self, fraction, key=None):
+        """
+        :description: Computes the record count and the metrics of sampling.SAMPLE_TEMPLATES on the rows selected by
+                      the hash modulo predicate, which selects the same rows in Snowflake.
+        :param fraction: Fraction of the rows to be sampled.
+        :param key: Column whose value decides if a row is sampled, the whole row if None.
+        :return: counts: pandas.Series with the sampled record count,
+                 metrics: pandas.Dataframe with (ATTNAME, metric name) columns, see get_bucket_metrics().
+        """
+
+        columns = list(zip(self.val_df['ATTNAME'], self.val_df['FORMAT_TYPE']))
+        condition = build_sample_condition(columns, self.dialect, fraction, key)
+        where_clause = add_condition(self.where_clause, condition) if condition else self.where_clause
+        with self.session():
+            if self.curs is None:
+                raise RuntimeError("Sampled validation needs a connection to Netezza, use --connect")
+            results = [(self.run_query(query, get_params(where_clause)), aliases) for query, aliases in
+                       build_metric_queries(self.full_table_name, columns, where_clause, templates=SAMPLE_TEMPLATES)]
+        return parse_bucket_results(results)
+
+    def validate_columns_per_column(self):
+        """
+        :description: Updates the validation dataframe using pandas apply function with func_selector function.
+                      Issues one query per column, use validate_columns() unless the column checks are needed
+                      individually.
+        """
+
+        self.val_df['AVG'], \
+            self.val_df['MIN'], \
+            self.val_df['MAX'], \
+            self.val_df['SUM'], \
+            self.val_df['MIN_DATE'], \
+            self.val_df['MAX_DATE'], \
+            self.val_df['MAX_STR_LENGTH'] = zip(
+            *self.val_df['ATTNAME'].apply(self.func_selector))
+
+
+class Snowflake:
+    """
+    Class to represent table in Snowflake database
+
+    ...
+    Attributes
+    ----------
+    sf_validation_sp: str
+        Name of the generic validation SP in snowflake which creates a validation json containing the calculated metrics
+        from the Snowflake table
+
+    db_name: str
+        Name of the database in Snowflake for the table to be validated.
+
+    schema_name: str
+        Name of the schema in Snowflake for the table to be validated.
+
+    table_name: str
+        Name of the table for which validation has to be done.
+
+    full_table_name: str
+        Complete name of the table --> DB.SCHEMA.TABLENAME
+
+    use_validation_sp: bool
+        Computes the metrics with the generic validation SP instead of the metric queries when True.
+
+    profile: bool
+        Adds the profiling metrics of profiling.py to the metric queries when True. Not supported by the SP.
+
+    catalog: catalog.SchemaCatalog
+        Cached column metadata of whole schemas, replaces the per table INFORMATION_SCHEMA.COLUMNS query when set.
+
+    val_json: str
+        JSON data returned from the snowflake stored procedure for the particular table.
+
+    col_types: list
+        (COLUMN_NAME, DATA_TYPE) pairs of the table from INFORMATION_SCHEMA.COLUMNS.
+
+    metrics_df: pandas.Dataframe
+        Metrics fetched with the metric queries, indexed by ATTNAME with DATA_TYPE and the metric columns.
+        None when the validation json is used.
+
+    bucket_counts: pandas.Series
+        Record counts per date bucket of the last partitioned or fingerprint validation, None before.
+
+    elapsed: float
+        Seconds the table held a pooled connection of this side, the time the table costs this side.
+
+    table_count: str
+        Count of records in the Snowflake table retrieved from the validation json
+
+    backend: backends.Backend
+        Database operations of the Snowflake side, SnowflakeBackend or a local stand-in set with use_backend().
+
+    pool: connections.ConnectionPool
+        Connection pool shared by all the Snowflake objects of the process, created on first connect.
+        Role and warehouse are set once per pooled connection.
+
+    pool_size: int
+        Maximum number of Snowflake connections open at the same time.
+
+    poll_interval: float
+        Number of seconds between two status checks of an asynchronously submitted validation query.
+
+    query_id: str
+        Snowflake query id of the validation SP call submitted with submit_validation().
+
+    metric_query_ids: list
+        (Snowflake query id, aliases) pairs of the metric queries submitted with submit_validation().
+
+    metric_results: list
+        (result row, aliases) pairs of the metric queries, when the backend cannot submit queries asynchronously.
+
+
+    Methods
+    -------
+    use_backend(backend)
+        Replaces the backend of the Snowflake side and closes the connection pool of the previous one.
+
+    get_table_stats(db_name, schema_name)
+        Returns the row counts and bytes of all the tables of a schema from INFORMATION_SCHEMA.TABLES.
+
+    connect_snowflake()
+        Acquires a connection from the shared Snowflake connection pool.
+
+    close()
+        Releases the connection back to the pool.
+
+    get_validation_json()
+        Executes the generic snowflake SP and retreives the validation json.
+
+    get_column_types()
+        Queries INFORMATION_SCHEMA.COLUMNS to get the column names and data types of the table from Snowflake.
+
+    submit_validation()
+        Submits the metric queries (or the generic snowflake SP call) asynchronously, without waiting for the result.
+
+    wait_for_query(query_id)
+        Waits for an asynchronously submitted query to finish and makes its result the result set of the cursor.
+
+    fetch_validation_json()
+        Waits for the submitted SP call to finish and retreives the validation json.
+
+    fetch_validation_metrics()
+        Waits for the submitted metric queries to finish and fetches their results as Arrow.
+
+    complete()
+        Fetches the validation metrics and the record count of an object created with wait=False.
+
+    session()
+        Context manager holding a pooled connection for the queries run in the block.
+
+    set_where_clause()
+        Update the where_clause attribute based on the timestamp constraints as per the input.
+
+    run_query(query, params)
+        Executes a query on the Snowflake cursor and returns the result set as a dataframe.
+
+    explain(query, params)
+        Returns the Snowflake plan of a query and the estimated bytes it scans, without running it.
+
+    get_bucket_metrics(grain, columns, where_clause, templates)
+        Returns the record count and column metrics per date bucket of date_col, in a single grouped scan.
+
+    get_fingerprints(columns, grain)
+        Returns the record count and the content fingerprints of the table, or of each date bucket.
+
+    iter_rows(columns, key, where_clause, chunk_size)
+        Streams the rows of the table ordered by the key column in the Arrow batches of the connector.
+
+    count_rows()
+        Returns the record count of the table in the validated date range.
+
+    get_sample_metrics(columns, fraction, key)
+        Returns the record count and the sampling metrics of a deterministic sample of the rows.
+
+    get_table_count()
+        Retrieves record count from Snowflake validation json.
+    """
+
+    sf_validation_sp = 'COMMON.ADMIN.GENERIC_VALIDATION_SP'
+    use_validation_sp = False
+    profile = False
+    catalog = None
+    snowflake_date_col = DEFAULT_DATE_COL
+    dialect = 'snowflake'
+    snowflake_role = 'SNOWFLAKE_DW_ELT_NONPROD_PII'
+    snowflake_warehouse = 'ELT_WH_NONPROD'
+    backend = SnowflakeBackend(snowflake_role, snowflake_warehouse)
+    pool = None
+    pool_size = 4
+    poll_interval = 0.5
+    _pool_lock = threading.Lock()
+
+    def __init__(self, db_name, schema_name, table_name, date_col=snowflake_date_col, start_date=None, end_date=None,
+                 connect=False, wait=True, validate=True) -> None:
+        """
+        :description: Constructor to create Snowflake class objects.
+        :param db_name: Name of the database in Snowflake for the table to be validated.
+        :param schema_name: Name of the schema in Snowflake for the table to be validated.
+        :param table_name: Name of the table for which validation has to be done.
+        :param connect: Queries the Snowflake database when True, otherwise the sample data file is used.
+        :param wait: When False the validation SP is only submitted and the object keeps its connection,
+                     call complete() to wait for the results. Used to run the Netezza queries in the meantime.
+        :param validate: Calls the validation SP when True. Eg: False for partitioned validation with
+                         get_bucket_metrics().
+        """
+        self.db_name = db_name
+        self.schema_name = schema_name
+        self.table_name = table_name
+        self.full_table_name = self.backend.table_name(self.db_name, self.schema_name, self.table_name)
+        self.val_json = dict()
+        self.col_types = []
+        self.metrics_df = None
+        self.bucket_counts = None
+        self.date_col = date_col
+        self.start_date = start_date
+        self.end_date = end_date
+        self.table_count = None
+        self.where_clause = ''
+        self.connect = connect
+        self.conn = None
+        self.cur = None
+        self.elapsed = 0.0
+        self.query_id = None
+        self.metric_query_ids = []
+        self.metric_results = []
+        self.set_where_clause()
+        if not validate:
+            return
+        if connect:
+            self.connect_snowflake()
+        try:
+            self.submit_validation()
+        except Exception:
+            self.close()
+            raise
+        if wait:
+            self.complete()
+
+    @classmethod
+    def use_backend(cls, backend):
+        """
+        :description: Replaces the backend of the Snowflake side, eg: with backends.SQLiteBackend to run the
+                      validation on a local database. The connections of the previous backend are closed.
+        :param backend: backends.Backend
+        """
+        with cls._pool_lock:
+            if cls.pool is not None:
+                cls.pool.close_all()
+            cls.backend = backend
+            cls.pool = None
+
+    @classmethod
+    def get_pool(cls):
+        """
+        :description: Returns the Snowflake connection pool of the process, created on first use with pool_size.
+        """
+        with cls._pool_lock:
+            if cls.pool is None:
+                cls.pool = ConnectionPool(cls.backend.connect, cls.backend.setup, max_size=cls.pool_size)
+            return cls.pool
+
+    @classmethod
+    def get_table_stats(cls, db_name, schema_name):
+        """
+        :description: Returns the row counts and sizes of all the tables of a schema from the Snowflake catalog, in one
+                      query on a pooled connection. See backends.Backend.get_table_stats().
+        :return: pandas.Dataframe with TABLE_NAME, ROW_COUNT and BYTES columns.
+        """
+        with cls.get_pool().connection() as conn:
+            cur = conn.cursor()
+            try:
+                return cls.backend.get_table_stats(cur, db_name, schema_name)
+            finally:
+                cur.close()
+
+    def connect_snowflake(self):
+        """
+        :description: Acquires a connection from the shared Snowflake connection pool. Blocks while all the pooled
+                      connections are in use by other tables.
+        """
+        self.conn = self.get_pool().acquire()
+        self._acquired_at = time.perf_counter()
+        self.cur = tracer.wrap_cursor(self.conn.cursor(), side='SNOWFLAKE', backend=type(self.backend).__name__,
+                                      table=self.full_table_name)
+
+    def close(self):
+        """
+        :description: Closes the cursor and releases the connection back to the pool.
+        """
+        if self.conn is None:
+            return
+        self.elapsed += time.perf_counter() - self._acquired_at
+        try:
+            self.cur.close()
+            self.get_pool().release(self.conn)
+        except Exception:
+            self.get_pool().release(self.conn, discard=True)
+        self.conn = None
+        self.cur = None
+
+    @contextmanager
+    def session(self):
+        """
+        :description: Holds a pooled connection for the queries run in the block and releases it at the end.
+                      Does nothing without connect or if the object already holds a connection.
+        """
+        if not self.connect or self.conn is not None:
+            yield
+            return
+        self.connect_snowflake()
+        try:
+            yield
+        finally:
+            self.close()
+
+    def set_where_clause(self):
+        """
+        :description: Update the where_clause attribute based on the timestamp constraints as per the input.
+        """
+
+        self.where_clause = build_where_clause(self.date_col, self.start_date, self.end_date)
+
+    def run_query(self, query, params=()):
+        """
+        :description: Executes a query on the Snowflake cursor and returns the result set as a dataframe.
+                      The result set is fetched as Arrow with fetch_arrow_all, see arrow_fetch.py.
+        :param query: SQL query to be executed.
+        :param params: Values of the ? markers of the query, see query_builder.get_params().
+        :return: pandas.Dataframe with upper case column names.
+        """
+
+        return self.backend.run_query(self.cur, query, params)
+
+    def explain(self, query, params=()):
+        """
+        :description: Asks Snowflake for the plan of a query without running it, see backends.Backend.explain().
+        :return: dict with bytes, partitions, total_partitions and plan keys.
+        """
+
+        with self.session():
+            if self.cur is None:
+                raise RuntimeError("Query plans need a connection to Snowflake, use --connect")
+            return self.backend.explain(self.cur, query, params)
+
+    def get_bucket_metrics(self, grain, columns, where_clause=None, templates=METRIC_TEMPLATES):
+        """
+        :description: Computes the record count and the column metrics per date bucket of date_col in one grouped scan,
+                      with the same queries as Netezza.get_bucket_metrics().
+        :param grain: Size of the date buckets, one of query_builder.PARTITION_GRAINS. Eg: 'month'
+        :param columns: Iterable of (ATTNAME, FORMAT_TYPE) pairs, the Netezza column details of the migrated table.
+        :param where_clause: Where clause restricting the scanned rows, the where_clause attribute if None.
+        :param templates: Metrics to be computed, see query_builder.get_select_items().
+        :return: counts: pandas.Series of record counts indexed by bucket,
+                 metrics: pandas.Dataframe indexed by bucket with (ATTNAME, metric name) columns.
+        """
+
+        where_clause = self.where_clause if where_clause is None else where_clause
+        group_by = get_bucket_expression(self.date_col, grain)
+        with self.session():
+            if self.cur is None:
+                raise RuntimeError("Partitioned validation needs a connection to Snowflake, use --connect")
+            results = [(self.run_query(query, get_params(where_clause)), aliases) for query, aliases in
+                       build_metric_queries(self.full_table_name, columns, where_clause, group_by, templates)]
+        return parse_bucket_results(results)
+
+    def get_fingerprints(self, columns, grain=None):
+        """
+        :description: Computes the record count and the content fingerprints (see fingerprint.py) in one scan,
+                      with the Snowflake version of the Netezza.get_fingerprints() queries.
+        :param columns: Iterable of (ATTNAME, FORMAT_TYPE) pairs, the Netezza column details of the migrated table.
+        :param grain: Size of the date buckets to fingerprint separately, the whole table if None.
+        :return: counts: pandas.Series of record counts indexed by bucket,
+                 fingerprints: pandas.Dataframe indexed by bucket with (ATTNAME, 'FINGERPRINT') columns.
+        """
+
+        group_by = get_bucket_expression(self.date_col, grain) if grain else None
+        with self.session():
+            if self.cur is None:
+                raise RuntimeError("Fingerprint validation needs a connection to Snowflake, use --connect")
+            results = [(self.run_query(query, get_params(self.where_clause)), aliases) for query, aliases in
+                       build_fingerprint_queries(self.full_table_name, columns, self.dialect, self.where_clause,
+                                                 group_by)]
+        return parse_bucket_results(results)
+
+    def iter_rows(self, columns, key, where_clause=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :description: Streams the rows of the table ordered by the key column with fetch_pandas_batches, for the row
+                      diff (see row_diff.py). The connection is held until the stream is exhausted or closed.
+        :param columns: Names of the columns to be streamed, the key included.
+        :param key: Name of the unique key column.
+        :param where_clause: Where clause restricting the rows, self.where_clause if None.
+        :param chunk_size: Number of rows fetched at a time by cursors without batch fetching.
+        :return: Generator of pandas.Dataframes with upper case column names.
+        """
+
+        where_clause = self.where_clause if where_clause is None else where_clause
+        with self.session():
+            if self.cur is None:
+                raise RuntimeError("Row diff needs a connection to Snowflake, use --connect")
+            yield from self.backend.iter_rows(self.cur, build_row_query(self.full_table_name, columns, key,
+                                                                        where_clause), chunk_size,
+                                              get_params(where_clause))
+
+    def count_rows(self):
+        """
+        :description: Returns the record count of the table in the validated date range. Without a date range
+                      Snowflake answers it from the table metadata.
+        """
+
+        with self.session():
+            if self.cur is None:
+                raise RuntimeError("Sampled validation needs a connection to Snowflake, use --connect")
+            return self.backend.count(self.cur, self.full_table_name, self.where_clause)
+
+    def get_sample_metrics(self, columns, fraction, key=None):
+        """
+        :description: Computes the record count and the metrics of sampling.SAMPLE_TEMPLATES on the same rows as
+                      Netezza.get_sample_metrics().
+        :param columns: Iterable of (ATTNAME, FORMAT_TYPE) pairs, the Netezza column details of the migrated table.
+        :param fraction: Fraction of the rows to be sampled.
+        :param key: Column whose value decides if a row is sampled, the whole row if None.
+        :return: counts: pandas.Series with the sampled record count,
+                 metrics: pandas.Dataframe with (ATTNAME, metric name) columns, see get_bucket_metrics().
+        """
+
+        condition = build_sample_condition(columns, self.dialect, fraction, key)
+        where_clause = add_condition(self.where_clause, condition) if condition else self.where_clause
+        with self.session():
+            if self.cur is None:
+                raise RuntimeError("Sampled validation needs a connection to Snowflake, use --connect")
+            results = [(self.run_query(query, get_params(where_clause)), aliases) for query, aliases in
+                       build_metric_queries(self.full_table_name, columns, where_clause, templates=SAMPLE_TEMPLATES)]
+        return parse_bucket_results(results)
+
+    def get_validation_json(self):
+        """
+        :description: Executes the generic snowflake SP and retreives the validation json.
+        """
+        self.submit_validation()
+        self.fetch_validation_json()
+
+        # {col1 :{datatype: number, avg: 1, min : 2, max : 3}, clm_nm2 :varchar , lenth : ...}
+
+    def get_column_types(self):
+        """
+        :description: Queries INFORMATION_SCHEMA.COLUMNS to get the column names and data types of the table, or
+                      reads them from the schema catalog when set.
+        """
+
+        if Snowflake.catalog is not None:
+            df = Snowflake.catalog.get_columns('SNOWFLAKE', self.backend, self.cur, self.db_name, self.schema_name,
+                                               self.table_name)
+        else:
+            df = self.backend.get_columns(self.cur, self.db_name, self.schema_name, self.table_name)
+        self.col_types = list(zip(df['ATTNAME'], df['FORMAT_TYPE']))
+
+    def submit_validation(self):
+        """
+        :description: Submits the fused metric queries from query_builder, built from the Snowflake column types, with
+                      execute_async and keeps their query ids. With use_validation_sp the generic snowflake SP call is
+                      submitted instead. The queries run in the warehouse while the caller does other work,
+                      eg: the Netezza queries. Backends without execute_async run the metric queries right away.
+        """
+        if self.cur is None:
+            return
+        if Snowflake.use_validation_sp:
+            query = f"""call {Snowflake.sf_validation_sp}('{self.db_name}', '{self.schema_name}', '{self.table_name}')"""
+            self.cur.execute_async(query)
+            self.query_id = self.cur.sfqid
+            return
+
+        with tracer.phase('get_column_types', side='SNOWFLAKE', table=self.full_table_name):
+            self.get_column_types()
+        templates = get_profile_templates(self.dialect) if Snowflake.profile else METRIC_TEMPLATES
+        for query, aliases in build_metric_queries(self.full_table_name, self.col_types, self.where_clause,
+                                                   templates=templates):
+            tracer.label_next(self.cur, columns=get_query_columns(aliases))
+            params = get_params(self.where_clause)
+            if not self.backend.supports_async:
+                self.metric_results.append((self.run_query(query, params).iloc[0], aliases))
+                continue
+            self.cur.execute_async(query, params or None)
+            self.metric_query_ids.append((self.cur.sfqid, aliases))
+
+    def wait_for_query(self, query_id):
+        """
+        :description: Polls the status of an asynchronously submitted query until it finishes and makes its result the
+                      result set of the cursor. Raises the Snowflake error if the query failed.
+        :param query_id: Snowflake query id.
+        """
+        while self.conn.is_still_running(self.conn.get_query_status_throw_if_error(query_id)):
+            time.sleep(Snowflake.poll_interval)
+        self.cur.get_results_from_sfqid(query_id)
+
+    def fetch_validation_json(self):
+        """
+        :description: Waits for the submitted SP call to finish and retreives the validation json.
+        """
+        if self.query_id is not None:
+            self.wait_for_query(self.query_id)
+            self.val_json = json.loads(self.cur.fetchone()[0])
+            return
+        if self.cur is not None:
+            # a connected object never falls back to the sample file
+            raise RuntimeError(f"No validation was submitted to Snowflake for {self.full_table_name}")
+
+        # remove this once connection to snowflake is established
+        with open("src/sf_val_json_sample.json") as f:
+            self.val_json = json.load(f)
+
+    def fetch_validation_metrics(self):
+        """
+        :description: Waits for the submitted metric queries to finish and fetches their single row results as Arrow,
+                      straight into metrics_df without a JSON payload. Updates the record count.
+        """
+        results = list(self.metric_results)
+        for query_id, aliases in self.metric_query_ids:
+            self.wait_for_query(query_id)
+            results.append((arrow_to_frame(cursor_to_arrow(self.cur)).iloc[0], aliases))
+
+        attnames = [col for col, _ in self.col_types]
+        metric_columns = METRIC_COLUMNS + PROFILE_COLUMNS if Snowflake.profile else METRIC_COLUMNS
+        self.table_count, metrics = parse_metric_results(attnames, results, metric_columns)
+        self.metrics_df = pd.DataFrame(metrics, index=pd.Index(attnames, name='ATTNAME'), columns=metric_columns)
+        self.metrics_df.insert(0, 'DATA_TYPE', [data_type for _, data_type in self.col_types])
+
+    def complete(self):
+        """
+        :description: Fetches the validation metrics and the record count, then releases the connection.
+                      Called by the constructor, or by the caller for objects created with wait=False.
+        """
+        try:
+            with tracer.phase('fetch_validation', side='SNOWFLAKE', table=self.full_table_name):
+                if self.metric_query_ids or self.metric_results:
+                    self.fetch_validation_metrics()
+                else:
+                    self.fetch_validation_json()
+                    self.get_table_count()
+        finally:
+            self.close()
+
+    def get_table_count(self):
+        """
+        :description: Retrieves record count from Snowflake validation json.
+        """
+        self.table_count = self.val_json.pop('TOTAL_RECORD_COUNT')
+
+
+def load_tables(netezza_table_name, snowflake_table_name, parallel_sides=False, netezza_slots=None,
+                snowflake_slots=None, **kwargs):
+    """
+    :description: Creates the Netezza and Snowflake objects of a table pair, which queries both the databases.
+                  With parallel_sides the Snowflake validation queries are submitted asynchronously first and the
+                  Netezza queries run in a worker thread while they execute, so the wait is the slower of the two
+                  instead of the sum.
+    :param netezza_table_name: Full name of the table in Netezza. Format: DB.SCHEMA.TABLE
+    :param snowflake_table_name: Full name of the table in Snowflake. Format: DB.SCHEMA.TABLE
+    :param parallel_sides: Queries both the databases at the same time when True.
+    :param netezza_slots: Optional semaphore held while Netezza is queried.
+    :param snowflake_slots: Optional semaphore held while Snowflake is queried.
+    :param kwargs: date_col, start_date, end_date, connect and validate, passed to both the constructors.
+    :return: netezza: Netezza, snowflake: Snowflake
+    """
+
+    net_db, net_schema, net_table = netezza_table_name.split('.')
+    sf_db, sf_schema, sf_table = snowflake_table_name.split('.')
+    netezza_slots = netezza_slots or nullcontext()
+    snowflake_slots = snowflake_slots or nullcontext()
+
+    if not parallel_sides:
+        with netezza_slots:
+            netezza = Netezza(net_db, net_schema, net_table, **kwargs)
+        with snowflake_slots:
+            snowflake = Snowflake(sf_db, sf_schema, sf_table, **kwargs)
+        return netezza, snowflake
+
+    def load_netezza():
+        with netezza_slots:
+            return Netezza(net_db, net_schema, net_table, **kwargs)
+
+    with snowflake_slots:
+        snowflake = Snowflake(sf_db, sf_schema, sf_table, wait=False, **kwargs)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(load_netezza)
+            try:
+                snowflake.complete()
+            finally:
+                netezza = future.result()
+    return netezza, snowflake
+
+
+def partition_validation(netezza: Netezza, snowflake: Snowflake, grain='month', rel_tol=DEFAULT_REL_TOL,
+                         abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Validates the record count and the column metrics per date bucket of the date column.
+                  Each side is scanned once with a grouped query, both sides are queried at the same time.
+                  If any bucket mismatches, will raise DataValidationError Exception with the report keyed by bucket,
+                  so only the failing buckets have to be checked again.
+    :param netezza: Object of class Netezza, can be created with validate=False.
+    :param snowflake: Object of class Snowflake, can be created with validate=False.
+    :param grain: Size of the date buckets, one of query_builder.PARTITION_GRAINS.
+    :param rel_tol: Relative tolerance for AVG and floating point metrics.
+    :param abs_tol: Absolute tolerance for AVG and floating point metrics.
+    """
+
+    columns = list(zip(netezza.val_df['ATTNAME'], netezza.val_df['FORMAT_TYPE']))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        sf_future = executor.submit(snowflake.get_bucket_metrics, grain, columns)
+        nz_counts, nz_metrics = netezza.get_bucket_metrics(grain)
+        sf_counts, sf_metrics = sf_future.result()
+    netezza.bucket_counts, snowflake.bucket_counts = nz_counts, sf_counts
+
+    float_columns = [col for col, format_type in columns if format_type.split('(')[0].upper() in FLOAT_DATA_TYPES]
+    with tracer.phase('compare', table=snowflake.full_table_name):
+        report = compare_bucket_metrics(nz_counts, nz_metrics, sf_counts, sf_metrics, float_columns, rel_tol, abs_tol)
+    if report:
+        raise DataValidationError(report)
+
+
+def fingerprint_validation(netezza: Netezza, snowflake: Snowflake, grain=None):
+    """
+    :description: Validates the content of the table with order independent hash aggregates computed in one scan on
+                  each side, see fingerprint.py. Both sides are queried at the same time.
+                  If any fingerprint or count mismatches, will raise DataValidationError Exception with the mismatching
+                  columns (ROW_FINGERPRINT for values moved between rows), keyed by bucket when grain is given.
+    :param netezza: Object of class Netezza, can be created with validate=False.
+    :param snowflake: Object of class Snowflake, can be created with validate=False.
+    :param grain: Size of the date buckets to fingerprint separately, the whole table if None.
+    """
+
+    columns = list(zip(netezza.val_df['ATTNAME'], netezza.val_df['FORMAT_TYPE']))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        sf_future = executor.submit(snowflake.get_fingerprints, columns, grain)
+        nz_counts, nz_fingerprints = netezza.get_fingerprints(grain)
+        sf_counts, sf_fingerprints = sf_future.result()
+    netezza.bucket_counts, snowflake.bucket_counts = nz_counts, sf_counts
+
+    with tracer.phase('compare', table=snowflake.full_table_name):
+        report = compare_bucket_metrics(nz_counts, nz_fingerprints, sf_counts, sf_fingerprints)
+    if not grain:
+        report = report.get(ALL_BUCKET, dict())
+    if report:
+        raise DataValidationError(report)
+
+
+def sample_validation(netezza: Netezza, snowflake: Snowflake, fraction=None, key=None, target_rows=DEFAULT_TARGET_ROWS,
+                      z=DEFAULT_CONFIDENCE_Z, rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Approximate validation on the same deterministic sample of rows on both sides, see sampling.py.
+                  The sample count and the MIN/MAX/length/date metrics of the sample are compared exactly. When the
+                  sample counts match, both sides sampled the same rows and the SUM and value count of the sample are
+                  compared exactly too, otherwise the AVG and SUM estimates of the whole table within their
+                  confidence bounds.
+                  If any of them mismatches, will raise DataValidationError Exception with the report.
+    :param netezza: Object of class Netezza, can be created with validate=False.
+    :param snowflake: Object of class Snowflake, can be created with validate=False.
+    :param fraction: Fraction of the rows to be sampled, tuned from the Snowflake record count if None.
+    :param key: Column whose value decides if a row is sampled, the whole row if None.
+    :param target_rows: Number of rows to be sampled when the fraction is tuned.
+    :param z: Normal quantile of the confidence bounds, 1.96 for 95%.
+    :param rel_tol: Relative tolerance for floating point metrics.
+    :param abs_tol: Absolute tolerance for floating point metrics.
+    :return: The sampling fraction used.
+    """
+
+    columns = list(zip(netezza.val_df['ATTNAME'], netezza.val_df['FORMAT_TYPE']))
+    if fraction is None:
+        fraction = get_sample_fraction(snowflake.count_rows(), target_rows)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        sf_future = executor.submit(snowflake.get_sample_metrics, columns, fraction, key)
+        nz_counts, nz_metrics = netezza.get_sample_metrics(fraction, key)
+        sf_counts, sf_metrics = sf_future.result()
+
+    with tracer.phase('compare', table=snowflake.full_table_name):
+        # both sides select the rows with the same predicate, samples with the same count are the same rows
+        same_sample = int(nz_counts.iloc[0]) == int(sf_counts.iloc[0])
+        exact_metrics = EXACT_METRICS + SAME_SAMPLE_METRICS if same_sample else EXACT_METRICS
+        exact = [(col, metric) for col, metric in nz_metrics.columns if metric in exact_metrics]
+        report = compare_bucket_metrics(nz_counts, nz_metrics.reindex(columns=exact), sf_counts,
+                                        sf_metrics.reindex(columns=exact), get_float_columns(columns), rel_tol, abs_tol)
+        report = report.get(ALL_BUCKET, dict())
+
+        if not same_sample:
+            _, nz_estimates = estimate_totals(nz_counts.iloc[0], to_column_metrics(nz_metrics), fraction, z)
+            _, sf_estimates = estimate_totals(sf_counts.iloc[0],
+                                              to_column_metrics(sf_metrics).reindex(nz_estimates.index), fraction, z)
+            for col, metrics in compare_estimates(nz_estimates, sf_estimates, rel_tol, abs_tol).items():
+                report.setdefault(col, dict()).update(metrics)
+    if report:
+        report['SAMPLE'] = {'FRACTION': fraction, 'KEY': key}
+        raise DataValidationError(report)
+    return fraction
+
+
+def row_diff_validation(netezza: Netezza, snowflake: Snowflake, key, bucket=None, grain=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, max_rows=DEFAULT_MAX_ROWS, rel_tol=DEFAULT_REL_TOL,
+                        abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Drill down after a failed validation. Streams the rows of both tables ordered by the key column and
+                  merge joins them chunk by chunk, so the memory used does not grow with the table (see row_diff.py).
+                  If any row is missing, extra or changed, will raise DataValidationError Exception with the row
+                  counts and the first max_rows differing rows.
+    :param netezza: Object of class Netezza, can be created with validate=False.
+    :param snowflake: Object of class Snowflake, can be created with validate=False.
+    :param key: Name of a unique, numeric or ASCII key column.
+    :param bucket: Start of the failing date bucket as 'YYYY-MM-DD' (or 'NULL'), the whole date range if None.
+    :param grain: Size of the bucket, one of PARTITION_GRAINS.
+    :param chunk_size: Number of rows fetched at a time from Netezza.
+    :param max_rows: Number of differing rows listed in the report.
+    """
+
+    key = key.upper()
+    columns = list(zip(netezza.val_df['ATTNAME'].str.upper(), netezza.val_df['FORMAT_TYPE']))
+    if key not in dict(columns):
+        raise ValueError(f"Key column {key} not found in {netezza.full_table_name}")
+    nz_where_clause = netezza.where_clause
+    sf_where_clause = snowflake.where_clause
+    if bucket:
+        nz_where_clause = build_bucket_clause(netezza.date_col, bucket, grain or 'day', nz_where_clause)
+        sf_where_clause = build_bucket_clause(snowflake.date_col, bucket, grain or 'day', sf_where_clause)
+
+    names = [col for col, _ in columns]
+    nz_chunks = netezza.iter_rows(names, key, nz_where_clause, chunk_size)
+    sf_chunks = snowflake.iter_rows(names, key, sf_where_clause, chunk_size)
+    try:
+        with tracer.phase('row_diff', table=snowflake.full_table_name):
+            report = diff_row_streams(nz_chunks, sf_chunks, key, columns, max_rows, rel_tol, abs_tol)
+    finally:
+        nz_chunks.close()
+        sf_chunks.close()
+    if report['ROWS']:
+        raise DataValidationError(report)
+
+
+def incremental_validation(netezza: Netezza, snowflake: Snowflake, store: ResultStore, grain='day',
+                           rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Validates the table totals kept in the local result store. Each side only scans the rows of its
+                  where clause from its watermark (the last stored bucket) on and the rows without a date, the
+                  scanned buckets replace the stored ones and the totals are merged from all the buckets. AVG is
+                  derived from the merged SUM and value count.
+                  Raises CountValidationError or DataValidationError Exception like count_validation() and
+                  data_validation() if the merged totals mismatch.
+    :param netezza: Object of class Netezza, can be created with validate=False.
+    :param snowflake: Object of class Snowflake, can be created with validate=False.
+    :param store: ResultStore keeping the per bucket aggregates between runs.
+    :param grain: Size of the date buckets, one of query_builder.PARTITION_GRAINS.
+    :param rel_tol: Relative tolerance for AVG and floating point metrics.
+    :param abs_tol: Absolute tolerance for AVG and floating point metrics.
+    """
+
+    columns = list(zip(netezza.val_df['ATTNAME'], netezza.val_df['FORMAT_TYPE']))
+
+    def refresh(side, table, get_bucket_metrics):
+        watermark = store.get_watermark(table.full_table_name, side, grain)
+        counts, metrics = get_bucket_metrics(where_clause=build_watermark_clause(table.date_col, watermark,
+                                                                                table.where_clause))
+        counts.index = metrics.index = normalize_buckets(counts.index)
+        store.save_buckets(table.full_table_name, side, grain, counts, metrics, watermark)
+        return store.load_totals(table.full_table_name, side, grain)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        sf_future = executor.submit(refresh, 'SNOWFLAKE', snowflake,
+                                    partial(snowflake.get_bucket_metrics, grain, columns, templates=MERGEABLE_TEMPLATES))
+        netezza.table_count, nz_totals = refresh(
+            'NETEZZA', netezza, partial(netezza.get_bucket_metrics, grain, templates=MERGEABLE_TEMPLATES))
+        snowflake.table_count, sf_totals = sf_future.result()
+
+    netezza.val_df = netezza.val_df[['ATTNAME', 'FORMAT_TYPE']].join(nz_totals, on='ATTNAME')
+    sf_totals.insert(0, 'DATA_TYPE', netezza.val_df.set_index('ATTNAME')['FORMAT_TYPE'])
+    snowflake.val_json = {col: {param: value for param, value in params.items() if not pd.isna(value)}
+                          for col, params in sf_totals.to_dict(orient='index').items()}
+
+    count_validation(netezza, snowflake)
+    data_validation(netezza, snowflake, rel_tol, abs_tol)
+
+
+def count_validation(netezza: Netezza, snowflake: Snowflake):
+    """
+    :description: Validates the count of records in netezza and snowflake.
+                  Raises CountValidationError exception if counts mismatched.
+    :param netezza: Object of class Netezza.
+    :param snowflake: Object of class Snowflake.
+    """
+
+    if netezza.table_count != snowflake.table_count:
+        raise CountValidationError(snowflake.table_count, netezza.table_count)
+
+
+def data_validation(netezza: Netezza, snowflake: Snowflake, rel_tol=DEFAULT_REL_TOL, abs_tol=DEFAULT_ABS_TOL):
+    """
+    :description: Validates the data received from snowflake, from the metric queries or the generic stored procedure,
+                  with the data from Netezza which is queried in the functions in Netezza class.
+                  The comparison is done column-wise for all the columns at once, see comparison.py.
+                  If there are any validation errors, will raise DataValidationError Exception.
+    :param netezza: Object of class Netezza.
+    :param snowflake: Object of class Snowflake.
+    :param rel_tol: Relative tolerance for numeric metrics that are not exact (AVG and floating point columns).
+    :param abs_tol: Absolute tolerance for numeric metrics that are not exact (AVG and floating point columns).
+    """
+
+    with tracer.phase('compare', table=snowflake.full_table_name):
+        if snowflake.metrics_df is not None:
+            report = compare_validation_frames(netezza.val_df, snowflake.metrics_df, rel_tol, abs_tol)
+            for col, metrics in compare_profiles(netezza.val_df, snowflake.metrics_df, rel_tol, abs_tol).items():
+                report.setdefault(col, dict()).update(metrics)
+        else:
+            report = compare_validation_data(netezza.val_df, snowflake.val_json, rel_tol, abs_tol)
+    if report:
+        raise DataValidationError(report)
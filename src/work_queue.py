@@ -0,0 +1,615 @@
+############################################ Sharded Work Queue ########################################################
+# Description : Spreads a batch run over several processes or hosts. The coordinator splits the manifest into units of
+#               work, one per table or, with --partition_by and a start and end date, one per (table, date bucket),
+#               and puts them on a queue in a SQLite file. Workers claim one unit at a time, validate it with
+#               batch.validate_table() and write the result back to the queue. Any number of worker processes can
+#               pull from the same queue, on other hosts through a shared file system, so the pandas comparison and
+#               the result conversion scale with the workers until the warehouses are the limit. A claimed unit is
+#               leased: the worker renews the lease while it runs, and a unit whose lease expired (the worker died)
+#               is claimed again by another worker, and a unit ending with an ERROR (eg: a dropped connection) is
+#               queued again up to --retries times. Re-running the coordinator with the same queue, manifest and
+#               options resumes the run, the finished units are not validated again. The record counts, metrics and
+#               report of every unit are recorded with its result, and written to the result sink of the
+#               coordinator once the run is done.
+# Usage: python main.py --manifest tables.csv --queue queue.db --processes 4 [--partition_by month]
+#        python src/work_queue.py --queue /shared/queue.db [--run_id RUN_ID] [--threads 2] [--local_db LOCAL_DB]
+
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+import pandas as pd
+
+from backends import SQLiteBackend
+from batch import (COUNT_MISMATCH, DATA_MISMATCH, DEFAULT_NETEZZA_CONCURRENCY, DEFAULT_SNOWFLAKE_CONCURRENCY, ERROR,
+                   PASSED, validate_table)
+from catalog import SchemaCatalog
+from comparison import DEFAULT_ABS_TOL, DEFAULT_REL_TOL
+from defaults import DEFAULT_TARGET_ROWS
+from validation import Netezza, Snowflake
+from query_builder import GRAIN_OFFSETS
+from result_store import ResultStore
+from result_sink import to_count
+
+
+DEFAULT_QUEUE_PATH = 'work_queue.db'
+# seconds a claimed unit stays leased to its worker without a renewal
+DEFAULT_LEASE = 300.0
+DEFAULT_POLL_INTERVAL = 2.0
+
+PENDING = 'PENDING'
+CLAIMED = 'CLAIMED'
+DONE = 'DONE'
+
+# status of a table from the statuses of its units, the first one found wins
+STATUS_PRECEDENCE = (ERROR, COUNT_MISMATCH, DATA_MISMATCH, PASSED)
+
+# pandas period of the DATE_TRUNC of each grain, weeks start on Monday
+GRAIN_PERIODS = {'day': 'D', 'week': 'W-SUN', 'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+
+def get_bucket_starts(start_date, end_date, grain):
+    """
+    :description: Starts of the date buckets of a grain covering a date range, the first one truncated like
+                  DATE_TRUNC in the databases.
+    :param start_date: Start date/timestamp of the range.
+    :param end_date: End date/timestamp of the range.
+    :param grain: One of query_builder.PARTITION_GRAINS.
+    :return: List of 'YYYY-MM-DD' strings.
+    """
+
+    bucket = pd.Timestamp(start_date).to_period(GRAIN_PERIODS[grain]).start_time
+    end = pd.Timestamp(end_date)
+    buckets = []
+    while bucket < end:
+        buckets.append(f"{bucket:%Y-%m-%d}")
+        bucket += GRAIN_OFFSETS[grain]
+    return buckets
+
+
+def split_units(manifest, partition_by=None, store_path=None):
+    """
+    :description: Splits the manifest into units of work. A table with a start and an end date is split into one unit
+                  per date bucket of partition_by, the other tables are one unit each. Sampled and incremental
+                  validations are never split, the sample and the result store cover the whole table.
+    :param manifest: List of manifest entries, see batch.load_manifest().
+    :param partition_by: One of query_builder.PARTITION_GRAINS, the tables are not split if None.
+    :param store_path: ResultStore of incremental validation, the tables are not split if given.
+    :return: List of (manifest index, entry, bucket) tuples, bucket None for a whole table.
+    """
+
+    units = []
+    for index, entry in enumerate(manifest):
+        if partition_by and not store_path and not entry.get('sample_fraction') \
+                and entry.get('start_date') and entry.get('end_date'):
+            units.extend((index, entry, bucket)
+                         for bucket in get_bucket_starts(entry['start_date'], entry['end_date'], partition_by))
+        else:
+            units.append((index, entry, None))
+    return units
+
+
+def get_run_id(manifest, options):
+    """
+    :description: Identifies a run by its manifest and options, so that a restarted coordinator resumes its run.
+    """
+
+    text = json.dumps({'manifest': manifest, 'options': options}, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def split_cap(cap, processes):
+    """
+    :description: Splits a concurrency cap over the local worker processes, so that together they never query a
+                  database with more than cap units at the same time. Eg: split_cap(4, 3) --> [2, 1, 1]
+    :param cap: Maximum number of units queried at the same time by all the processes.
+    :param processes: Number of local worker processes.
+    :return: List of the cap of each process.
+    """
+
+    if processes > cap:
+        raise ValueError(f"{processes} worker processes cannot share a concurrency cap of {cap}")
+    return [cap // processes + (process < cap % processes) for process in range(processes)]
+
+
+def merge_unit_results(manifest, units, results):
+    """
+    :description: Merges the results of the units of each table into one result per table: the worst status, the
+                  messages prefixed with their bucket and the total elapsed seconds.
+    :param manifest: List of manifest entries.
+    :param units: List of (manifest index, entry, bucket) tuples, see split_units().
+    :param results: Result dicts of the units, in the order of units.
+    :return: List of result dicts in the order of the manifest.
+    """
+
+    merged = [{'snowflake_table_name': entry['snowflake_table_name'], 'netezza_table_name': entry['netezza_table_name'],
+               'status': PASSED, 'message': '', 'elapsed': 0.0} for entry in manifest]
+    messages = [[] for _ in manifest]
+    for (index, _, bucket), result in zip(units, results):
+        table = merged[index]
+        table['status'] = min(table['status'], result['status'], key=STATUS_PRECEDENCE.index)
+        table['elapsed'] = round(table['elapsed'] + (result['elapsed'] or 0.0), 3)
+        if result['message']:
+            messages[index].append(f"[{bucket}] {result['message']}" if bucket else result['message'])
+    for table, table_messages in zip(merged, messages):
+        table['message'] = '\n'.join(table_messages)
+    return merged
+
+
+def merge_unit_details(manifest, units, details):
+    """
+    :description: Merges the record counts, metrics and reports of the units of each table, for the result sink:
+                  the counts are summed and the metrics and the reports of the date buckets put together.
+    :param manifest: List of manifest entries.
+    :param units: List of (manifest index, entry, bucket) tuples, see split_units().
+    :param details: Details dicts of the units, see UnitDetails, in the order of units.
+    :return: List of (counts, metric_rows, report) tuples in the order of the manifest, see result_sink.ResultSink.write().
+    """
+
+    counts = [[None, None] for _ in manifest]
+    metrics = [[] for _ in manifest]
+    reports = [dict() for _ in manifest]
+    for (index, _, _), unit_details in zip(units, details):
+        if unit_details is None:
+            continue
+        for side, count in enumerate(unit_details['counts']):
+            if count is not None:
+                counts[index][side] = (counts[index][side] or 0) + count
+        metrics[index].extend(unit_details['metrics'] or ())
+        reports[index].update(unit_details['report'] or dict())
+    return [(tuple(table_counts), pd.DataFrame(table_metrics) if table_metrics else None, report or None)
+            for table_counts, table_metrics, report in zip(counts, metrics, reports)]
+
+
+class UnitDetails:
+    """
+    Class to represent the result sink of one unit in a worker, see batch.validate_table(). Keeps the record counts,
+    metrics and report of the unit, recorded with its result on the queue.
+
+    ...
+
+    Attributes
+    ----------
+    details: dict
+        counts, metrics (list of metric row dicts, see result_sink.get_metric_rows()) and report of the unit, None
+        until it is written.
+
+
+    Methods
+    -------
+    write(result, counts, metric_rows, report)
+        Keeps the details of the unit.
+    """
+
+    def __init__(self):
+        """
+        :description: Constructor to create UnitDetails objects.
+        """
+        self.details = None
+
+    def write(self, result, counts=(None, None), metric_rows=None, report=None):
+        """
+        :description: Keeps the details of the unit as JSON serializable values, see result_sink.ResultSink.write().
+        """
+        self.details = {'counts': [to_count(count) for count in counts],
+                        'metrics': None if metric_rows is None else metric_rows.astype(object).to_dict('records'),
+                        'report': report}
+
+
+class WorkQueue:
+    """
+    Class to represent the queue of the units of work of sharded runs, in a SQLite file shared by the coordinator and
+    the workers. Safe to use from several threads, processes and hosts, every change is a short transaction.
+
+    ...
+
+    Attributes
+    ----------
+    path: str
+        Path of the SQLite database file.
+
+
+    Methods
+    -------
+    add_run(run_id, options, units)
+        Puts the units of a run on the queue, unless the run is already queued.
+
+    get_run(run_id)
+        Returns the options of a run.
+
+    get_latest_run()
+        Returns the id of the last queued run which is not finished.
+
+    claim(run_id, worker, lease)
+        Leases the next pending unit, or a unit whose lease expired, to a worker.
+
+    renew(unit_id, worker, lease)
+        Extends the lease of a claimed unit.
+
+    complete(unit_id, worker, result, details, retries)
+        Records the result of a unit and its details, or queues it again after an ERROR.
+
+    get_progress(run_id)
+        Returns the number of units per status.
+
+    load_results(run_id)
+        Returns the results of the units in the order they were queued.
+
+    load_details(run_id)
+        Returns the details of the units in the order they were queued.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        """
+        :description: Constructor to create WorkQueue objects. Creates the SQLite tables if they do not exist.
+        :param path: Path of the SQLite database file.
+        """
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("""create table if not exists runs (
+                run_id text primary key,
+                options text not null,
+                created_at text not null default current_timestamp)""")
+            conn.execute("""create table if not exists units (
+                unit_id integer primary key,
+                run_id text not null,
+                entry text not null,
+                bucket text,
+                status text not null,
+                worker text,
+                attempts integer not null default 0,
+                lease_until real,
+                result text)""")
+            if 'details' not in {row[1] for row in conn.execute("pragma table_info(units)")}:
+                conn.execute("alter table units add column details text")
+            conn.execute("create index if not exists units_status on units (run_id, status)")
+
+    @contextmanager
+    def _connect(self):
+        """
+        :description: Opens a connection to the queue, runs the block in an immediate transaction, so that two
+                      workers never claim the same unit, commits it and closes the connection.
+        """
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("begin immediate")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("rollback")
+                raise
+            conn.execute("commit")
+        finally:
+            conn.close()
+
+    def add_run(self, run_id, options, units):
+        """
+        :description: Puts the units of a run on the queue. Nothing is added if the run is already queued, eg: when a
+                      coordinator is restarted.
+        :param run_id: Id of the run, see get_run_id().
+        :param options: Validation options of the run, passed to batch.validate_table() by the workers.
+        :param units: List of (manifest index, entry, bucket) tuples, see split_units().
+        :return: True if the run was added.
+        """
+        with self._connect() as conn:
+            if conn.execute("select 1 from runs where run_id = ?", (run_id,)).fetchone():
+                return False
+            conn.execute("insert into runs (run_id, options) values (?, ?)", (run_id, json.dumps(options)))
+            conn.executemany("insert into units (run_id, entry, bucket, status) values (?, ?, ?, ?)",
+                             [(run_id, json.dumps(entry), bucket, PENDING) for _, entry, bucket in units])
+        return True
+
+    def get_run(self, run_id):
+        """
+        :description: Returns the validation options of a run.
+        """
+        with self._connect() as conn:
+            row = conn.execute("select options from runs where run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Run {run_id} not found in {self.path}")
+        return json.loads(row[0])
+
+    def get_latest_run(self):
+        """
+        :description: Returns the id of the last queued run which still has units to be validated, None if all the
+                      runs are finished.
+        """
+        with self._connect() as conn:
+            row = conn.execute("""select run_id from units where status <> ?
+                order by unit_id desc limit 1""", (DONE,)).fetchone()
+        return row[0] if row else None
+
+    def claim(self, run_id, worker, lease=DEFAULT_LEASE):
+        """
+        :description: Leases the first pending unit of a run, or the first claimed unit whose lease expired, to a
+                      worker.
+        :param run_id: Id of the run.
+        :param worker: Name of the worker. Eg: host:pid:thread
+        :param lease: Seconds the unit stays leased without a renewal.
+        :return: (unit_id, entry, bucket), None if no unit can be claimed now.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("""select unit_id, entry, bucket from units
+                where run_id = ? and (status = ? or (status = ? and lease_until < ?))
+                order by unit_id limit 1""", (run_id, PENDING, CLAIMED, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("""update units set status = ?, worker = ?, attempts = attempts + 1, lease_until = ?
+                where unit_id = ?""", (CLAIMED, worker, now + lease, row[0]))
+        return row[0], json.loads(row[1]), row[2]
+
+    def renew(self, unit_id, worker, lease=DEFAULT_LEASE):
+        """
+        :description: Extends the lease of a unit, if it is still claimed by the worker.
+        """
+        with self._connect() as conn:
+            conn.execute("update units set lease_until = ? where unit_id = ? and status = ? and worker = ?",
+                         (time.time() + lease, unit_id, CLAIMED, worker))
+
+    def complete(self, unit_id, worker, result, details=None, retries=0):
+        """
+        :description: Records the result of a unit. The result of a worker which lost its lease is still recorded,
+                      the unit does not have to be validated twice. A unit ending with an ERROR is queued again as
+                      PENDING, with its last result, until it was claimed retries + 1 times.
+        :param result: Result dict, see batch.validate_table().
+        :param details: Record counts, metrics and report of the unit, see UnitDetails.
+        :param retries: Number of times a unit ending with an ERROR is validated again.
+        """
+        with self._connect() as conn:
+            conn.execute("""update units set status = case when ? = ? and attempts <= ? then ? else ? end, worker = ?,
+                                             lease_until = null, result = ?, details = ?
+                where unit_id = ?""", (result['status'], ERROR, retries, PENDING, DONE, worker,
+                                       json.dumps(result, default=str), json.dumps(details, default=str), unit_id))
+
+    def get_progress(self, run_id):
+        """
+        :description: Returns the number of units of a run per status.
+        :return: dict of status --> number of units, with all of PENDING, CLAIMED and DONE.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("select status, count(*) from units where run_id = ? group by status",
+                                (run_id,)).fetchall()
+        return {PENDING: 0, CLAIMED: 0, DONE: 0, **dict(rows)}
+
+    def load_results(self, run_id):
+        """
+        :description: Returns the results of the units of a run in the order they were queued, None for the units
+                      which are not done.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("select result from units where run_id = ? order by unit_id", (run_id,)).fetchall()
+        return [json.loads(result) if result else None for result, in rows]
+
+    def load_details(self, run_id):
+        """
+        :description: Returns the details of the units of a run in the order they were queued, see UnitDetails, None
+                      for the units which are not done.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("select details from units where run_id = ? order by unit_id", (run_id,)).fetchall()
+        return [json.loads(details) if details else None for details, in rows]
+
+
+def configure(config):
+    """
+    :description: Applies the process level settings of the coordinator to the Netezza and Snowflake classes of a
+                  worker process.
+    :param config: dict with the local_db, profile, validation_sp and catalog settings, see get_config().
+    """
+
+    Snowflake.use_validation_sp = bool(config.get('validation_sp'))
+    Netezza.profile = Snowflake.profile = bool(config.get('profile'))
+    if config.get('local_db'):
+        Netezza.use_backend(SQLiteBackend(config['local_db']))
+        Snowflake.use_backend(SQLiteBackend(config['local_db']))
+    if config.get('catalog'):
+        Netezza.catalog = Snowflake.catalog = SchemaCatalog(config['catalog'])
+
+
+def get_config(args):
+    """
+    :description: Process level settings of the command line arguments, passed to the worker processes.
+    """
+
+    return {'local_db': args.local_db, 'profile': args.profile, 'validation_sp': args.validation_sp,
+            'catalog': args.catalog}
+
+
+def run_worker(queue_path, run_id=None, config=None, threads=1, lease=DEFAULT_LEASE,
+               poll_interval=DEFAULT_POLL_INTERVAL, netezza_concurrency=DEFAULT_NETEZZA_CONCURRENCY,
+               snowflake_concurrency=DEFAULT_SNOWFLAKE_CONCURRENCY):
+    """
+    :description: Validates the units of a run until all of them are done. Each thread claims one unit at a time,
+                  validates it with batch.validate_table() and records the result, while a background thread renews
+                  the leases of the running units. Waits for the units claimed by other workers, in case their lease
+                  expires.
+    :param queue_path: SQLite file of the WorkQueue.
+    :param run_id: Id of the run, the last unfinished run of the queue if None.
+    :param config: Process level settings, see configure(). Nothing is changed if None.
+    :param threads: Number of units validated at the same time by this worker.
+    :param lease: Seconds a unit stays leased without a renewal.
+    :param poll_interval: Seconds between two claims when no unit is pending.
+    :param netezza_concurrency: Maximum number of units queried in Netezza at the same time by this worker.
+    :param snowflake_concurrency: Maximum number of units queried in Snowflake at the same time by this worker.
+    :return: Number of units validated by this worker.
+    :raises RuntimeError: when a thread of the worker stopped on an exception, after the other threads finished.
+    """
+
+    if config is not None:
+        configure(config)
+    queue = WorkQueue(queue_path)
+    run_id = run_id or queue.get_latest_run()
+    if run_id is None:
+        return 0
+    options = queue.get_run(run_id)
+    Netezza.pool_size = min(threads, netezza_concurrency)
+    Snowflake.pool_size = min(threads, snowflake_concurrency)
+    netezza_slots = threading.BoundedSemaphore(Netezza.pool_size)
+    snowflake_slots = threading.BoundedSemaphore(Snowflake.pool_size)
+    store = ResultStore(options['store_path']) if options['store_path'] else None
+    running = dict()
+    done = threading.Event()
+    lock = threading.Lock()
+    validated = [0]
+    errors = []
+
+    def renew_leases():
+        while not done.wait(lease / 3):
+            with lock:
+                claimed = list(running.items())
+            for unit_id, worker in claimed:
+                try:
+                    queue.renew(unit_id, worker, lease)
+                except Exception as e:
+                    # renewed again at the next round, before the lease expires
+                    print(f"Lease of unit {unit_id} not renewed: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def work(worker):
+        try:
+            claim_units(worker)
+        except Exception as e:
+            # the unit of the thread is claimed again by another worker once its lease expires
+            print(f"Worker {worker} stopped: {type(e).__name__}: {e}", file=sys.stderr)
+            with lock:
+                errors.append(e)
+
+    def claim_units(worker):
+        while True:
+            unit = queue.claim(run_id, worker, lease)
+            if unit is None:
+                progress = queue.get_progress(run_id)
+                if progress[PENDING] == 0 and progress[CLAIMED] == 0:
+                    return
+                time.sleep(poll_interval)
+                continue
+            unit_id, entry, bucket = unit
+            with lock:
+                running[unit_id] = worker
+            try:
+                details = UnitDetails()
+                result = validate_table(entry, netezza_slots, snowflake_slots, options['rel_tol'], options['abs_tol'],
+                                        options['connect'], options['parallel_sides'], options['partition_by'], store,
+                                        options['fingerprint'], sink=details, bucket=bucket,
+                                        sample_rows=options.get('sample_rows', DEFAULT_TARGET_ROWS))
+                queue.complete(unit_id, worker, result, details.details, options.get('retries', 0))
+            finally:
+                with lock:
+                    running.pop(unit_id)
+            with lock:
+                validated[0] += 1
+
+    renewer = threading.Thread(target=renew_leases, daemon=True)
+    renewer.start()
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    workers = [threading.Thread(target=work, args=(f"{name}:{thread}",)) for thread in range(threads)]
+    try:
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    finally:
+        done.set()
+        if options['connect']:
+            Netezza.get_pool().close_all()
+            Snowflake.get_pool().close_all()
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {threads} worker threads stopped on an exception") from errors[0]
+    return validated[0]
+
+
+def run_sharded_batch(manifest, queue_path=DEFAULT_QUEUE_PATH, processes=1, threads=1, rel_tol=DEFAULT_REL_TOL,
+                      abs_tol=DEFAULT_ABS_TOL, connect=False, parallel_sides=False, partition_by=None,
+                      store_path=None, fingerprint=False, config=None, poll_interval=DEFAULT_POLL_INTERVAL,
+                      netezza_concurrency=DEFAULT_NETEZZA_CONCURRENCY,
+                      snowflake_concurrency=DEFAULT_SNOWFLAKE_CONCURRENCY, sink=None, sample_rows=DEFAULT_TARGET_ROWS,
+                      retries=0):
+    """
+    :description: Coordinates a sharded run: splits the manifest into units with split_units(), queues them, starts
+                  the local worker processes and waits until all the units are done, also the units of the workers
+                  started on other hosts with the printed run id.
+    :param manifest: List of manifest entries, see batch.load_manifest().
+    :param queue_path: SQLite file of the WorkQueue, on a shared file system for workers on other hosts.
+    :param processes: Number of local worker processes, 0 to only wait for the workers on other hosts.
+    :param threads: Number of units validated at the same time by each worker process.
+    :param config: Process level settings of the worker processes, see configure().
+    :param netezza_concurrency: Maximum number of units queried in Netezza at the same time by all the local workers,
+                                split between them with split_cap(). The workers on other hosts have their own caps.
+    :param snowflake_concurrency: Maximum number of units queried in Snowflake at the same time by all the local
+                                  workers, see netezza_concurrency.
+    :param sink: ResultSink the tables are written to once all their units are done, see result_sink.py. Not closed.
+    :param retries: Number of times a unit ending with an ERROR is queued again, see WorkQueue.complete().
+    The other parameters are the validation options, see batch.run_batch().
+    :return: List of result dicts in the order of the manifest, see merge_unit_results().
+    """
+
+    caps = list(zip(split_cap(netezza_concurrency, processes), split_cap(snowflake_concurrency, processes)))
+    options = {'rel_tol': rel_tol, 'abs_tol': abs_tol, 'connect': connect, 'parallel_sides': parallel_sides,
+               'partition_by': partition_by, 'store_path': store_path, 'fingerprint': fingerprint,
+               'sample_rows': sample_rows, 'retries': retries}
+    units = split_units(manifest, partition_by, store_path)
+    run_id = get_run_id(manifest, options)
+    queue = WorkQueue(queue_path)
+    if not queue.add_run(run_id, options, units):
+        print(f"Resuming run {run_id} from {queue_path}")
+    print(f"Run {run_id}: {len(units)} units of {len(manifest)} tables on {queue_path}, "
+          f"{processes} local worker processes")
+
+    workers = [multiprocessing.Process(target=run_worker, args=(queue_path, run_id, config or dict(), threads),
+                                       kwargs={'netezza_concurrency': netezza_cap,
+                                               'snowflake_concurrency': snowflake_cap})
+               for netezza_cap, snowflake_cap in caps]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        if worker.exitcode:
+            print(f"Worker process {worker.pid} failed with exit code {worker.exitcode}, its units are claimed "
+                  f"again once their lease expires", file=sys.stderr)
+    while True:
+        progress = queue.get_progress(run_id)
+        if progress[PENDING] == 0 and progress[CLAIMED] == 0:
+            break
+        time.sleep(poll_interval)
+    results = merge_unit_results(manifest, units, queue.load_results(run_id))
+    if sink is not None:
+        for result, details in zip(results, merge_unit_details(manifest, units, queue.load_details(run_id))):
+            sink.write(result, *details)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Validate the units of a sharded run from a work queue.")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="SQLite file of the work queue.")
+    parser.add_argument("--run_id", help="Run to work on, the last unfinished run of the queue by default.")
+    parser.add_argument(
+        "--threads", type=int, default=1, help="Number of units validated at the same time by this worker.")
+    parser.add_argument(
+        "--local_db", help="SQLite file standing in for both Netezza and Snowflake. See backends.py.")
+    parser.add_argument(
+        "--validation_sp", action="store_true",
+        help="Compute the Snowflake metrics with the generic validation SP instead of the metric queries.")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Also compare NULL counts, approximate distinct counts, STDDEV and quantiles, in the same scan.")
+    parser.add_argument("--catalog", help="SQLite file of the cached schema catalog. See catalog.py.")
+    parser.add_argument(
+        "--lease", type=float, default=DEFAULT_LEASE, help="Seconds a claimed unit stays leased without a renewal.")
+    parser.add_argument(
+        "--netezza_concurrency", type=int, default=DEFAULT_NETEZZA_CONCURRENCY,
+        help="Maximum number of units queried in Netezza at the same time by this worker.")
+    parser.add_argument(
+        "--snowflake_concurrency", type=int, default=DEFAULT_SNOWFLAKE_CONCURRENCY,
+        help="Maximum number of units queried in Snowflake at the same time by this worker.")
+    args = parser.parse_args()
+    count = run_worker(args.queue, args.run_id, get_config(args), args.threads, args.lease,
+                       netezza_concurrency=args.netezza_concurrency, snowflake_concurrency=args.snowflake_concurrency)
+    print(f"Validated {count} units.")
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from backends import SQLiteBackend  # noqa: E402
+from benchmark import create_tables  # noqa: E402
+from validation import Netezza, Snowflake  # noqa: E402
+
+
+@pytest.fixture
+def local_db(tmp_path):
+    """
+    SQLite database with the identical benchmark tables EDW.ADMIN.BENCHMARK (Netezza) and EDW.CORE.BENCHMARK
+    (Snowflake), set as the backend of both sides for the test.
+    """
+
+    path = str(tmp_path / 'local.db')
+    create_tables(path, rows=500, columns=7)
+    backends = Netezza.backend, Snowflake.backend
+    Netezza.use_backend(SQLiteBackend(path))
+    Snowflake.use_backend(SQLiteBackend(path))
+    yield path
+    Netezza.use_backend(backends[0])
+    Snowflake.use_backend(backends[1])
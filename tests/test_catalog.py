@@ -0,0 +1,105 @@
+import threading
+
+import pandas as pd
+
+from backends import SQLiteBackend
+from catalog import SchemaCatalog
+
+
+class FakeBackend:
+    """
+    Backend serving the schema EDW.CORE with one table, counting the catalog queries.
+    """
+
+    def __init__(self, format_type='CHARACTER VARYING(20)'):
+        self.format_type = format_type
+        self.version = '1'
+        self.version_queries = 0
+        self.column_queries = 0
+
+    def get_schema_version(self, cursor, db_name, schema_name):
+        self.version_queries += 1
+        return self.version
+
+    def get_schema_columns(self, cursor, db_name, schema_name):
+        self.column_queries += 1
+        return pd.DataFrame({'TABLE_NAME': ['ADDRESS_TYPE'], 'ATTNAME': ['NAME'], 'FORMAT_TYPE': [self.format_type]})
+
+
+def get_format_type(catalog, backend):
+    return catalog.get_columns('NETEZZA', backend, None, 'edw', 'core', 'address_type')['FORMAT_TYPE'].iloc[0]
+
+
+def test_version_is_trusted_until_the_ttl_expires():
+    backend = FakeBackend()
+    catalog = SchemaCatalog(version_ttl=3600)
+    get_format_type(catalog, backend)
+    backend.version, backend.format_type = '2', 'CHARACTER VARYING(50)'
+
+    assert get_format_type(catalog, backend) == 'CHARACTER VARYING(20)'
+    assert (backend.version_queries, backend.column_queries) == (1, 1)
+
+
+def test_changed_version_is_seen_after_the_ttl():
+    backend = FakeBackend()
+    catalog = SchemaCatalog(version_ttl=0)
+    get_format_type(catalog, backend)
+    assert get_format_type(catalog, backend) == 'CHARACTER VARYING(20)'
+    assert backend.column_queries == 1
+
+    backend.version, backend.format_type = '2', 'CHARACTER VARYING(50)'
+    assert get_format_type(catalog, backend) == 'CHARACTER VARYING(50)'
+    assert (backend.version_queries, backend.column_queries) == (3, 2)
+
+
+def test_cache_file_is_reused_by_the_next_run(tmp_path):
+    path = str(tmp_path / 'catalog.db')
+    get_format_type(SchemaCatalog(path), FakeBackend())
+    backend = FakeBackend('CHANGED WITHOUT A NEW VERSION')
+
+    assert get_format_type(SchemaCatalog(path), backend) == 'CHARACTER VARYING(20)'
+    assert backend.column_queries == 0
+
+
+def test_other_schemas_are_not_blocked_by_a_fetch():
+    fetching, released = threading.Event(), threading.Event()
+
+    class SlowBackend(FakeBackend):
+        def get_schema_columns(self, cursor, db_name, schema_name):
+            if schema_name == 'SLOW':
+                fetching.set()
+                assert released.wait(5)
+            return super().get_schema_columns(cursor, db_name, schema_name)
+
+    backend = SlowBackend()
+    catalog = SchemaCatalog()
+    slow = threading.Thread(target=catalog.get_columns,
+                            args=('NETEZZA', backend, None, 'EDW', 'SLOW', 'ADDRESS_TYPE'))
+    slow.start()
+    assert fetching.wait(5)
+    format_types = []
+    fast = threading.Thread(target=lambda: format_types.append(get_format_type(catalog, backend)))
+    fast.start()
+    fast.join(2)
+    blocked = fast.is_alive()
+    released.set()
+    slow.join()
+    fast.join()
+
+    assert not blocked
+    assert format_types == ['CHARACTER VARYING(20)']
+
+
+def test_sqlite_schema_change_is_seen(local_db):
+    backend = SQLiteBackend(local_db)
+    catalog = SchemaCatalog(version_ttl=0)
+    conn = backend.connect()
+    try:
+        cursor = conn.cursor()
+        columns = catalog.get_columns('NETEZZA', backend, cursor, 'EDW', 'ADMIN', 'BENCHMARK')
+        conn.execute('alter table "EDW.ADMIN.BENCHMARK" add column EXTRA INTEGER')
+        altered = catalog.get_columns('NETEZZA', backend, cursor, 'EDW', 'ADMIN', 'BENCHMARK')
+    finally:
+        conn.close()
+
+    assert list(altered['ATTNAME']) == list(columns['ATTNAME']) + ['EXTRA']
@@ -0,0 +1,27 @@
+import warnings
+
+import pandas as pd
+
+from comparison import compare_bucket_metrics
+
+
+def get_bucket_frames(values):
+    index = pd.Index(['2022-01-01', '2022-02-01'], name='BUCKET')
+    counts = pd.Series([10, 20], index=index)
+    metrics = pd.DataFrame({('ID', 'MAX'): values, ('NAME', 'MAX_STR_LENGTH'): [5, 6]}, index=index)
+    return counts, metrics
+
+
+def test_compare_bucket_metrics_reports_the_mismatching_bucket_without_warnings():
+    nz_counts, nz_metrics = get_bucket_frames([100, 200])
+    sf_counts, sf_metrics = get_bucket_frames([100, 201])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        report = compare_bucket_metrics(nz_counts, nz_metrics, sf_counts, sf_metrics)
+
+    assert report == {'2022-02-01': {'ID': {'MAX': {'SF': 201, 'Netezza': 200}}}}
+
+
+def test_compare_bucket_metrics_matches_identical_buckets():
+    assert compare_bucket_metrics(*get_bucket_frames([100, 200]), *get_bucket_frames([100, 200])) == dict()
@@ -0,0 +1,69 @@
+import sqlite3
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from benchmark import DATE_COLUMN, NETEZZA_TABLE, SNOWFLAKE_TABLE
+from query_builder import build_watermark_clause, build_where_clause, get_params
+from result_store import ResultStore, merge_bucket_aggregates
+from validation import CountValidationError, incremental_validation, load_tables
+
+
+def load(**kwargs):
+    return load_tables(NETEZZA_TABLE, SNOWFLAKE_TABLE, date_col=DATE_COLUMN, connect=True, validate=False, **kwargs)
+
+
+def count_rows(path, where_clause=''):
+    conn = sqlite3.connect(path)
+    try:
+        query = f'select count(*) from "{NETEZZA_TABLE}"{where_clause}'
+        return conn.execute(query, get_params(where_clause)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_watermark_is_added_to_the_date_range():
+    where_clause = build_watermark_clause('D', '2023-01-01', build_where_clause('D', '2022-01-01', '2024-01-01'))
+
+    assert 'D >= ?' in where_clause and 'D < ?' in where_clause and 'is null' in where_clause
+    assert get_params(where_clause) == ('2022-01-01', '2024-01-01', '2023-01-01')
+
+
+def test_refresh_keeps_the_date_range(local_db, tmp_path):
+    store = ResultStore(str(tmp_path / 'store.db'))
+    kwargs = dict(start_date='2022-03-01', end_date='2023-03-01')
+    for _ in range(2):
+        netezza, snowflake = load(**kwargs)
+        incremental_validation(netezza, snowflake, store, 'month')
+
+    assert netezza.table_count == snowflake.table_count == count_rows(local_db, build_where_clause(DATE_COLUMN,
+                                                                                                 **kwargs))
+
+
+def test_refresh_rescans_rows_without_a_date(local_db, tmp_path):
+    store = ResultStore(str(tmp_path / 'store.db'))
+    incremental_validation(*load(), store, 'month')
+
+    conn = sqlite3.connect(local_db)
+    with conn:
+        deleted = conn.execute(f'delete from "{SNOWFLAKE_TABLE}" where rowid = (select min(rowid) '
+                               f'from "{SNOWFLAKE_TABLE}" where {DATE_COLUMN} is null)').rowcount
+    conn.close()
+    assert deleted == 1
+
+    with pytest.raises(CountValidationError):
+        incremental_validation(*load(), store, 'month')
+
+
+def test_merged_decimal_sums_keep_their_digits():
+    counts = pd.Series([1, 1], index=['2023-01-01', '2023-02-01'])
+    metrics = pd.DataFrame({('AMOUNT', 'SUM'): ['12345678901234567890.12', '0.01'],
+                            ('AMOUNT', 'VALUE_COUNT'): [1, 1],
+                            ('AMOUNT', 'MAX'): ['12345678901234567890.12', '0.01']}, index=counts.index)
+
+    table_count, totals = merge_bucket_aggregates(counts, metrics)
+
+    assert table_count == 2
+    assert totals.loc['AMOUNT', 'SUM'] == Decimal('12345678901234567890.13')
+    assert totals.loc['AMOUNT', 'MAX'] == Decimal('12345678901234567890.12')
@@ -0,0 +1,51 @@
+import sqlite3
+import threading
+
+from batch import ERROR, PASSED, run_batch, validate_table_with_retries
+from benchmark import NETEZZA_TABLE, SNOWFLAKE_TABLE
+from journal import RunJournal
+from validation import Netezza
+
+MANIFEST = [{'snowflake_table_name': SNOWFLAKE_TABLE, 'netezza_table_name': NETEZZA_TABLE}]
+
+
+def query(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_finished_units_are_skipped_with_the_same_options(local_db, tmp_path, monkeypatch):
+    journal_path = str(tmp_path / 'journal.db')
+    run_batch(MANIFEST, connect=True, journal_path=journal_path)
+    run_batch(MANIFEST, connect=True, journal_path=journal_path)
+    assert query(journal_path, 'select status, attempts from units') == [(PASSED, 1)]
+
+    monkeypatch.setattr(Netezza, 'profile', True)
+    run_batch(MANIFEST, connect=True, journal_path=journal_path)
+    run_batch(MANIFEST, connect=True, journal_path=journal_path, sample_rows=10)
+    assert len(query(journal_path, 'select unit_key from units')) == 3
+
+
+def test_metrics_and_counts_are_journaled(local_db, tmp_path):
+    journal_path = str(tmp_path / 'journal.db')
+    run_batch(MANIFEST, connect=True, journal_path=journal_path)
+
+    assert query(journal_path, 'select netezza_count, snowflake_count from units') == [(500, 500)]
+    metrics = query(journal_path, 'select attname, metric, netezza_number, snowflake_number, mismatch from metrics')
+    assert metrics and all(mismatch == 0 for *_, mismatch in metrics)
+    assert ('COL_1', 'SUM') in {(attname, metric) for attname, metric, *_ in metrics}
+
+
+def test_errors_are_retried_with_keyword_options(local_db, tmp_path):
+    journal = RunJournal(str(tmp_path / 'journal.db'))
+    entry = {'snowflake_table_name': 'EDW.CORE.MISSING', 'netezza_table_name': 'EDW.ADMIN.MISSING'}
+
+    slots = threading.BoundedSemaphore(1)
+    result = validate_table_with_retries(entry, slots, slots, connect=True, journal=journal, unit_key='missing',
+                                         retries=1, retry_backoff=0)
+
+    assert result['status'] == ERROR and 'not found' in result['message']
+    assert query(journal.path, 'select status, attempts from units') == [(ERROR, 2)]
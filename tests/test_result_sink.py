@@ -0,0 +1,63 @@
+import json
+import sqlite3
+from decimal import Decimal
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from batch import DATA_MISMATCH, PASSED, SUMMARY_KEYS, run_batch
+from benchmark import NETEZZA_TABLE, SNOWFLAKE_TABLE
+from result_sink import ResultSink, get_metric_rows, to_number_text
+
+MANIFEST = [{'snowflake_table_name': SNOWFLAKE_TABLE, 'netezza_table_name': NETEZZA_TABLE}]
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_numbers_keep_all_their_digits():
+    val_df = pd.DataFrame({'ATTNAME': ['AMOUNT'], 'FORMAT_TYPE': ['NUMERIC(38,2)'],
+                           'SUM': [Decimal('12345678901234567.89')]})
+    sf_df = pd.DataFrame({'DATA_TYPE': ['NUMBER(38,2)'], 'SUM': ['12345678901234567.88']},
+                         index=pd.Index(['AMOUNT'], name='ATTNAME'))
+
+    row = get_metric_rows('T', val_df, sf_df, {'AMOUNT': {'SUM': dict()}}).iloc[0]
+
+    assert (row['netezza_number'], row['snowflake_number'], row['mismatch']) == \
+        ('12345678901234567.89', '12345678901234567.88', True)
+    assert to_number_text(float('nan')) is None and to_number_text('n/a') is None
+
+
+def test_batch_results_are_slim_with_a_sink(local_db, tmp_path):
+    with sqlite3.connect(local_db) as conn:
+        conn.execute(f'update "{SNOWFLAKE_TABLE}" set COL_1 = COL_1 + 1 where ID = 1')
+    sink = ResultSink(str(tmp_path / 'results.jsonl'), str(tmp_path / 'results'))
+
+    results = run_batch(MANIFEST, connect=True, sink=sink)
+    sink.close()
+
+    assert list(results[0]) == SUMMARY_KEYS and results[0]['status'] == DATA_MISMATCH
+    line = read_jsonl(sink.jsonl_path)[0]
+    assert line['status'] == DATA_MISMATCH and line['message'] and 'COL_1' in line['report']
+    metrics = pq.read_table(str(tmp_path / 'results' / 'metrics')).to_pandas()
+    assert metrics['netezza_number'].map(lambda number: number is None or isinstance(number, str)).all()
+    assert metrics.loc[metrics['mismatch'], 'attname'].unique().tolist() == ['COL_1']
+
+
+def test_units_skipped_by_the_journal_reach_the_sink(local_db, tmp_path):
+    journal_path = str(tmp_path / 'journal.db')
+    first = ResultSink(str(tmp_path / 'first.jsonl'))
+    run_batch(MANIFEST, connect=True, journal_path=journal_path, sink=first)
+    first.close()
+    second = ResultSink(str(tmp_path / 'second.jsonl'), str(tmp_path / 'second'))
+
+    results = run_batch(MANIFEST, connect=True, journal_path=journal_path, sink=second)
+    second.close()
+
+    assert results[0]['status'] == PASSED
+    assert read_jsonl(second.jsonl_path) == [{**read_jsonl(first.jsonl_path)[0],
+                                              'finished_at': read_jsonl(second.jsonl_path)[0]['finished_at']}]
+    assert second.summary.to_dict()['rows'] == {'netezza': 500, 'snowflake': 500}
+    assert pq.read_table(str(tmp_path / 'second' / 'metrics')).num_rows > 0
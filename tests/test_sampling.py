@@ -0,0 +1,45 @@
+import pytest
+
+from benchmark import DATE_COLUMN, KEY_COLUMN, NETEZZA_TABLE, SNOWFLAKE_TABLE
+from sampling import SAMPLE_MODULUS, build_sample_condition, get_sample_fraction
+from validation import DataValidationError, load_tables, sample_validation
+
+FRACTION = 0.5
+
+
+def load():
+    return load_tables(NETEZZA_TABLE, SNOWFLAKE_TABLE, date_col=DATE_COLUMN, connect=True, validate=False)
+
+
+def test_sample_fraction_is_tuned_from_the_count():
+    assert get_sample_fraction(500, 1000) == 1.0
+    assert get_sample_fraction(10 ** 9, 1000) == 1 / SAMPLE_MODULUS
+
+
+def test_all_rows_need_no_sample_condition():
+    assert build_sample_condition([(KEY_COLUMN, 'INTEGER')], 'snowflake', 1.0, KEY_COLUMN) is None
+    with pytest.raises(ValueError):
+        build_sample_condition([(KEY_COLUMN, 'INTEGER')], 'snowflake', FRACTION, 'MISSING')
+
+
+def test_sample_of_identical_tables_passes(local_db):
+    assert sample_validation(*load(), FRACTION, KEY_COLUMN) == FRACTION
+
+
+def test_same_sample_compares_sum_exactly(local_db):
+    netezza, snowflake = load()
+    columns = list(zip(netezza.val_df['ATTNAME'], netezza.val_df['FORMAT_TYPE']))
+    condition = build_sample_condition(columns, 'snowflake', FRACTION, KEY_COLUMN)
+    conn = snowflake.backend.connect()
+    try:
+        # a sampled value between the sample MIN and MAX, which only changes the sample SUM
+        key = conn.execute(f'select {KEY_COLUMN} from "{SNOWFLAKE_TABLE}" where {condition} and COL_1 is not null '
+                           f'order by COL_1 limit 1 offset 10').fetchone()[0]
+        with conn:
+            conn.execute(f'update "{SNOWFLAKE_TABLE}" set COL_1 = COL_1 + 1 where {KEY_COLUMN} = ?', (key,))
+    finally:
+        conn.close()
+
+    with pytest.raises(DataValidationError) as error:
+        sample_validation(*load(), FRACTION, KEY_COLUMN)
+    assert 'SUM' in error.value.report['COL_1']
@@ -0,0 +1,49 @@
+import csv
+
+import pytest
+
+from batch import PASSED, parse_manifest
+from benchmark import NETEZZA_TABLE, SNOWFLAKE_TABLE
+from scheduler import estimate_cost, load_history, run_scheduled_batch
+
+MANIFEST = f"""snowflake_table_name,netezza_table_name,sla
+{SNOWFLAKE_TABLE},{NETEZZA_TABLE},{{sla}}
+"""
+
+
+@pytest.mark.parametrize('sla', ['soon', '-5', 'nan'])
+def test_bad_sla_is_reported_with_its_entry(sla):
+    with pytest.raises(ValueError, match=SNOWFLAKE_TABLE):
+        parse_manifest(MANIFEST.format(sla=sla))
+
+
+def test_history_keeps_the_seconds_of_each_side(local_db, tmp_path):
+    history_path = str(tmp_path / 'history.csv')
+    manifest = parse_manifest(MANIFEST.format(sla='30'))
+    results, _, _ = run_scheduled_batch(manifest, connect=True, history_path=history_path)
+
+    assert results[0]['status'] == PASSED
+    with open(history_path, newline='') as f:
+        row = next(csv.DictReader(f))
+    elapsed, netezza_seconds, snowflake_seconds = load_history(history_path)[(SNOWFLAKE_TABLE, NETEZZA_TABLE)]
+    assert (elapsed, netezza_seconds, snowflake_seconds) == tuple(
+        float(row[key]) for key in ('elapsed', 'netezza_elapsed', 'snowflake_elapsed'))
+    assert 0 < netezza_seconds <= elapsed and 0 < snowflake_seconds <= elapsed
+
+
+def test_history_costs_each_side_separately():
+    history = {(SNOWFLAKE_TABLE, NETEZZA_TABLE): (10.0, 4.0, 6.0)}
+    entry = {'snowflake_table_name': SNOWFLAKE_TABLE, 'netezza_table_name': NETEZZA_TABLE}
+
+    cost = estimate_cost(entry, dict(), dict(), history, credits_per_hour=3600)
+
+    assert (cost['source'], cost['netezza_seconds'], cost['snowflake_seconds'], cost['seconds'], cost['credits']) == \
+        ('history', 4.0, 6.0, 10.0, 6.0)
+
+
+def test_history_rows_without_side_seconds_charge_both_sides(tmp_path):
+    history_path = tmp_path / 'history.csv'
+    history_path.write_text(f"snowflake_table_name,netezza_table_name,status,elapsed,finished_at\n"
+                            f"{SNOWFLAKE_TABLE},{NETEZZA_TABLE},{PASSED},12.5,2026-01-01T00:00:00\n")
+
+    assert load_history(str(history_path)) == {(SNOWFLAKE_TABLE, NETEZZA_TABLE): (12.5, 12.5, 12.5)}
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from service import JobError, ValidationService, parse_job
+
+TABLES = [{'snowflake_table_name': 'EDW.CORE.A', 'netezza_table_name': 'EDW.ADMIN.A'}]
+
+
+@pytest.mark.parametrize('options', [{'rel_tol': 'x'}, {'abs_tol': True}, {'fingerprint': 1},
+                                     {'partition_by': ['month']}, {'incremental_store': 3}, {'rel_tol': -1},
+                                     {'partition_by': 'hour'}, {'unknown': 1}])
+def test_job_options_are_checked(options):
+    with pytest.raises(JobError):
+        parse_job({'tables': TABLES, 'options': options})
+
+
+def test_job_options_default():
+    manifest, options = parse_job({'tables': TABLES, 'options': {'rel_tol': 0, 'partition_by': 'month'}})
+
+    assert manifest[0]['snowflake_table_name'] == 'EDW.CORE.A'
+    assert options['rel_tol'] == 0 and options['partition_by'] == 'month' and options['incremental_store'] is None
+
+
+@pytest.mark.parametrize('name', ['../store.db', '/tmp/store.db', 'sub/store.db', '..'])
+def test_stores_stay_in_the_store_directory(tmp_path, name):
+    service = ValidationService(workers=1, store_dir=str(tmp_path))
+    try:
+        with pytest.raises(JobError):
+            service.get_store(name)
+        assert service.get_store('store.db').path == os.path.join(str(tmp_path), 'store.db')
+    finally:
+        service.close()
+
+
+def test_stores_are_disabled_without_a_store_directory():
+    service = ValidationService(workers=1)
+    try:
+        assert service.get_store(None) is None
+        with pytest.raises(JobError):
+            service.get_store('store.db')
+    finally:
+        service.close()
@@ -0,0 +1,39 @@
+import pytest
+
+from benchmark import DATE_COLUMN, NETEZZA_TABLE, SNOWFLAKE_TABLE
+from validation import (DEFAULT_DATE_COL, Snowflake, count_validation, data_validation, load_tables,
+                        partition_validation)
+
+
+def test_connected_snowflake_waits_for_submitted_metrics(local_db):
+    db_name, schema_name, table_name = SNOWFLAKE_TABLE.split('.')
+    snowflake = Snowflake(db_name, schema_name, table_name, date_col=DATE_COLUMN, connect=True)
+
+    assert snowflake.metrics_df is not None
+    assert snowflake.table_count == 500
+    assert snowflake.val_json == dict()
+
+
+def test_connected_snowflake_does_not_fall_back_to_sample_file(local_db):
+    db_name, schema_name, table_name = SNOWFLAKE_TABLE.split('.')
+    snowflake = Snowflake(db_name, schema_name, table_name, date_col=DATE_COLUMN, connect=True, validate=False)
+    snowflake.connect_snowflake()
+    with pytest.raises(RuntimeError):
+        snowflake.complete()
+
+
+@pytest.mark.parametrize('parallel_sides', [False, True])
+def test_full_validation_passes_on_identical_tables(local_db, parallel_sides):
+    netezza, snowflake = load_tables(NETEZZA_TABLE, SNOWFLAKE_TABLE, parallel_sides, date_col=DATE_COLUMN,
+                                     connect=True)
+
+    count_validation(netezza, snowflake)
+    data_validation(netezza, snowflake)
+
+
+def test_both_sides_default_to_the_same_date_column(local_db):
+    netezza, snowflake = load_tables(NETEZZA_TABLE, SNOWFLAKE_TABLE, start_date='2022-03-01', end_date='2023-03-01',
+                                     connect=True, validate=False)
+
+    assert netezza.date_col == snowflake.date_col == DEFAULT_DATE_COL
+    partition_validation(netezza, snowflake, 'month')
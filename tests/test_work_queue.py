@@ -0,0 +1,92 @@
+import json
+import sqlite3
+
+import pyarrow.parquet as pq
+import pytest
+
+import work_queue
+from batch import ERROR, PASSED
+from benchmark import DATE_COLUMN, NETEZZA_TABLE, SNOWFLAKE_TABLE
+from result_sink import ResultSink
+from work_queue import DONE, PENDING, WorkQueue, run_sharded_batch, run_worker, split_cap, split_units
+
+MANIFEST = [{'snowflake_table_name': SNOWFLAKE_TABLE, 'netezza_table_name': NETEZZA_TABLE}]
+PARTITIONED = [{**MANIFEST[0], 'date_column': DATE_COLUMN, 'start_date': '2022-01-01', 'end_date': '2022-04-01'}]
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_dated_tables_are_split_per_bucket():
+    units = split_units(PARTITIONED + MANIFEST, 'month')
+
+    assert [(index, bucket) for index, _, bucket in units] == \
+        [(0, '2022-01-01'), (0, '2022-02-01'), (0, '2022-03-01'), (1, None)]
+
+
+def test_queue_run_writes_the_sink(local_db, tmp_path):
+    sink = ResultSink(str(tmp_path / 'results.jsonl'), str(tmp_path / 'results'))
+
+    results = run_sharded_batch(MANIFEST, str(tmp_path / 'queue.db'), processes=1, connect=True,
+                                config={'local_db': local_db}, sink=sink)
+    sink.close()
+
+    assert results[0]['status'] == PASSED
+    line = read_jsonl(sink.jsonl_path)[0]
+    assert (line['status'], line['netezza_count'], line['snowflake_count']) == (PASSED, 500, 500)
+    metrics = pq.read_table(str(tmp_path / 'results' / 'metrics')).to_pandas()
+    assert len(metrics) and not metrics['mismatch'].any()
+
+
+def test_bucket_units_are_merged_for_the_sink(local_db, tmp_path):
+    queue_path = str(tmp_path / 'queue.db')
+    sink = ResultSink(str(tmp_path / 'results.jsonl'))
+
+    results = run_sharded_batch(PARTITIONED, queue_path, processes=1, connect=True, partition_by='month',
+                                config={'local_db': local_db}, sink=sink)
+    sink.close()
+
+    assert results[0]['status'] == PASSED
+    conn = sqlite3.connect(queue_path)
+    try:
+        counts = [json.loads(details)['counts'] for details, in conn.execute('select details from units')]
+    finally:
+        conn.close()
+    line = read_jsonl(sink.jsonl_path)[0]
+    assert len(counts) == 3
+    assert (line['netezza_count'], line['snowflake_count']) == tuple(map(sum, zip(*counts)))
+    assert line['netezza_count'] > 0
+
+
+def test_caps_are_split_between_the_processes():
+    assert split_cap(4, 3) == [2, 1, 1] and split_cap(4, 1) == [4] and split_cap(4, 0) == []
+    with pytest.raises(ValueError):
+        split_cap(2, 3)
+
+
+def test_error_units_are_queued_again_up_to_the_retries(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    queue.add_run('run', {'retries': 1}, split_units(MANIFEST))
+    error = {**MANIFEST[0], 'status': ERROR, 'message': 'dropped', 'elapsed': 0.1}
+
+    for status in (PENDING, DONE):
+        unit_id, _, _ = queue.claim('run', 'worker')
+        queue.complete(unit_id, 'worker', error, retries=1)
+        assert queue.get_progress('run')[status] == 1
+    assert queue.claim('run', 'worker') is None
+    assert queue.load_results('run') == [error]
+
+
+def test_worker_thread_exceptions_are_raised(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise MemoryError('out of memory')
+
+    queue_path = str(tmp_path / 'queue.db')
+    WorkQueue(queue_path).add_run('run', {'store_path': None, 'connect': False}, split_units(MANIFEST))
+    monkeypatch.setattr(work_queue, 'validate_table', fail)
+
+    with pytest.raises(RuntimeError) as error:
+        run_worker(queue_path, 'run', threads=1)
+    assert isinstance(error.value.__cause__, MemoryError)